@@ -0,0 +1,6 @@
+"""Benchmarks driving the real cog code against fake Discord objects and SQLite.
+
+Run them through `scripts.py bench`, for instance::
+
+    python scripts.py bench clicks --guilds 4 --users 100 --concurrency 50 --latency 0.1
+"""
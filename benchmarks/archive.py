@@ -0,0 +1,234 @@
+"""Benchmark of the archive pipeline, with a stub exporter producing archives of a given size.
+
+Runs the real `archive_channel` of the playthrough cog (export, opening the archive,
+storing it through Django's storage and inserting the Archive row, cleanup, and
+deleting the channel) and reports the time and peak memory of each stage, for
+single channels, a whole category the way `/admin archive category` does it, and
+concurrent archival.
+"""
+import asyncio
+import contextlib
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.clicks import percentile
+from benchmarks.database import GAMES, seed_channels, seed_guild, setup_database
+from benchmarks.fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+class StubExporter:
+    """Stands in for `export_channel`, writing an HTML archive of a given size."""
+
+    def __init__(self, directory: Path, size: int, delay: float = 0.0):
+        """Stands in for `export_channel`, writing an HTML archive of a given size.
+
+        :param directory: the directory to write archives to.
+        :param size: the size of each archive, in bytes.
+        :param delay: how long each export takes on top of writing, in seconds.
+        """
+        self.directory = directory
+        self.size = size
+        self.delay = delay
+
+    def __call__(self, channel_id) -> Path:
+        if self.delay:
+            time.sleep(self.delay)
+        path = self.directory / f"{channel_id}.html"
+        line = f'<div class="message">Message in channel {channel_id}</div>\n'
+        with open(path, "w") as f:
+            for _ in range(self.size // len(line)):
+                f.write(line)
+            f.write("x" * (self.size % len(line)))
+        return path
+
+
+class StageRecorder:
+    """Records the time and peak (traced) memory of each stage."""
+
+    def __init__(self, stage):
+        """Records the time and peak (traced) memory of each stage.
+
+        :param stage: the original `stage` context manager, still called so traces work.
+        """
+        self._stage = stage
+        self.times: Dict[str, List[float]] = defaultdict(list)
+        self.peaks: Dict[str, int] = defaultdict(int)
+
+    def clear(self):
+        self.times.clear()
+        self.peaks.clear()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            with self._stage(name):
+                yield
+        finally:
+            self.times[name].append(time.perf_counter() - started)
+            # Concurrent stages share the peak, so it's only exact for sequential runs
+            peak = tracemalloc.get_traced_memory()[1] - current
+            self.peaks[name] = max(self.peaks[name], peak)
+
+
+async def _archive(channel_module, guild, member, channel_obj) -> bool:
+    return await channel_module.archive_channel(FakeInteraction(guild, member), channel_obj)
+
+
+async def _run(channel_module, recorder: StageRecorder, guild: FakeGuild, count: int, concurrency: int):
+    from rosetta.utils.db import get_channel_in_db, set_channel_finished
+    from rosetta.utils.scheduler import background
+
+    admin = guild.add_member("admin")
+    game = GAMES[0][0]
+    results = {}
+
+    async def make_category(name: str):
+        category = await guild.create_category(f"{game} {name}")
+        channels = [
+            await guild.create_text_channel(f"player{i}-plays", category=category) for i in range(count)
+        ]
+        channel_objs = await asyncio.get_running_loop().run_in_executor(
+            None, seed_channels, guild, game, channels
+        )
+        return category, channels, channel_objs
+
+    async def measure(name: str, run):
+        recorder.clear()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        archived = await run()
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "archived": archived,
+            "elapsed": elapsed,
+            "peak": tracemalloc.get_traced_memory()[1] - baseline,
+            "stages": {
+                stage: (sorted(times), recorder.peaks[stage])
+                for stage, times in recorder.times.items()
+            },
+        }
+
+    # One channel at a time
+    _, _, channel_objs = await make_category("single")
+
+    async def single():
+        archived = 0
+        for channel_obj in channel_objs:
+            archived += await _archive(channel_module, guild, admin, channel_obj)
+        return archived
+
+    await measure("single", single)
+
+    # A whole category, like `/admin archive category` with `finished`
+    category, _, _ = await make_category("category")
+
+    async def whole_category():
+        archived = 0
+        with background():
+            for channel in list(category.channels):
+                channel_obj = await get_channel_in_db(channel)
+                if await _archive(channel_module, guild, admin, channel_obj):
+                    await set_channel_finished(channel_obj, True)
+                    archived += 1
+        return archived
+
+    await measure("category", whole_category)
+
+    # Several at once, like several admins archiving or players finishing together
+    _, _, channel_objs = await make_category("concurrent")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def concurrent():
+        async def archive(channel_obj):
+            async with semaphore:
+                return await _archive(channel_module, guild, admin, channel_obj)
+
+        return sum(await asyncio.gather(*(archive(channel_obj) for channel_obj in channel_objs)))
+
+    await measure("concurrent", concurrent)
+    return results
+
+
+def run_archive(
+    *,
+    channels: int = 20,
+    size: int = 1024 * 1024,
+    export_delay: float = 0.0,
+    concurrency: int = 5,
+    latency: float = 0.05,
+    database: Optional[Path] = None,
+) -> Dict:
+    """Seed a database and archive channels through the real pipeline with a stub exporter.
+
+    :param channels: how many channels each scenario archives.
+    :param size: the size of each archive, in bytes.
+    :param export_delay: how long each export takes on top of writing, in seconds.
+    :param concurrency: how many channels the concurrent scenario archives at once.
+    :param latency: the mean latency of Discord API calls, in seconds.
+    :param database: the SQLite database to use, a temporary one by default.
+    :return: the results of each scenario.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(database or Path(tmp) / "bench.sqlite3")
+
+        from playthrough.models import Archive
+
+        from rosetta.cogs.playthrough.utils import channel as channel_module
+
+        exports = Path(tmp) / "exports"
+        exports.mkdir()
+        recorder = StageRecorder(channel_module.stage)
+        storage = Archive._meta.get_field("file").storage
+        save = storage.save
+
+        def timed_save(*args, **kwargs):
+            with recorder.stage("storage_write"):
+                return save(*args, **kwargs)
+
+        api = FakeDiscord(latency)
+        guild = FakeGuild(api, "Guild")
+        seed_guild(guild)
+
+        export_channel = channel_module.export_channel
+        channel_module.export_channel = StubExporter(exports, size, export_delay)
+        channel_module.stage = recorder.stage
+        storage.save = timed_save
+        tracemalloc.start()
+        try:
+            return asyncio.run(_run(channel_module, recorder, guild, channels, concurrency))
+        finally:
+            tracemalloc.stop()
+            channel_module.export_channel = export_channel
+            channel_module.stage = recorder._stage
+            del storage.save
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f}MiB"
+
+
+def format_report(results: Dict) -> str:
+    """Render the results of `run_archive` as text."""
+    lines = []
+    for name, result in results.items():
+        lines.append(
+            f"{name}: {result['archived']} archived in {result['elapsed']:.2f}s "
+            f"({result['archived'] / result['elapsed']:.1f}/s), peak {_mib(result['peak'])}"
+        )
+        for stage, (times, peak) in result["stages"].items():
+            lines.append(
+                f"  {stage}: p50={percentile(times, 0.5):.4f}s p95={percentile(times, 0.95):.4f}s "
+                f"total={sum(times):.2f}s peak={_mib(peak)}"
+            )
+    return "\n".join(lines)
+
+
+__all__ = ["StageRecorder", "StubExporter", "format_report", "run_archive"]
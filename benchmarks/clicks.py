@@ -0,0 +1,192 @@
+"""Load test of the game buttons: many users clicking at once, in several guilds.
+
+Each simulated user clicks a random game's button, going through the real
+`GameButton.callback` (checks, `get_existing_channel`, admission, `create_channel`
+and the database write) with fake Discord objects and a seeded SQLite database.
+"""
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.database import seed_guild, setup_database
+from benchmarks.fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Get a percentile of sorted values, by the nearest rank."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _run(
+    api: FakeDiscord,
+    guilds: List[FakeGuild],
+    *,
+    users: int,
+    clicks_per_user: int,
+    concurrency: int,
+    pick_after: float,
+    seed: Optional[int],
+) -> Dict:
+    from rosetta.cogs.playthrough.ui import GameButton
+    from rosetta.utils.db import get_playable_games
+
+    rng = random.Random(seed)
+    buttons = {}
+    for guild in guilds:
+        buttons[guild.id] = [
+            GameButton(
+                game_config=game_config,
+                label=game_config.game.name,
+                custom_id=game_config.game.slug,
+            )
+            for game_config in await get_playable_games(guild.id)
+        ]
+
+    clicks = []
+    for guild in guilds:
+        for i in range(users):
+            member = guild.add_member(f"player{i}")
+            button = rng.choice(buttons[guild.id])
+            # Repeated clicks by the same user come in together, like double clicks do
+            clicks.extend((guild, member, button) for _ in range(clicks_per_user))
+    rng.shuffle(clicks)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def click(guild, member, button):
+        async with semaphore:
+            interaction = FakeInteraction(guild, member, pick_after=pick_after)
+            started = time.perf_counter()
+            try:
+                await button.callback(interaction)
+            except Exception as e:
+                errors.append(repr(e))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(click(*args) for args in clicks))
+    elapsed = time.perf_counter() - started
+    return {
+        "clicks": len(clicks),
+        "elapsed": elapsed,
+        "latencies": sorted(latencies),
+        "errors": errors,
+        "channels": sum(len(guild.text_channels) for guild in guilds),
+        "categories": sum(len(guild.categories) for guild in guilds),
+    }
+
+
+def run_clicks(
+    *,
+    guilds: int = 1,
+    users: int = 100,
+    clicks_per_user: int = 1,
+    concurrency: int = 50,
+    latency: float = 0.05,
+    jitter: float = 0.02,
+    history: int = 100,
+    meta_roles: int = 0,
+    pick_after: float = 0.5,
+    admission_rate: Optional[float] = None,
+    admission_concurrency: Optional[int] = None,
+    database: Optional[Path] = None,
+    seed: Optional[int] = 0,
+) -> Dict:
+    """Seed a database and simulate users clicking game buttons at once.
+
+    :param guilds: how many guilds to spread the users over.
+    :param users: how many users click per guild.
+    :param clicks_per_user: how many times each user clicks their button at once.
+    :param concurrency: how many clicks are handled at once overall.
+    :param latency: the mean latency of Discord API calls, in seconds.
+    :param jitter: the standard deviation of that latency, in seconds.
+    :param history: how many finished channels of other users each game already has.
+    :param meta_roles: how many meta roles each guild has, prompting users to pick one.
+    :param pick_after: how long users take to answer the meta role prompt, in seconds.
+    :param admission_rate: channel creations allowed per second per guild,
+        `config.CHANNEL_CREATION_RATE` by default.
+    :param admission_concurrency: channel creations allowed at once per guild,
+        `config.CHANNEL_CREATION_CONCURRENCY` by default.
+    :param database: the SQLite database to use, a temporary one by default.
+    :param seed: the seed of the random choices, for reproducible runs.
+    :return: the report.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        counter = setup_database(database or Path(tmp) / "bench.sqlite3")
+
+        from rosetta import config
+        from rosetta.cogs.playthrough import ui
+        from rosetta.utils.admission import AdmissionController
+        from rosetta.utils.metrics import STAGE_SECONDS
+
+        if admission_rate is not None or admission_concurrency is not None:
+            ui._channel_admission = AdmissionController(
+                concurrency=admission_concurrency or config.CHANNEL_CREATION_CONCURRENCY,
+                rate=admission_rate or config.CHANNEL_CREATION_RATE,
+                burst=config.CHANNEL_CREATION_BURST,
+                max_queue=config.CHANNEL_CREATION_MAX_QUEUE,
+            )
+
+        api = FakeDiscord(latency, jitter, seed)
+        fake_guilds = [FakeGuild(api, f"Guild {i}") for i in range(guilds)]
+        for guild in fake_guilds:
+            seed_guild(guild, history=history, meta_roles=meta_roles)
+
+        seeded_queries = counter.count
+        report = asyncio.run(
+            _run(
+                api,
+                fake_guilds,
+                users=users,
+                clicks_per_user=clicks_per_user,
+                concurrency=concurrency,
+                pick_after=pick_after,
+                seed=seed,
+            )
+        )
+        report["queries"] = counter.count - seeded_queries
+        report["api_calls"] = dict(api.calls)
+        report["stages"] = {
+            stage: (
+                STAGE_SECONDS.quantile(0.5, operation=operation, stage=stage),
+                STAGE_SECONDS.quantile(0.95, operation=operation, stage=stage),
+            )
+            for operation, stage in STAGE_SECONDS.label_values()
+            if operation == "channel_creation"
+        }
+        return report
+
+
+def format_report(report: Dict) -> str:
+    """Render a report of `run_clicks` as text."""
+    latencies = report["latencies"]
+    lines = [
+        f"{report['clicks']} clicks in {report['elapsed']:.2f}s "
+        f"({report['clicks'] / report['elapsed']:.1f} clicks/s), "
+        f"{report['channels']} channels in {report['categories']} categories, "
+        f"{len(report['errors'])} errors",
+        "latency p50={:.3f}s p95={:.3f}s p99={:.3f}s max={:.3f}s".format(
+            percentile(latencies, 0.5),
+            percentile(latencies, 0.95),
+            percentile(latencies, 0.99),
+            latencies[-1] if latencies else 0.0,
+        ),
+        f"queries: {report['queries']} ({report['queries'] / max(1, report['clicks']):.1f}/click)",
+        "api calls: "
+        + ", ".join(f"{name}={count}" for name, count in sorted(report["api_calls"].items())),
+        "stages (p50/p95):",
+    ]
+    for stage, (p50, p95) in sorted(report["stages"].items()):
+        lines.append(f"  {stage}: {p50:.3f}s / {p95:.3f}s")
+    for error in sorted(set(report["errors"]))[:5]:
+        lines.append(f"error: {error}")
+    return "\n".join(lines)
+
+
+__all__ = ["format_report", "percentile", "run_clicks"]
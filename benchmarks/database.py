@@ -0,0 +1,136 @@
+"""Set up, seed and count the queries of the benchmark database."""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import django
+
+from benchmarks.fakes import FakeGuild, snowflake
+
+#: The games seeded in every guild: name, slug, channel suffix and aliases.
+GAMES = [
+    ("Chaos;Head NoAH", "chaoshead", "-plays-ch", ["ch", "chn"]),
+    ("Steins;Gate", "steinsgate", "-plays-sg", ["sg"]),
+    ("Robotics;Notes Elite", "roboticsnotes", "-plays-rn", ["rn", "rne"]),
+    ("Chaos;Child", "chaoschild", "-plays-cc", ["cc"]),
+    ("Steins;Gate 0", "steinsgate0", "-plays-sg0", ["sg0"]),
+    ("Robotics;Notes DaSH", "roboticsnotesdash", "-plays-rnd", ["rnd"]),
+    ("Anonymous;Code", "anonymouscode", "-plays-ac", ["ac"]),
+]
+
+
+class QueryCounter:
+    """Counts the queries run on every database connection, whichever thread opened it."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _on_connection(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(self._on_connection, weak=False)
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+
+def setup_database(path: Path) -> QueryCounter:
+    """Point Django at a SQLite database and create genki's schema in it.
+    Must be called before anything imports `playthrough.models`.
+
+    :param path: the SQLite database file, created if needed.
+    :return: the counter of the queries run from then on.
+    """
+    from django.core.management import call_command
+
+    # Never let a benchmark run against the configured database
+    os.environ["ROSETTA_BENCH_DB"] = str(path)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    django.setup()
+    call_command("migrate", interactive=False, verbosity=0)
+    counter = QueryCounter()
+    counter.install()
+    return counter
+
+
+def seed_guild(guild: FakeGuild, *, history: int = 0, meta_roles: int = 0) -> Dict[str, int]:
+    """Configure every game in a guild, the way an admin would.
+
+    :param guild: the guild, whose completion and meta roles are created too.
+    :param history: how many finished channels of other users to create per game,
+        so the channel table isn't unrealistically empty.
+    :param meta_roles: how many meta roles to configure, each requiring two games.
+    :return: the completion role IDs, keyed by game name.
+    """
+    from playthrough.models import Alias, Channel, Game, GameConfig, Guild, MetaRoleConfig, User
+
+    guild_obj = Guild.objects.get_or_create(id=str(guild.id))[0]
+    completion_roles = {}
+    game_configs: List = []
+    for name, slug, suffix, aliases in GAMES:
+        game, created = Game.objects.get_or_create(
+            name=name, defaults={"slug": slug, "channel_suffix": suffix}
+        )
+        if created:
+            Alias.objects.bulk_create([Alias(game=game, alias=alias) for alias in aliases])
+        role = guild.add_role(f"{name} Completed")
+        completion_roles[name] = role.id
+        game_configs.append(
+            GameConfig.objects.create(
+                guild=guild_obj,
+                game=game,
+                completion_role_id=str(role.id),
+                emoji=str(snowflake()),
+                playable=True,
+            )
+        )
+        if history:
+            owners = User.objects.bulk_create([User(id=snowflake()) for _ in range(history)])
+            Channel.objects.bulk_create(
+                Channel(id=str(snowflake()), owner=owner, guild=guild_obj, game=game, finished=True)
+                for owner in owners
+            )
+
+    for i in range(meta_roles):
+        first, second = game_configs[i % len(game_configs)], game_configs[(i + 1) % len(game_configs)]
+        role = guild.add_role(f"Meta Role {i}")
+        meta_role = MetaRoleConfig.objects.create(
+            name=f"meta-role-{i}",
+            colour="#ffffff",
+            expression=f"{first.completion_role_id} && {second.completion_role_id}",
+            guild=guild_obj,
+            role_id=str(role.id),
+        )
+        meta_role.games.add(first, second)
+    return completion_roles
+
+
+def seed_channels(guild: FakeGuild, game_name: str, channels) -> List:
+    """Register existing Discord channels as playthrough channels of their owners.
+
+    :param guild: the guild the channels are in, seeded with `seed_guild`.
+    :param game_name: the name of the game the channels are for.
+    :param channels: the fake text channels.
+    :return: the Channel objects, in the same order.
+    """
+    from playthrough.models import Channel, Game, User
+
+    game = Game.objects.get(name=game_name)
+    owners = User.objects.bulk_create([User(id=snowflake()) for _ in channels])
+    return Channel.objects.bulk_create(
+        Channel(id=str(channel.id), owner=owner, guild_id=str(guild.id), game=game)
+        for channel, owner in zip(channels, owners)
+    )
+
+
+__all__ = ["GAMES", "QueryCounter", "seed_channels", "seed_guild", "setup_database"]
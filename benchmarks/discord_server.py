@@ -0,0 +1,684 @@
+"""A local stand-in for the Discord API and gateway, for end-to-end performance tests.
+
+It implements the REST routes Rosetta uses (channels and categories, member roles,
+messages, pins, history, interaction responses and command registration) and enough
+of the gateway to connect, receive guilds and see the effects of REST calls. Every
+response carries rate limit headers, and exhausted buckets answer with a 429 the way
+Discord does, so the client's rate limit handling is exercised too.
+
+Point Rosetta at it with `ROSETTA_DISCORD_API_BASE=http://127.0.0.1:<port>/api/v10`.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+logger = logging.getLogger(__name__)
+
+#: Discord caps categories at 50 channels.
+CATEGORY_CHANNEL_LIMIT = 50
+
+#: Per-route rate limits, as (requests, per seconds), close to what Discord applies.
+DEFAULT_RATE_LIMITS = {
+    "POST /channels/{channel_id}/messages": (5, 5.0),
+    "POST /guilds/{guild_id}/channels": (5, 10.0),
+    "DELETE /channels/{channel_id}": (5, 5.0),
+    "PUT /channels/{channel_id}/pins/{message_id}": (5, 5.0),
+    "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}": (10, 10.0),
+    "DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}": (10, 10.0),
+    "GET /channels/{channel_id}/messages": (5, 1.0),
+}
+
+#: Discord's 429s come through its proxy, discord.py takes any other one for a Cloudflare ban.
+_RATE_LIMITED_HEADERS = {"Via": "1.1 google"}
+
+_GUILD_TEXT = 0
+
+
+def _json(data, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    # discord.py only decodes responses whose content type is exactly this
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers={**(headers or {}), "Content-Type": "application/json"},
+    )
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _Bucket:
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset = 0.0
+
+    def take(self, now: float) -> bool:
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.per
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+class MockDiscord:
+    """The state of the fake Discord, and the web application serving it."""
+
+    #: Guilds with more members than this are sent without them, like Discord does.
+    LARGE_THRESHOLD = 250
+
+    def __init__(
+        self,
+        *,
+        rate_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+        global_limit: Tuple[int, float] = (50, 1.0),
+        latency: float = 0.0,
+        shards: int = 1,
+    ):
+        """The state of the fake Discord, and the web application serving it.
+
+        :param rate_limits: the per-route limits, keyed by "METHOD /route/{template}",
+            `DEFAULT_RATE_LIMITS` by default.
+        :param global_limit: the limit across all routes, as (requests, per seconds).
+        :param latency: how long to wait before answering each request, in seconds.
+        :param shards: the number of shards recommended to the bot.
+        """
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.global_limit = global_limit
+        self.latency = latency
+        self.shards = shards
+        self.url: Optional[str] = None
+
+        self.requests: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._global = _Bucket(*global_limit)
+
+        # A millisecond apart like real snowflakes, so that guilds spread over shards
+        self._ids = itertools.count(1_000_000_000_000_000_000, 1 << 22)
+        self.application_id = self.snowflake()
+        self.bot = self._user_payload(self.application_id, "Rosetta", bot=True)
+        self.guilds: Dict[int, dict] = {}
+        self.channels: Dict[int, dict] = {}
+        self.messages: Dict[int, List[dict]] = {}
+        self.pins: Dict[int, List[int]] = {}
+        self.commands: Dict[Optional[int], List[dict]] = {}
+        self.interaction_responses: Dict[int, List[dict]] = {}
+        self._sockets: List["_GatewaySession"] = []
+        self._runner: Optional[web.AppRunner] = None
+
+        self._routes: List[Tuple[str, str, re.Pattern, Callable]] = []
+        for method, template, handler in [
+            ("GET", "/users/@me", self._get_me),
+            ("GET", "/oauth2/applications/@me", self._get_application),
+            ("GET", "/gateway", self._get_gateway),
+            ("GET", "/gateway/bot", self._get_gateway),
+            ("GET", "/applications/{application_id}/commands", self._get_commands),
+            ("PUT", "/applications/{application_id}/commands", self._put_commands),
+            ("GET", "/applications/{application_id}/guilds/{guild_id}/commands", self._get_commands),
+            ("PUT", "/applications/{application_id}/guilds/{guild_id}/commands", self._put_commands),
+            ("GET", "/guilds/{guild_id}/channels", self._get_channels),
+            ("POST", "/guilds/{guild_id}/channels", self._create_channel),
+            ("GET", "/guilds/{guild_id}/members", self._list_members),
+            ("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._add_role),
+            ("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", self._remove_role),
+            ("GET", "/channels/{channel_id}", self._get_channel),
+            ("DELETE", "/channels/{channel_id}", self._delete_channel),
+            ("GET", "/channels/{channel_id}/messages", self._history),
+            ("POST", "/channels/{channel_id}/messages", self._send_message),
+            ("GET", "/channels/{channel_id}/pins", self._get_pins),
+            ("PUT", "/channels/{channel_id}/pins/{message_id}", self._pin),
+            ("POST", "/interactions/{interaction_id}/{token}/callback", self._interaction_callback),
+            ("POST", "/webhooks/{application_id}/{token}", self._followup),
+            ("GET", "/webhooks/{application_id}/{token}/messages/@original", self._get_original),
+            ("PATCH", "/webhooks/{application_id}/{token}/messages/@original", self._edit_original),
+            ("PATCH", "/webhooks/{application_id}/{token}/messages/{message_id}", self._edit_original),
+        ]:
+            pattern = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template) + "$")
+            self._routes.append((method, template, pattern, handler))
+
+    def snowflake(self) -> int:
+        """Get a new unique ID."""
+        return next(self._ids)
+
+    # State
+
+    @staticmethod
+    def _user_payload(_id: int, name: str, bot: bool = False) -> dict:
+        return {"id": str(_id), "username": name, "discriminator": "0", "avatar": None, "bot": bot}
+
+    def add_guild(self, name: str, members: int = 0) -> dict:
+        """Add a guild the bot is in, with some members.
+
+        :param name: the name of the guild.
+        :param members: how many members to add, besides the bot.
+        :return: the guild's state.
+        """
+        _id = self.snowflake()
+        guild = {
+            "id": _id,
+            "name": name,
+            "roles": {_id: {"id": str(_id), "name": "@everyone", "position": 0, "permissions": "0"}},
+            "members": {},
+        }
+        self.guilds[_id] = guild
+        self.add_member(guild, self.bot["username"], _id=self.application_id)
+        for i in range(members):
+            self.add_member(guild, f"member{i}")
+        return guild
+
+    def add_role(self, guild: dict, name: str) -> int:
+        _id = self.snowflake()
+        guild["roles"][_id] = {
+            "id": str(_id), "name": name, "position": len(guild["roles"]), "permissions": "0"
+        }
+        return _id
+
+    def add_member(self, guild: dict, name: str, roles: List[int] = (), _id: Optional[int] = None) -> int:
+        _id = _id or self.snowflake()
+        guild["members"][_id] = {
+            "user": self._user_payload(_id, name),
+            "roles": [str(role) for role in roles],
+            "joined_at": _timestamp(),
+            "deaf": False,
+            "mute": False,
+        }
+        return _id
+
+    def add_channel(
+        self, guild_id: int, name: str, _type: int = _GUILD_TEXT, parent_id: Optional[int] = None, **fields
+    ) -> dict:
+        _id = self.snowflake()
+        channel = {
+            "id": str(_id),
+            "type": _type,
+            "guild_id": str(guild_id),
+            "name": name,
+            "position": sum(1 for c in self.channels.values() if c["guild_id"] == str(guild_id)),
+            "parent_id": str(parent_id) if parent_id else None,
+            "permission_overwrites": [],
+            "nsfw": False,
+            **fields,
+        }
+        self.channels[_id] = channel
+        self.messages[_id] = []
+        self.pins[_id] = []
+        return channel
+
+    def add_message(self, channel_id: int, content: str, author: Optional[dict] = None) -> dict:
+        channel = self.channels[channel_id]
+        message = {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "guild_id": channel["guild_id"],
+            "author": author or self.bot,
+            "content": content,
+            "timestamp": _timestamp(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "components": [],
+            "pinned": False,
+            "type": 0,
+        }
+        self.messages[channel_id].append(message)
+        return message
+
+    def guild_payload(self, guild: dict) -> dict:
+        large = len(guild["members"]) > self.LARGE_THRESHOLD
+        return {
+            "id": str(guild["id"]),
+            "name": guild["name"],
+            "icon": None,
+            "owner_id": str(self.application_id),
+            "features": [],
+            "emojis": [],
+            "stickers": [],
+            "roles": list(guild["roles"].values()),
+            # Large guilds come without their members, which have to be chunked
+            "members": (
+                [guild["members"][self.application_id]] if large else list(guild["members"].values())
+            ),
+            "member_count": len(guild["members"]),
+            "large": large,
+            "channels": [c for c in self.channels.values() if c["guild_id"] == str(guild["id"])],
+            "threads": [],
+            "presences": [],
+            "voice_states": [],
+            "joined_at": _timestamp(),
+            "unavailable": False,
+        }
+
+    # Gateway
+
+    def dispatch(self, event: str, data: dict):
+        """Send an event to every connected gateway session."""
+        for session in list(self._sockets):
+            session.send_dispatch(event, data)
+
+    def click(self, guild_id: int, user_id: int, custom_id: str, channel_id: Optional[int] = None) -> int:
+        """Make a member click a button, dispatching the interaction to the bot.
+
+        :param guild_id: the ID of the guild.
+        :param user_id: the ID of the member clicking.
+        :param custom_id: the custom ID of the button.
+        :param channel_id: the channel the button is in, any of the guild's by default.
+        :return: the ID of the interaction.
+        """
+        guild = self.guilds[guild_id]
+        if channel_id is None:
+            channel_id = next(
+                int(c["id"]) for c in self.channels.values()
+                if c["guild_id"] == str(guild_id) and c["type"] == _GUILD_TEXT
+            )
+        message = self.add_message(channel_id, "Pick a game!")
+        button = {"type": 2, "style": 2, "custom_id": custom_id}
+        message["components"] = [{"type": 1, "components": [button]}]
+        interaction_id = self.snowflake()
+        self.interaction_responses[interaction_id] = []
+        self.dispatch(
+            "INTERACTION_CREATE",
+            {
+                "id": str(interaction_id),
+                "application_id": str(self.application_id),
+                "type": 3,
+                "data": {"custom_id": custom_id, "component_type": 2},
+                "guild_id": str(guild_id),
+                "channel_id": str(channel_id),
+                "member": guild["members"][user_id],
+                "message": message,
+                "token": f"token-{interaction_id}",
+                "version": 1,
+                "locale": "en-US",
+                "guild_locale": "en-US",
+                "app_permissions": "0",
+            },
+        )
+        return interaction_id
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = _GatewaySession(self, ws)
+        self._sockets.append(session)
+        try:
+            await session.run()
+        finally:
+            self._sockets.remove(session)
+        return ws
+
+    # REST
+
+    def _rate_limit(self, template: str, match: re.Match) -> Tuple[Optional[web.Response], dict]:
+        now = time.time()
+        if not self._global.take(now):
+            retry_after = self._global.reset - now
+            self.rate_limited["global"] += 1
+            return (
+                _json(
+                    {"message": "You are being rate limited.", "retry_after": retry_after, "global": True},
+                    status=429,
+                    headers={"Retry-After": f"{retry_after:.3f}", "X-RateLimit-Global": "true",
+                             "X-RateLimit-Scope": "global", **_RATE_LIMITED_HEADERS},
+                ),
+                {},
+            )
+        limit = self.rate_limits.get(template)
+        if limit is None:
+            return None, {}
+        params = match.groupdict()
+        major = params.get("channel_id") or params.get("guild_id") or params.get("token") or ""
+        bucket = self._buckets.get((template, major))
+        if bucket is None:
+            bucket = self._buckets[(template, major)] = _Bucket(*limit)
+        allowed = bucket.take(now)
+        reset_after = max(0.0, bucket.reset - now)
+        headers = {
+            "X-RateLimit-Limit": str(bucket.limit),
+            "X-RateLimit-Remaining": str(bucket.remaining),
+            "X-RateLimit-Reset": f"{bucket.reset:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": f"{abs(hash(template)):x}",
+        }
+        if allowed:
+            return None, headers
+        self.rate_limited[template] += 1
+        return (
+            _json(
+                {"message": "You are being rate limited.", "retry_after": reset_after, "global": False},
+                status=429,
+                headers={**headers, "Retry-After": f"{reset_after:.3f}", "X-RateLimit-Scope": "user",
+                         **_RATE_LIMITED_HEADERS},
+            ),
+            headers,
+        )
+
+    async def _dispatch_request(self, request: web.Request) -> web.StreamResponse:
+        if request.path == "/gateway":
+            return await self._gateway(request)
+        path = request.path.split("/api/v10", 1)[-1]
+        for method, template, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match is None or method != request.method:
+                continue
+            key = f"{method} {template}"
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            limited, headers = self._rate_limit(key, match)
+            if limited is not None:
+                self.requests[key, 429] += 1
+                return limited
+            response = await handler(request, **match.groupdict())
+            response.headers.update(headers)
+            self.requests[key, response.status] += 1
+            return response
+        logger.warning("Unimplemented route: %s %s", request.method, path)
+        self.requests[f"{request.method} {path}", 404] += 1
+        return _json({"message": "404: Not Found", "code": 0}, status=404)
+
+    @staticmethod
+    async def _payload(request: web.Request) -> dict:
+        # discord.py sends messages with attachments (or interaction responses) as forms
+        if request.content_type in ("multipart/form-data", "application/x-www-form-urlencoded"):
+            form = await request.post()
+            return json.loads(form.get("payload_json", "{}"))
+        body = await request.text()
+        return json.loads(body) if body else {}
+
+    async def _get_me(self, request):
+        return _json(self.bot)
+
+    async def _get_application(self, request):
+        return _json({
+            "id": str(self.application_id), "name": "Rosetta", "icon": None, "description": "",
+            "rpc_origins": [], "bot_public": True, "bot_require_code_grant": False,
+            "owner": self.bot, "summary": "", "verify_key": "", "team": None, "flags": 0,
+        })
+
+    async def _get_gateway(self, request):
+        return _json({
+            "url": self.url.replace("http", "ws", 1) + "/gateway",
+            "shards": self.shards,
+            "session_start_limit": {
+                "total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1
+            },
+        })
+
+    async def _get_commands(self, request, application_id, guild_id=None):
+        return _json(self.commands.get(guild_id and int(guild_id), []))
+
+    async def _put_commands(self, request, application_id, guild_id=None):
+        commands = await self._payload(request)
+        for command in commands:
+            command.setdefault("id", str(self.snowflake()))
+            command.setdefault("application_id", str(self.application_id))
+            command.setdefault("version", "1")
+            command.setdefault("type", 1)
+            if guild_id:
+                command["guild_id"] = guild_id
+        self.commands[guild_id and int(guild_id)] = commands
+        return _json(commands)
+
+    def _not_found(self, what: str) -> web.Response:
+        return _json({"message": f"Unknown {what}", "code": 10003}, status=404)
+
+    async def _get_channels(self, request, guild_id):
+        return _json([c for c in self.channels.values() if c["guild_id"] == guild_id])
+
+    async def _create_channel(self, request, guild_id):
+        if int(guild_id) not in self.guilds:
+            return self._not_found("Guild")
+        data = await self._payload(request)
+        parent_id = data.get("parent_id")
+        if parent_id:
+            children = sum(1 for c in self.channels.values() if c["parent_id"] == str(parent_id))
+            if children >= CATEGORY_CHANNEL_LIMIT:
+                return _json(
+                    {"message": "Maximum number of channels in category reached (50)", "code": 50035},
+                    status=400,
+                )
+        channel = self.add_channel(
+            int(guild_id),
+            data["name"],
+            data.get("type", _GUILD_TEXT),
+            parent_id and int(parent_id),
+            permission_overwrites=data.get("permission_overwrites", []),
+        )
+        self.dispatch("CHANNEL_CREATE", channel)
+        return _json(channel, status=201)
+
+    async def _list_members(self, request, guild_id):
+        guild = self.guilds.get(int(guild_id))
+        if guild is None:
+            return self._not_found("Guild")
+        limit = min(int(request.query.get("limit", 1)), 1000)
+        after = int(request.query.get("after", 0))
+        members = [m for i, m in sorted(guild["members"].items()) if i > after]
+        return _json(members[:limit])
+
+    async def _update_roles(self, guild_id, user_id, role_id, add: bool):
+        guild = self.guilds.get(int(guild_id))
+        member = guild and guild["members"].get(int(user_id))
+        if member is None:
+            return self._not_found("Member")
+        if int(role_id) not in guild["roles"]:
+            return self._not_found("Role")
+        if add and role_id not in member["roles"]:
+            member["roles"].append(role_id)
+        elif not add and role_id in member["roles"]:
+            member["roles"].remove(role_id)
+        self.dispatch("GUILD_MEMBER_UPDATE", {"guild_id": guild_id, **member})
+        return web.Response(status=204)
+
+    async def _add_role(self, request, guild_id, user_id, role_id):
+        return await self._update_roles(guild_id, user_id, role_id, add=True)
+
+    async def _remove_role(self, request, guild_id, user_id, role_id):
+        return await self._update_roles(guild_id, user_id, role_id, add=False)
+
+    async def _get_channel(self, request, channel_id):
+        channel = self.channels.get(int(channel_id))
+        if channel is None:
+            return self._not_found("Channel")
+        return _json(channel)
+
+    async def _delete_channel(self, request, channel_id):
+        channel = self.channels.pop(int(channel_id), None)
+        if channel is None:
+            return self._not_found("Channel")
+        self.messages.pop(int(channel_id), None)
+        self.pins.pop(int(channel_id), None)
+        self.dispatch("CHANNEL_DELETE", channel)
+        return _json(channel)
+
+    async def _history(self, request, channel_id):
+        messages = self.messages.get(int(channel_id))
+        if messages is None:
+            return self._not_found("Channel")
+        limit = min(int(request.query.get("limit", 50)), 100)
+        if "after" in request.query:
+            after = int(request.query["after"])
+            # Oldest first from `after`, returned newest first like Discord does
+            page = [m for m in messages if int(m["id"]) > after][:limit]
+        else:
+            before = int(request.query.get("before", 2**64))
+            page = [m for m in messages if int(m["id"]) < before][-limit:]
+        return _json(page[::-1])
+
+    async def _send_message(self, request, channel_id):
+        if int(channel_id) not in self.channels:
+            return self._not_found("Channel")
+        data = await self._payload(request)
+        message = self.add_message(int(channel_id), data.get("content") or "")
+        self.dispatch("MESSAGE_CREATE", message)
+        return _json(message)
+
+    async def _get_pins(self, request, channel_id):
+        messages = {int(m["id"]): m for m in self.messages.get(int(channel_id), [])}
+        return _json([messages[i] for i in self.pins.get(int(channel_id), []) if i in messages])
+
+    async def _pin(self, request, channel_id, message_id):
+        pins = self.pins.get(int(channel_id))
+        if pins is None:
+            return self._not_found("Channel")
+        if len(pins) >= 50:
+            return _json({"message": "Maximum number of pins reached (50)", "code": 30003}, status=400)
+        pins.append(int(message_id))
+        return web.Response(status=204)
+
+    async def _interaction_callback(self, request, interaction_id, token):
+        data = await self._payload(request)
+        self.interaction_responses.setdefault(int(interaction_id), []).append(data)
+        return web.Response(status=204)
+
+    def _webhook_message(self, token: str, data: dict) -> dict:
+        interaction_id = int(token.rsplit("-", 1)[-1]) if token.startswith("token-") else 0
+        self.interaction_responses.setdefault(interaction_id, []).append(data)
+        return {
+            "id": str(self.snowflake()), "channel_id": "0", "author": self.bot,
+            "content": data.get("content") or "", "timestamp": _timestamp(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "components": data.get("components", []),
+            "pinned": False, "type": 0, "flags": data.get("flags", 0),
+            "webhook_id": str(self.application_id),
+        }
+
+    async def _followup(self, request, application_id, token):
+        return _json(self._webhook_message(token, await self._payload(request)))
+
+    async def _get_original(self, request, application_id, token):
+        return _json(self._webhook_message(token, {}))
+
+    async def _edit_original(self, request, application_id, token, message_id=None):
+        return _json(self._webhook_message(token, await self._payload(request)))
+
+    # Serving
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving, in the running event loop.
+
+        :param host: the address to bind to.
+        :param port: the port to bind to, 0 for any free one.
+        :return: the API base URL to point the client at.
+        """
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._dispatch_request)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        logger.info("Mock Discord serving on %s", self.url)
+        return f"{self.url}/api/v10"
+
+    async def stop(self):
+        """Close every gateway session and stop serving."""
+        for session in list(self._sockets):
+            await session.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class _GatewaySession:
+    """One gateway connection: hello, identify, heartbeats and dispatches."""
+
+    HEARTBEAT_INTERVAL = 41250
+
+    def __init__(self, server: MockDiscord, ws: web.WebSocketResponse):
+        self.server = server
+        self.ws = ws
+        self.sequence = 0
+        self.session_id = f"session-{server.snowflake()}"
+        self._outbox: asyncio.Queue = asyncio.Queue()
+
+    def _send(self, payload: dict):
+        self._outbox.put_nowait(payload)
+
+    async def _write(self):
+        while True:
+            payload = await self._outbox.get()
+            # Text frames need no zlib-stream decompression on the client's side
+            await self.ws.send_str(json.dumps(payload))
+
+    def send_dispatch(self, event: str, data: dict):
+        self.sequence += 1
+        self._send({"op": 0, "t": event, "s": self.sequence, "d": data})
+
+    async def run(self):
+        writer = asyncio.create_task(self._write())
+        self._send({"op": 10, "d": {"heartbeat_interval": self.HEARTBEAT_INTERVAL}})
+        try:
+            async for msg in self.ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                payload = json.loads(msg.data)
+                op = payload["op"]
+                if op == 1:
+                    self._send({"op": 11})
+                elif op == 2:
+                    self._identify(payload["d"])
+                elif op == 6:
+                    self.send_dispatch("RESUMED", {})
+                elif op == 8:
+                    self._chunk(payload["d"])
+        finally:
+            writer.cancel()
+
+    def _identify(self, data: dict):
+        server = self.server
+        shard_id, shard_count = data.get("shard") or (0, 1)
+        guilds = [
+            guild for _id, guild in server.guilds.items() if (_id >> 22) % shard_count == shard_id
+        ]
+        self.send_dispatch(
+            "READY",
+            {
+                "v": 10,
+                "user": server.bot,
+                "guilds": [{"id": str(guild["id"]), "unavailable": True} for guild in guilds],
+                "session_id": self.session_id,
+                "resume_gateway_url": server.url.replace("http", "ws", 1) + "/gateway",
+                "application": {"id": str(server.application_id), "flags": 0},
+                "shard": [shard_id, shard_count],
+            },
+        )
+        for guild in guilds:
+            self.send_dispatch("GUILD_CREATE", server.guild_payload(guild))
+
+    def _chunk(self, data: dict):
+        guild = self.server.guilds.get(int(data["guild_id"]))
+        if guild is None:
+            return
+        members = list(guild["members"].values())
+        chunks = [members[i:i + 1000] for i in range(0, len(members), 1000)] or [[]]
+        for index, chunk in enumerate(chunks):
+            self.send_dispatch(
+                "GUILD_MEMBERS_CHUNK",
+                {
+                    "guild_id": data["guild_id"],
+                    "members": chunk,
+                    "chunk_index": index,
+                    "chunk_count": len(chunks),
+                    "nonce": data.get("nonce"),
+                },
+            )
+
+
+__all__ = ["CATEGORY_CHANNEL_LIMIT", "DEFAULT_RATE_LIMITS", "MockDiscord"]
@@ -0,0 +1,306 @@
+"""Stand-ins for the Discord objects the cogs use, with injectable latency.
+
+Only the attributes and methods Rosetta actually touches are implemented. Every
+call that would hit the Discord API awaits the `FakeDiscord` latency and is counted,
+so a benchmark can report how many REST calls each operation makes.
+"""
+import asyncio
+import itertools
+import random
+from collections import Counter
+from typing import Dict, List, Optional
+
+import discord
+
+#: Discord caps categories at 50 channels.
+CATEGORY_CHANNEL_LIMIT = 50
+
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    """Get a new unique ID."""
+    return next(_snowflakes)
+
+
+class _FakeHTTPResponse:
+    def __init__(self, status: int, reason: str):
+        self.status = status
+        self.reason = reason
+
+
+class FakeDiscord:
+    """The shared state of the fake API: its latency and the calls made to it."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: Optional[int] = None):
+        """The shared state of the fake API: its latency and the calls made to it.
+
+        :param latency: the mean latency of API calls, in seconds.
+        :param jitter: the standard deviation of the latency, in seconds.
+        :param seed: the seed of the latency jitter, for reproducible runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter = Counter()
+        self._random = random.Random(seed)
+
+    async def request(self, endpoint: str):
+        """Count an API call and wait for as long as it takes.
+
+        :param endpoint: the name of the call, used to count them.
+        """
+        self.calls[endpoint] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self._random.gauss(self.latency, self.jitter)))
+
+
+class FakeRole:
+    def __init__(self, name: str, _id: Optional[int] = None):
+        self.id = _id or snowflake()
+        self.name = name
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+
+class FakeMember:
+    def __init__(self, api: FakeDiscord, name: str, roles: List[FakeRole] = (), _id: Optional[int] = None):
+        self.api = api
+        self.id = _id or snowflake()
+        self.name = name
+        self.display_name = name
+        self.roles = list(roles)
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    async def add_roles(self, *roles):
+        await self.api.request("add_role")
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles):
+        await self.api.request("remove_role")
+        self.roles = [role for role in self.roles if role not in roles]
+
+
+class FakeMessage:
+    def __init__(self, api: FakeDiscord, channel, content: Optional[str] = None, **kwargs):
+        self.api = api
+        self.id = snowflake()
+        self.channel = channel
+        self.content = content
+        self.pinned = False
+
+    async def edit(self, **kwargs):
+        await self.api.request("edit_message")
+        self.content = kwargs.get("content", self.content)
+
+    async def pin(self):
+        await self.api.request("pin_message")
+        self.pinned = True
+
+
+class FakeCategory:
+    def __init__(self, guild: "FakeGuild", name: str, position: int):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.position = position
+        self.channels: List[FakeTextChannel] = []
+
+    @property
+    def text_channels(self) -> List["FakeTextChannel"]:
+        return list(self.channels)
+
+    async def delete(self):
+        await self.guild.api.request("delete_channel")
+        self.guild.categories.remove(self)
+
+
+class FakeTextChannel:
+    def __init__(self, guild: "FakeGuild", name: str, category: Optional[FakeCategory], overwrites: dict):
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.category = category
+        self.overwrites = overwrites
+        self.messages: List[FakeMessage] = []
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self.guild.api.request("send_message")
+        message = FakeMessage(self.guild.api, self, content, **kwargs)
+        self.messages.append(message)
+        return message
+
+    async def delete(self):
+        await self.guild.api.request("delete_channel")
+        self.guild.text_channels.remove(self)
+        if self.category is not None:
+            self.category.channels.remove(self)
+
+
+class FakeGuild:
+    def __init__(self, api: FakeDiscord, name: str, _id: Optional[int] = None):
+        self.api = api
+        self.id = _id or snowflake()
+        self.name = name
+        self.default_role = FakeRole("@everyone", self.id)
+        self.roles: List[FakeRole] = [self.default_role]
+        self.members: Dict[int, FakeMember] = {}
+        self.categories: List[FakeCategory] = []
+        self.text_channels: List[FakeTextChannel] = []
+        self.me = self.add_member("Rosetta")
+
+    @property
+    def channels(self) -> list:
+        return [*self.categories, *self.text_channels]
+
+    def add_role(self, name: str, _id: Optional[int] = None) -> FakeRole:
+        role = FakeRole(name, _id)
+        self.roles.append(role)
+        return role
+
+    def add_member(self, name: str, roles: List[FakeRole] = ()) -> FakeMember:
+        member = FakeMember(self.api, name, [self.default_role, *roles])
+        self.members[member.id] = member
+        return member
+
+    def get_member(self, _id: int) -> Optional[FakeMember]:
+        return self.members.get(_id)
+
+    async def create_category(self, name: str, position: Optional[int] = None, **kwargs) -> FakeCategory:
+        await self.api.request("create_channel")
+        category = FakeCategory(self, name, len(self.categories) if position is None else position)
+        self.categories.append(category)
+        return category
+
+    async def create_text_channel(
+        self, name: str, category: Optional[FakeCategory] = None, overwrites: dict = None, **kwargs
+    ) -> FakeTextChannel:
+        await self.api.request("create_channel")
+        if category is not None and len(category.channels) >= CATEGORY_CHANNEL_LIMIT:
+            raise discord.HTTPException(
+                _FakeHTTPResponse(400, "Bad Request"),
+                {"code": 50035, "message": "Maximum number of channels in category reached (50)"},
+            )
+        channel = FakeTextChannel(self, name, category, overwrites or {})
+        self.text_channels.append(channel)
+        if category is not None:
+            category.channels.append(channel)
+        return channel
+
+
+class FakeInteractionResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._responded = False
+
+    def is_done(self) -> bool:
+        return self._responded
+
+    async def send_message(self, content: Optional[str] = None, *, view=None, **kwargs):
+        if self._responded:
+            raise discord.InteractionResponded(self._interaction)
+        self._responded = True
+        await self._interaction.api.request("interaction_response")
+        self._interaction.messages.append(content)
+        self._interaction._attach(view)
+        return self._interaction
+
+    async def defer(self, ephemeral: bool = False, invisible: bool = True):
+        if self._responded:
+            raise discord.InteractionResponded(self._interaction)
+        self._responded = True
+        await self._interaction.api.request("interaction_response")
+        self._interaction.deferred = True
+
+
+class FakeWebhook:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, *, view=None, **kwargs) -> FakeMessage:
+        await self._interaction.api.request("followup")
+        self._interaction.messages.append(content)
+        self._interaction._attach(view)
+        return FakeMessage(self._interaction.api, None, content)
+
+
+class FakeInteraction(discord.Interaction):
+    """An interaction passing the `isinstance` checks of the interaction helpers."""
+
+    def __init__(self, guild: FakeGuild, user: FakeMember, pick_after: float = 0.5):
+        """An interaction passing the `isinstance` checks of the interaction helpers.
+
+        :param guild: the guild the interaction happened in.
+        :param user: the member who interacted.
+        :param pick_after: how long the user takes to pick an option in a select menu.
+        """
+        self.id = snowflake()
+        self.guild_id = guild.id
+        self.user = user
+        self.api = guild.api
+        self.pick_after = pick_after
+        self.messages: List[Optional[str]] = []
+        self.deferred = False
+        self._guild = guild
+        self._response = FakeInteractionResponse(self)
+        self._followup = FakeWebhook(self)
+
+    @property
+    def guild(self) -> FakeGuild:
+        return self._guild
+
+    @property
+    def response(self) -> FakeInteractionResponse:
+        return self._response
+
+    @property
+    def followup(self) -> FakeWebhook:
+        return self._followup
+
+    async def edit_original_response(self, *, content: Optional[str] = None, **kwargs):
+        await self.api.request("edit_original_response")
+        if content is not None:
+            self.messages.append(content)
+        return self
+
+    async def original_response(self):
+        await self.api.request("original_response")
+        return self
+
+    def _attach(self, view):
+        """Have the user pick the first option of a select menu, like "None", or press
+        the first button, like "Yes", after a while."""
+        if view is None or not hasattr(view, "picked_option"):
+            return
+
+        async def pick():
+            await asyncio.sleep(self.pick_after)
+            item = view.children[0]
+            if isinstance(item, discord.ui.Button):
+                return await view.picked_option(True)
+            value = item.options[0].value
+            await view.picked_option(None if value == "None" else value)
+
+        asyncio.get_running_loop().create_task(pick())
+
+
+__all__ = [
+    "CATEGORY_CHANNEL_LIMIT",
+    "FakeCategory",
+    "FakeDiscord",
+    "FakeGuild",
+    "FakeInteraction",
+    "FakeMember",
+    "FakeMessage",
+    "FakeRole",
+    "FakeTextChannel",
+    "snowflake",
+]
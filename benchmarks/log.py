@@ -0,0 +1,107 @@
+"""Time spent on the calling (event loop) thread per log call, writing to the
+sinks directly against handing records to a QueueHandler/QueueListener.
+"""
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from rosetta.utils.log import LOG_FORMAT
+
+
+class SlowStream:
+    """A stream with the write latency of a busy disk or a blocked stdout pipe."""
+
+    def __init__(self, delay: float = 0.0002):
+        self.delay = delay
+
+    def write(self, data):
+        time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+def _sinks(directory: Path, stream) -> List[logging.Handler]:
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(directory / "bench.log")
+    stream_handler = logging.StreamHandler(stream)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    return [file_handler, stream_handler]
+
+
+def _time_in_loop(logger: logging.Logger, records: int) -> float:
+    """Run the log calls from a coroutine, timing only the calls themselves."""
+
+    async def run():
+        elapsed = 0.0
+        for i in range(records):
+            started = time.perf_counter()
+            logger.info("Guild %s is ready", i)
+            elapsed += time.perf_counter() - started
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        return elapsed
+
+    return asyncio.run(run())
+
+
+def _bench(directory: Path, stream, queued: bool, records: int) -> float:
+    logger = logging.getLogger(f"rosetta.bench.{queued}.{id(stream)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handlers = _sinks(directory, stream)
+    listener = None
+    if queued:
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers)
+        listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+    try:
+        return _time_in_loop(logger, records)
+    finally:
+        if listener is not None:
+            listener.stop()
+        for handler in handlers:
+            handler.close()
+        logger.handlers.clear()
+
+
+def run_log(records: int = 2000, delay: float = 0.0002) -> Dict:
+    """Time logging from the event loop, directly and through a queue.
+
+    :param records: Records logged per scenario.
+    :param delay: Latency of each write to the slow stream (s).
+    :return: The time spent on the loop per scenario, to pass to `format_report`.
+    """
+    results = {"records": records, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        for name, stream in (("fast stdout", devnull), ("slow stdout", SlowStream(delay))):
+            for queued in (False, True):
+                results["scenarios"][name, queued] = _bench(Path(directory), stream, queued, records)
+    return results
+
+
+def format_report(results: Dict) -> str:
+    """Render the results of `run_log` as text."""
+    records = results["records"]
+    lines = []
+    for (name, queued), elapsed in results["scenarios"].items():
+        lines.append(
+            f"{name:12} {'queued' if queued else 'direct':7}: "
+            f"{elapsed * 1000:7.1f}ms on the loop for {records} records "
+            f"({elapsed / records * 1e6:.1f}us each)"
+        )
+    return "\n".join(lines)
+
+
+__all__ = ["SlowStream", "format_report", "run_log"]
@@ -0,0 +1,176 @@
+"""Memory benchmark of the member cache policies, against the mock Discord server.
+
+For each policy, a fresh process connects to the mock gateway with those member
+cache flags and startup chunking, and reports its resident size once ready and
+after fetching every guild's members on demand, like `/admin meta-role reapply`
+does. The mock server runs in this process, so it doesn't count towards those.
+
+Memory freed after a bulk command isn't always given back to the system, so the
+resident size after chunking is a high-water mark when the members aren't kept.
+"""
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.discord_server import MockDiscord
+
+ROOT = Path(__file__).resolve().parents[1]
+
+#: The policies compared, as (member cache flags, whether to chunk guilds at startup).
+POLICIES = {
+    # Every member, cached before getting ready: the default
+    "eager": ("all", True),
+    # Members who join or interact, plus the whole guild once a bulk command needs it
+    "lazy": ("joined,interaction", False),
+    # Only members who interact, bulk commands chunking every time
+    "interaction": ("interaction", False),
+    "none": ("none", False),
+}
+
+
+def _rss() -> int:
+    """Get the resident size of this process, in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # The peak rather than the current size, but the best there is without procfs
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def _measure(base: str, flags: str, chunk: bool) -> Dict:
+    """Connect to the mock server with a policy, in a fresh process."""
+    import discord
+
+    from rosetta.utils.discord_api import use_api_base
+    from rosetta.utils.members import get_members, parse_member_cache_flags
+
+    use_api_base(base)
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(
+        intents=intents,
+        member_cache_flags=parse_member_cache_flags(flags),
+        chunk_guilds_at_startup=chunk,
+    )
+    ready = asyncio.Event()
+
+    @client.event
+    async def on_ready():
+        ready.set()
+
+    gc.collect()
+    baseline = _rss()
+    started = time.perf_counter()
+    task = asyncio.create_task(client.start("token"))
+    try:
+        await asyncio.wait_for(ready.wait(), 120)
+        ready_after = time.perf_counter() - started
+        gc.collect()
+        rss_ready = _rss() - baseline
+        cached = sum(len(guild.members) for guild in client.guilds)
+
+        started = time.perf_counter()
+        fetched = 0
+        for guild in client.guilds:
+            fetched += len(await get_members(guild))
+        chunk_after = time.perf_counter() - started
+        kept = sum(len(guild.members) for guild in client.guilds)
+        gc.collect()
+        rss_chunked = _rss() - baseline
+    finally:
+        await client.close()
+        await task
+    return {
+        "ready": ready_after,
+        "cached": cached,
+        "rss_ready": rss_ready,
+        "fetched": fetched,
+        "chunk": chunk_after,
+        "kept": kept,
+        "rss_chunked": rss_chunked,
+    }
+
+
+async def _run_policy(base: str, flags: str, chunk: bool) -> Dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(ROOT), str(ROOT / "src"), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "benchmarks.members",
+        base,
+        flags,
+        "1" if chunk else "0",
+        cwd=str(ROOT),
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"Measuring {flags} failed:\n{stderr.decode(errors='replace')[-2000:]}")
+    return json.loads(stdout.decode().splitlines()[-1])
+
+
+def run_members(
+    *, guilds: int = 1, members: int = 10_000, policies: Optional[List[str]] = None
+) -> Dict:
+    """Measure the memory each member cache policy takes, in a fresh process each.
+
+    :param guilds: how many guilds the bot is in.
+    :param members: how many members each guild has.
+    :param policies: the names of the policies to measure, every one by default.
+    :return: the results of each policy.
+    """
+    server = MockDiscord()
+    for i in range(guilds):
+        server.add_guild(f"Guild {i}", members=members)
+
+    async def run():
+        base = await server.start()
+        try:
+            results = {}
+            for name in policies or POLICIES:
+                results[name] = await _run_policy(base, *POLICIES[name])
+            return results
+        finally:
+            await server.stop()
+
+    return {"members": guilds * members, "policies": asyncio.run(run())}
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f}MiB"
+
+
+def format_report(results: Dict) -> str:
+    """Render the results of `run_members` as text."""
+    per_10k = 10_000 / max(1, results["members"])
+    lines = [f"{results['members']} members, resident size per 10k members:"]
+    for name, result in results["policies"].items():
+        lines.append(
+            f"  {name}: ready in {result['ready']:.2f}s with {result['cached']} cached, "
+            f"{_mib(result['rss_ready'] * per_10k)}; on-demand chunk of {result['fetched']} "
+            f"in {result['chunk']:.2f}s, {result['kept']} kept, "
+            f"{_mib(result['rss_chunked'] * per_10k)} after"
+        )
+    return "\n".join(lines)
+
+
+__all__ = ["POLICIES", "format_report", "run_members"]
+
+
+if __name__ == "__main__":
+    _base, _flags, _chunk = sys.argv[1:]
+    print(json.dumps(asyncio.run(_measure(_base, _flags, _chunk == "1"))))
@@ -0,0 +1,81 @@
+"""Benchmark of meta role expressions: the `atleast` threshold operator against
+the OR of combinations it replaces, and the tokenizer on realistic and
+adversarial input.
+"""
+import itertools
+import timeit
+from typing import Callable, Dict
+
+from rosetta.utils.role_expr import MetaRoleEvaluator
+
+ROLE_IDS = [str(711534517432614922 + i) for i in range(7)]
+
+#: "Finished any 3 of these 7 games" with the threshold operator
+THRESHOLD_EXPR = "atleast(3; {})".format(", ".join(ROLE_IDS))
+
+#: The same condition expanded into an OR of every combination of 3
+EXPANDED_EXPR = " || ".join(
+    "({})".format(" && ".join(combination))
+    for combination in itertools.combinations(ROLE_IDS, 3)
+)
+
+#: Expressions to benchmark the tokenizer with, realistic first then adversarial
+TOKENIZER_CASES = {
+    "realistic": "({}) && !{}".format(" || ".join(ROLE_IDS[:6]), ROLE_IDS[6]),
+    "threshold": THRESHOLD_EXPR,
+    "expanded": EXPANDED_EXPR,
+    "long symbol": "7" * 10000,
+    "long chain": " || ".join(ROLE_IDS * 300),
+    "deep nesting": "(" * 500 + "!" * 500 + ROLE_IDS[0] + ")" * 500,
+}
+
+
+def _time(func: Callable, number: int) -> float:
+    """Get the best time of a call out of 3 repeats, in seconds."""
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def run_role_expr(number: int = 200) -> Dict:
+    """Time evaluating and tokenizing meta role expressions.
+
+    :param number: Calls per timing, the best of 3 repeats being kept.
+    :return: The timings in seconds, to pass to `format_report`.
+    """
+    evaluator = MetaRoleEvaluator(dict(zip(ROLE_IDS, [True, False] * 4)))
+    evaluate = {
+        name: (len(expr), _time(lambda: evaluator.evaluate(expr), number))
+        for name, expr in (("threshold", THRESHOLD_EXPR), ("expanded", EXPANDED_EXPR))
+    }
+    tokenize = {
+        name: (len(expr), _time(lambda: evaluator.tokenize(expr), max(1, number // 10)))
+        for name, expr in TOKENIZER_CASES.items()
+    }
+    # 4x the input should take about 4x the time, far from the 16x of a quadratic scan
+    short = " || ".join(ROLE_IDS * 150)
+    long = " || ".join(ROLE_IDS * 600)
+    scaling = _time(lambda: evaluator.tokenize(long), max(1, number // 10)) / _time(
+        lambda: evaluator.tokenize(short), max(1, number // 10)
+    )
+    return {"evaluate": evaluate, "tokenize": tokenize, "scaling": scaling}
+
+
+def format_report(results: Dict) -> str:
+    """Render the results of `run_role_expr` as text."""
+    lines = ["evaluate, atleast(3; 7 ids) against its expanded form:"]
+    for name, (length, elapsed) in results["evaluate"].items():
+        lines.append(f"  {name:>9}: {length:>6} chars, {elapsed * 1e6:>8.1f}us")
+    lines.append("tokenize:")
+    for name, (length, elapsed) in results["tokenize"].items():
+        lines.append(f"  {name:>12}: {length:>6} chars, {elapsed * 1e6:>8.1f}us")
+    lines.append(f"tokenizing 4x the input took {results['scaling']:.1f}x the time")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "EXPANDED_EXPR",
+    "ROLE_IDS",
+    "THRESHOLD_EXPR",
+    "TOKENIZER_CASES",
+    "format_report",
+    "run_role_expr",
+]
@@ -0,0 +1,13 @@
+"""Django settings for the benchmarks: genki's own, on a throwaway SQLite database
+with uploaded files (like archives) stored next to it."""
+import os
+
+from genki.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["ROSETTA_BENCH_DB"],
+    }
+}
+MEDIA_ROOT = os.path.join(os.path.dirname(os.environ["ROSETTA_BENCH_DB"]), "media")
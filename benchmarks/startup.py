@@ -0,0 +1,234 @@
+"""Cold start benchmark: the time from launching the bot to `on_ready`, and its imports.
+
+The bot is launched with `scripts.py start` under `python -X importtime`, pointed at
+the mock Discord API and gateway of `benchmarks.discord_server` and a seeded SQLite
+database, with no cache snapshot, and timed until it logs that it's ready. Results
+can be saved as a baseline, and later runs fail when they are slower than it.
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from benchmarks.database import seed_guild, setup_database
+from benchmarks.discord_server import MockDiscord
+from benchmarks.fakes import FakeRole
+
+ROOT = Path(__file__).resolve().parents[1]
+
+#: What the bot logs at the end of `on_ready`.
+READY_MARKER = "after starting up"
+
+
+class ImportTime(NamedTuple):
+    """An import, as reported by `python -X importtime` (times in microseconds)."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """Parse the output of `python -X importtime`, ignoring anything else in it.
+
+    :param output: the standard error of the process.
+    :return: the imports, in the order they finished.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        # Nested imports are indented by two more spaces per level
+        depth = (len(name.rstrip()) - len(module) - 1) // 2
+        imports.append(ImportTime(module, int(own), int(cumulative), depth))
+    return imports
+
+
+class _SeededGuild:
+    """A mock server guild with the interface `seed_guild` expects."""
+
+    def __init__(self, server: MockDiscord, state: dict):
+        self.server = server
+        self.state = state
+        self.id = state["id"]
+        self.name = state["name"]
+
+    def add_role(self, name: str) -> FakeRole:
+        return FakeRole(name, self.server.add_role(self.state, name))
+
+
+async def _start_once(base: str, database: Path, root: Path, timeout: float) -> Dict:
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        "ROSETTA_BENCH_DB": str(database),
+        "ROSETTA_DISCORD_API_BASE": base,
+        "ROSETTA_TOKEN": "bench",
+        "ROSETTA_ROOT": str(root),
+        "ROSETTA_DEBUG": "",
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(ROOT), str(ROOT / "src"), os.environ.get("PYTHONPATH")])
+        ),
+        "PYTHONUNBUFFERED": "1",
+    }
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-X",
+        "importtime",
+        str(ROOT / "scripts.py"),
+        "start",
+        cwd=str(root),
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # The import times alone can fill the pipe, so read it all along
+    stderr = asyncio.create_task(process.stderr.read())
+    output = []
+
+    async def wait_ready() -> Optional[float]:
+        async for line in process.stdout:
+            output.append(line.decode(errors="replace"))
+            if READY_MARKER in output[-1]:
+                return time.perf_counter() - started
+        return None
+
+    try:
+        ready = await asyncio.wait_for(wait_ready(), timeout)
+    except asyncio.TimeoutError:
+        ready = None
+    finally:
+        if process.returncode is None:
+            # The bot closes cleanly on SIGTERM
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 10)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+    errors = (await stderr).decode(errors="replace")
+    if ready is None:
+        logs = "".join(output[-20:]) + "\n".join(
+            line for line in errors.splitlines()[-20:] if not line.startswith("import time:")
+        )
+        raise RuntimeError(f"The bot didn't get ready within {timeout}s:\n{logs}")
+    imports = parse_importtime(errors)
+    return {
+        "ready": ready,
+        "imports": sum(i.cumulative_us for i in imports if i.depth == 0) / 1e6,
+        "slowest": sorted(
+            ((i.module, i.cumulative_us / 1e6) for i in imports if i.depth == 0),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:10],
+    }
+
+
+def run_startup(
+    *,
+    runs: int = 3,
+    guilds: int = 1,
+    members: int = 100,
+    timeout: float = 60.0,
+    database: Optional[Path] = None,
+) -> Dict:
+    """Start the bot several times against the mock Discord server and time it.
+
+    :param runs: how many times to start the bot, the medians being reported.
+    :param guilds: how many guilds the bot is in, each with every game configured.
+    :param members: how many members each guild has.
+    :param timeout: how long to wait for each start, in seconds.
+    :param database: the SQLite database to use, a temporary one by default.
+    :return: the results, times being in seconds.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        database = database or Path(tmp) / "bench.sqlite3"
+        setup_database(database)
+        server = MockDiscord()
+        for i in range(guilds):
+            state = server.add_guild(f"Guild {i}", members=members)
+            server.add_channel(state["id"], "start-here")
+            seed_guild(_SeededGuild(server, state))
+
+        async def run():
+            base = await server.start()
+            try:
+                results = []
+                for i in range(runs):
+                    # A fresh root every time, so there's never a cache snapshot to load
+                    root = Path(tmp) / f"run{i}"
+                    root.mkdir()
+                    results.append(await _start_once(base, database, root, timeout))
+                return results
+            finally:
+                await server.stop()
+
+        results = asyncio.run(run())
+    return {
+        "runs": runs,
+        "ready": statistics.median(r["ready"] for r in results),
+        "imports": statistics.median(r["imports"] for r in results),
+        "ready_times": [r["ready"] for r in results],
+        "slowest": results[-1]["slowest"],
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Compare results to a baseline.
+
+    :param results: the results of `run_startup`.
+    :param baseline: the results of an earlier run, like one saved with `save_baseline`.
+    :param tolerance: how much slower than the baseline is acceptable, as a fraction.
+    :return: a description of every regression, if any.
+    """
+    regressions = []
+    for key in ("imports", "ready"):
+        if key in baseline and results[key] > baseline[key] * (1 + tolerance):
+            regressions.append(
+                f"{key}: {results[key]:.2f}s, over {baseline[key]:.2f}s + {tolerance:.0%}"
+            )
+    return regressions
+
+
+def save_baseline(results: Dict, path: Path):
+    """Save the medians of results, to compare later runs to."""
+    path.write_text(json.dumps({key: results[key] for key in ("imports", "ready")}, indent=2) + "\n")
+
+
+def load_baseline(path: Path) -> Dict:
+    """Load a baseline saved with `save_baseline`."""
+    return json.loads(path.read_text())
+
+
+def format_report(results: Dict) -> str:
+    """Render the results of `run_startup` as text."""
+    lines = [
+        f"ready after {results['ready']:.2f}s (median of {results['runs']}: "
+        + ", ".join(f"{t:.2f}s" for t in results["ready_times"])
+        + ")",
+        f"imports: {results['imports']:.2f}s, slowest:",
+    ]
+    for module, seconds in results["slowest"]:
+        lines.append(f"  {module}: {seconds:.3f}s")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "ImportTime",
+    "READY_MARKER",
+    "compare",
+    "format_report",
+    "load_baseline",
+    "parse_importtime",
+    "run_startup",
+    "save_baseline",
+]
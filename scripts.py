@@ -6,7 +6,6 @@ import subprocess
 from pathlib import Path
 
 import click
-import django
 
 
 @click.group()
@@ -50,10 +49,175 @@ def test():
 @scripts.command()
 def start():
     """Run the bot."""
+    import django
+
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "genki.settings")
     django.setup()
     runpy.run_module("rosetta.main", run_name="__main__")
 
 
+@scripts.command()
+@click.option("--workers", type=int, help="Worker processes, ROSETTA_WORKERS by default.")
+@click.option(
+    "--shards",
+    type=int,
+    help="Total shards, ROSETTA_SHARD_COUNT or Discord's recommendation by default.",
+)
+def supervise(workers, shards):
+    """Run the bot's shards over several worker processes, restarting those that exit."""
+    import asyncio
+    import logging
+    import sys
+
+    from rosetta import config
+    from rosetta.utils.discord_api import use_api_base
+    from rosetta.utils.log import LOG_FORMAT
+    from rosetta.utils.sharding import recommended_shard_count
+    from rosetta.utils.supervisor import Supervisor
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    shard_count = shards or config.SHARD_COUNT
+    if shard_count is None:
+        if config.DISCORD_API_BASE:
+            use_api_base(config.DISCORD_API_BASE)
+        shard_count = asyncio.run(recommended_shard_count(config.TOKEN))
+    Supervisor(
+        [sys.executable, str(Path(__file__).resolve()), "start"],
+        shard_count,
+        workers or config.WORKERS,
+        metrics_port=config.METRICS_PORT,
+    ).run()
+
+
+@scripts.group()
+def bench():
+    """Run benchmarks against fake Discord objects and a throwaway database."""
+    pass
+
+
+@bench.command()
+@click.option("--guilds", default=1, show_default=True, help="Guilds to spread users over.")
+@click.option("--users", default=100, show_default=True, help="Users clicking per guild.")
+@click.option("--clicks-per-user", default=1, show_default=True, help="Simultaneous clicks per user.")
+@click.option("--concurrency", default=50, show_default=True, help="Clicks handled at once.")
+@click.option("--latency", default=0.05, show_default=True, help="Mean Discord API latency (s).")
+@click.option("--jitter", default=0.02, show_default=True, help="Discord API latency jitter (s).")
+@click.option("--history", default=100, show_default=True, help="Existing channels per game.")
+@click.option("--meta-roles", default=0, show_default=True, help="Meta roles per guild.")
+@click.option("--admission-rate", type=float, help="Channel creations per second per guild.")
+@click.option("--admission-concurrency", type=int, help="Channel creations at once per guild.")
+@click.option("--seed", default=0, show_default=True, help="Seed of the random choices.")
+def clicks(**options):
+    """Simulate many users clicking game buttons at once."""
+    from benchmarks.clicks import format_report, run_clicks
+
+    click.echo(format_report(run_clicks(**options)))
+
+
+@bench.command()
+@click.option("--channels", default=20, show_default=True, help="Channels archived per scenario.")
+@click.option("--size", default=1024 * 1024, show_default=True, help="Size of each archive (bytes).")
+@click.option("--export-delay", default=0.0, show_default=True, help="Extra time per export (s).")
+@click.option("--concurrency", default=5, show_default=True, help="Concurrent archives.")
+@click.option("--latency", default=0.05, show_default=True, help="Mean Discord API latency (s).")
+def archive(**options):
+    """Archive channels through the real pipeline with a stub exporter."""
+    from benchmarks.archive import format_report, run_archive
+
+    click.echo(format_report(run_archive(**options)))
+
+
+@bench.command()
+@click.option("--runs", default=3, show_default=True, help="Times to start the bot.")
+@click.option("--guilds", default=1, show_default=True, help="Guilds the bot is in.")
+@click.option("--members", default=100, show_default=True, help="Members per guild.")
+@click.option("--timeout", default=60.0, show_default=True, help="Time to wait for on_ready (s).")
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Results of an earlier run to compare to, failing if slower.",
+)
+@click.option("--tolerance", default=0.2, show_default=True, help="Acceptable slowdown (fraction).")
+@click.option("--update", is_flag=True, help="Save this run as the baseline instead.")
+def startup(runs, guilds, members, timeout, baseline, tolerance, update):
+    """Time the bot's cold start, from launching it to on_ready."""
+    from benchmarks.startup import compare, format_report, load_baseline, run_startup, save_baseline
+
+    results = run_startup(runs=runs, guilds=guilds, members=members, timeout=timeout)
+    click.echo(format_report(results))
+    if baseline is None:
+        return
+    if update:
+        save_baseline(results, baseline)
+        click.secho(f"Saved the baseline to {baseline}.", fg="green")
+        return
+    regressions = compare(results, load_baseline(baseline), tolerance)
+    for regression in regressions:
+        click.secho(f"Regression: {regression}", fg="red")
+    if regressions:
+        raise SystemExit(1)
+
+
+@bench.command()
+@click.option("--guilds", default=1, show_default=True, help="Guilds the bot is in.")
+@click.option("--members", default=10_000, show_default=True, help="Members per guild.")
+@click.option(
+    "--policy",
+    "policies",
+    multiple=True,
+    type=click.Choice(["eager", "lazy", "interaction", "none"]),
+    help="Member cache policies to measure, every one by default.",
+)
+def members(guilds, members, policies):
+    """Measure the memory of each member cache policy."""
+    from benchmarks.members import format_report, run_members
+
+    click.echo(format_report(run_members(guilds=guilds, members=members, policies=list(policies))))
+
+
+@bench.command("role-expr")
+@click.option("--number", default=200, show_default=True, help="Calls per timing.")
+def role_expr(number):
+    """Time evaluating and tokenizing meta role expressions."""
+    from benchmarks.role_expr import format_report, run_role_expr
+
+    click.echo(format_report(run_role_expr(number=number)))
+
+
+@bench.command()
+@click.option("--records", default=2000, show_default=True, help="Records logged per scenario.")
+@click.option("--delay", default=0.0002, show_default=True, help="Latency of each slow write (s).")
+def log(records, delay):
+    """Time logging from the event loop, directly and through a queue."""
+    from benchmarks.log import format_report, run_log
+
+    click.echo(format_report(run_log(records=records, delay=delay)))
+
+
+@bench.command("discord-server")
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to bind to.")
+@click.option("--port", default=8080, show_default=True, help="Port to bind to.")
+@click.option("--guilds", default=1, show_default=True, help="Guilds the bot is in.")
+@click.option("--members", default=100, show_default=True, help="Members per guild.")
+@click.option("--latency", default=0.0, show_default=True, help="Latency of every request (s).")
+@click.option("--shards", default=1, show_default=True, help="Shards recommended to the bot.")
+def discord_server(host, port, guilds, members, latency, shards):
+    """Serve a mock Discord API and gateway to point the bot at."""
+    import asyncio
+
+    from benchmarks.discord_server import MockDiscord
+
+    async def serve():
+        server = MockDiscord(latency=latency, shards=shards)
+        for i in range(guilds):
+            guild = server.add_guild(f"Guild {i}", members=members)
+            server.add_channel(guild["id"], "start-here")
+        base = await server.start(host, port)
+        click.echo(f"Run the bot with ROSETTA_DISCORD_API_BASE={base}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
 if __name__ == "__main__":
     scripts()
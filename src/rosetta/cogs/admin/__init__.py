@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional
+import asyncio
 import logging
-from asgiref.sync import sync_to_async
+import time
 
 import discord
-from discord.ext import tasks
 from discord.ext.commands import Cog, Converter
 from discord.utils import get
 
@@ -15,14 +15,26 @@ from rosetta.cogs.admin.utils import (
     validate_expr,
     create_meta_role_config,
     clean_expr,
-    get_all_meta_roles_per_guild,
     get_meta_role,
+    get_meta_role_names,
+    get_meta_roles_changed_since,
 )
 from rosetta.cogs.playthrough.ui import GameButton
 from rosetta.cogs.playthrough.utils.channel import archive_channel
+from rosetta import config
 from rosetta.utils import checks
-from rosetta.utils.role_expr import MetaRoleEvaluator
-from rosetta.utils.db import get_channel_in_db, set_channel_finished
+from rosetta.utils.metrics import STAGE_SECONDS
+from rosetta.utils.profiler import SamplingProfiler
+from rosetta.utils.role_expr import canonicalize
+from rosetta.utils.scheduler import background
+from rosetta.utils.db import (
+    FULL_REFRESH_INTERVAL,
+    get_channel_in_db,
+    meta_role_graph_cache,
+    set_channel_finished,
+)
+from rosetta.utils.interactions import auto_defer, respond
+from rosetta.utils.members import get_members
 
 
 class MetaRoleConverter(Converter):
@@ -43,27 +55,48 @@ class Admin(Cog):
     def __init__(self, client):
         self.client = client
         self.logger.info(f"Cog {self.__class__.__name__} loaded successfully.")
-        self.guild_meta_roles = {}
-        self.cache.start()
+        self.guild_meta_roles = client.caches.register(
+            "guild_meta_roles",
+            get_meta_role_names,
+            delta_loader=get_meta_roles_changed_since,
+            ttl=2 * 60 * 60,
+            maxsize=1000,
+            refresh_interval=60,
+            full_refresh_interval=FULL_REFRESH_INTERVAL,
+        )
+        self.profiler: Optional[SamplingProfiler] = None
+        #: When the last full cache refresh was started, by the monotonic clock
+        self._last_full_refresh: Optional[float] = None
 
-    def meta_role_autocomplete(self, ctx: discord.AutocompleteContext) -> list[str]:
-        mrs: List[str] = self.guild_meta_roles[ctx.interaction.guild_id]
+    async def meta_role_autocomplete(
+        self, ctx: discord.AutocompleteContext
+    ) -> list[str]:
+        mrs: List[str] = await self.guild_meta_roles.get(ctx.interaction.guild_id)
         return [mr for mr in mrs if mr.lower().startswith(ctx.value.lower())]
 
     def cog_unload(self) -> None:
-        self.cache.cancel()
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.client.caches.unregister(self.guild_meta_roles.name)
         return super().cog_unload()
 
-    @tasks.loop(minutes=5)
-    async def cache(self):
-        self.guild_meta_roles = await get_all_meta_roles_per_guild()
-
     admin = discord.SlashCommandGroup(
         "admin", "Administrative commands.", checks=[checks.is_bot_admin]
     )
 
-    archive = admin.create_subgroup("archive", "Manual channel archival commands.")
-    meta_role = admin.create_subgroup("meta-role", "Meta role commands.")
+    # Subcommands only run the checks of their direct parent
+    archive = admin.create_subgroup(
+        "archive", "Manual channel archival commands.", checks=[checks.is_bot_admin]
+    )
+    meta_role = admin.create_subgroup(
+        "meta-role", "Meta role commands.", checks=[checks.is_bot_admin]
+    )
+    cache = admin.create_subgroup(
+        "cache", "Cache inspection commands.", checks=[checks.is_bot_admin]
+    )
+    profile = admin.create_subgroup(
+        "profile", "Sampling profiler commands.", checks=[checks.is_bot_admin]
+    )
 
     @admin.command(
         description="Send a message containing the buttons to start playthrough channels."
@@ -156,23 +189,24 @@ class Admin(Cog):
         if not view.value:
             return
 
-        # Archive each channel
-        for i, channel in enumerate(category_channels):
-            try:
-                channel_obj = await get_channel_in_db(channel)
-                archive = await archive_channel(ctx, channel_obj)
-                if archive:
-                    if finished:
-                        await set_channel_finished(channel, True)
+        # Archive each channel, behind any interactive requests
+        with background():
+            for i, channel in enumerate(category_channels):
+                try:
+                    channel_obj = await get_channel_in_db(channel)
+                    archive = await archive_channel(ctx, channel_obj)
+                    if archive:
+                        if finished:
+                            await set_channel_finished(channel_obj, True)
+                        await interaction.edit_original_message(
+                            content=f"Archived {channel.name} ({i+1}/{len(category_channels)})",
+                            view=None,
+                        )
+                except Exception as e:
                     await interaction.edit_original_message(
-                        content=f"Archived {channel.name} ({i+1}/{len(category_channels)})",
+                        content=f"Failed to archive {channel.name}. Skipping...\n```{e}```",
                         view=None,
                     )
-            except Exception as e:
-                await interaction.edit_original_message(
-                    content=f"Failed to archive {channel.name}. Skipping...\n```{e}```",
-                    view=None,
-                )
 
     @meta_role.command(description="Add a meta role to the server.")
     async def create(
@@ -205,7 +239,7 @@ class Admin(Cog):
             )
             return
         logic = clean_expr(logic)
-        game_configs, err = await validate_expr(logic)
+        game_configs, err = await validate_expr(logic, ctx.guild_id, role_id=existing_role_id)
         if err:
             await ctx.followup.send(f"Invalid expression: {err}")
             return
@@ -217,13 +251,24 @@ class Admin(Cog):
             role = await ctx.guild.create_role(name=name, colour=colour)
             existing_role_id = role.id
         await create_meta_role_config(
-            name, colour, logic, ctx.guild_id, game_configs, existing_role_id
+            name,
+            colour,
+            logic,
+            ctx.guild_id,
+            role_id=existing_role_id,
+            game_configs=game_configs,
         )
-        await ctx.followup.send(f"Added the `{name}` meta role!", ephemeral=True)
+        message = f"Added the `{name}` meta role!"
+        _, canonical = canonicalize(logic)
+        if "".join(canonical.split()) != "".join(logic.split()):
+            message += f" Its expression will be evaluated as `{canonical}`."
+        await ctx.followup.send(message, ephemeral=True)
 
     @meta_role.command(
         description="Re-apply a Meta Role to the server."
     )
+    # Fetching the members of a large guild can take a while
+    @auto_defer()
     async def reapply(
         self,
         ctx: discord.ApplicationContext,
@@ -233,39 +278,149 @@ class Admin(Cog):
             autocomplete=meta_role_autocomplete,
         ),
     ):
-        members = ctx.guild.members
+        # Reapplying is rare, so rebuild the guild's graph rather than risk a stale one
+        graphs = meta_role_graph_cache(self.client.caches)
+        graphs.invalidate(ctx.guild_id)
+        graph = await graphs.get(ctx.guild_id)
+        node = graph.get(meta_role.id)
+        if node is None:
+            await respond(
+                ctx,
+                f"The `{meta_role.name}` meta role has an invalid or cyclic expression.",
+                ephemeral=True,
+            )
+            return
+
         # Dry run
         members_to_add = []
-        for member in members:
+        for member in await get_members(ctx.guild):
             user_role_ids = set([str(role.id) for role in member.roles])
-            related_games = await sync_to_async(meta_role.games.all)()
-            related_roles = [game.completion_role_id for game in related_games]
-            evaluator_input = {
-                role_id: role_id in user_role_ids for role_id in related_roles
-            }
-            evaluator = MetaRoleEvaluator(evaluator_input)
-            result = evaluator.evaluate(meta_role.expression)
-            if result:
+            if graph.evaluate(user_role_ids, [node.role_id])[node.role_id]:
                 members_to_add.append(member)
 
         # Confirmation prompt
         view = ConfirmView(timeout=20)
-        interaction = await ctx.response.send_message(
+        # Replacing a deferred response, so the prompt is the original response either way
+        await respond(
+            ctx,
             f"Found {len(members_to_add)} members to add {meta_role.name} to. Are you sure you want to proceed?",
             view=view,
             ephemeral=True,
+            replace=True,
         )
-        view.interaction = interaction
+        view.interaction = ctx.interaction
         await view.wait()
         if not view.value:
             return
 
         role_in_discord = get(ctx.guild.roles, id=int(meta_role.role_id))
-        for member in members_to_add:
-            await member.add_roles(role_in_discord)
+        with background():
+            for member in members_to_add:
+                await member.add_roles(role_in_discord)
 
         await ctx.followup.send(f"Re-applied the `{meta_role.name}` meta role!", ephemeral=True)
 
+    @admin.command(description="Show p50/p95/p99 latencies of each traced stage.")
+    async def timings(self, ctx: discord.ApplicationContext):
+        lines = []
+        for operation, stage_name in sorted(STAGE_SECONDS.label_values()):
+            labels = {"operation": operation, "stage": stage_name}
+            _, count, _ = STAGE_SECONDS.snapshot(**labels)
+            p50, p95, p99 = (STAGE_SECONDS.quantile(q, **labels) for q in (0.5, 0.95, 0.99))
+            lines.append(
+                f"{operation}.{stage_name}: n={count} "
+                f"p50={p50:.3f}s p95={p95:.3f}s p99={p99:.3f}s"
+            )
+        await ctx.response.send_message(
+            "```\n{}\n```".format("\n".join(lines) or "Nothing traced yet."),
+            ephemeral=True,
+        )
+
+    @cache.command(description="Show statistics for every cache namespace.")
+    async def stats(self, ctx: discord.ApplicationContext):
+        lines = []
+        for name, info in self.client.caches.info().items():
+            oldest_age = info["oldest_age"]
+            lines.append(
+                f"{name}: {info['entries']}/{info['maxsize'] or '-'} entries, "
+                f"hits={info['hits']} misses={info['misses']} "
+                f"({info['hit_ratio']:.0%}), loads={info['loads']} "
+                f"in {info['load_time']:.2f}s (full={info['full_refreshes']} "
+                f"delta={info['delta_refreshes']}), evictions={info['evictions']}, "
+                f"oldest={f'{oldest_age:.0f}s' if oldest_age is not None else '-'}"
+            )
+        await ctx.response.send_message(
+            "```\n{}\n```".format("\n".join(lines) or "No caches registered."),
+            ephemeral=True,
+        )
+
+    @cache.command(description="Reload every cache namespace from the database.")
+    async def refresh(
+        self,
+        ctx: discord.ApplicationContext,
+        full: discord.Option(
+            bool, "Reload everything rather than only what changed?", default=True
+        ),
+    ):
+        if full:
+            now = time.monotonic()
+            if self._last_full_refresh is not None:
+                remaining = self._last_full_refresh + config.CACHE_REFRESH_COOLDOWN - now
+                if remaining > 0:
+                    await ctx.response.send_message(
+                        f"The caches were fully refreshed recently, please try again "
+                        f"in {remaining:.0f}s or refresh only what changed.",
+                        ephemeral=True,
+                    )
+                    return
+            self._last_full_refresh = now
+        await ctx.defer(ephemeral=True)
+        await self.client.caches.refresh_all(full=full)
+        await ctx.followup.send("Caches refreshed!", ephemeral=True)
+
+    @profile.command(description="Start sampling the running bot.")
+    async def start(self, ctx: discord.ApplicationContext):
+        if self.profiler is not None:
+            await ctx.response.send_message(
+                "The profiler is already running!", ephemeral=True
+            )
+            return
+        self.profiler = SamplingProfiler(
+            interval=config.PROFILE_INTERVAL,
+            task_interval=config.PROFILE_TASK_INTERVAL,
+        )
+        self.profiler.start()
+        self.logger.info("Profiler started by %s.", ctx.author.name)
+        await ctx.response.send_message(
+            "Profiler started, use `/admin profile stop` to write out the profile.",
+            ephemeral=True,
+        )
+
+    @profile.command(description="Stop sampling and write out the profile.")
+    async def stop(self, ctx: discord.ApplicationContext):
+        if self.profiler is None:
+            await ctx.response.send_message(
+                "The profiler is not running!", ephemeral=True
+            )
+            return
+        profiler, self.profiler = self.profiler, None
+        await ctx.defer(ephemeral=True)
+        # Joining the sampler and writing out the profiles block, so keep them off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, profiler.stop)
+        paths = await loop.run_in_executor(
+            None,
+            profiler.dump,
+            config.LOG_ROOT / "profiles",
+            time.strftime("profile-%Y%m%d-%H%M%S"),
+        )
+        self.logger.info("Profile written to %s.", ", ".join(map(str, paths)))
+        await ctx.followup.send(
+            f"Profiled {profiler.duration:.0f}s ({profiler.samples} samples), written to:\n"
+            + "\n".join(f"`{path}`" for path in paths),
+            ephemeral=True,
+        )
+
 
 def setup(client):
     client.add_cog(Admin(client))
@@ -1,5 +1,5 @@
 import re
-from typing import List, Union
+from typing import Dict, List, Union
 
 from asgiref.sync import sync_to_async
 import click
@@ -11,7 +11,7 @@ from django.db import IntegrityError
 
 from playthrough.models import GameConfig, MetaRoleConfig
 from rosetta.utils import ask
-from rosetta.utils.role_expr import MetaRoleEvaluator
+from rosetta.utils.role_expr import MetaRoleEvaluator, get_symbols
 from .utils import meta_role_to_embed, meta_roles_to_embed
 
 
@@ -25,6 +25,16 @@ def _clean_expression(expression: str) -> str:
     return expression
 
 
+@sync_to_async
+def _get_game_configs_by_role(guild_id: str, role_ids: List[str]) -> Dict[str, GameConfig]:
+    return {
+        str(game_config.completion_role_id): game_config
+        for game_config in GameConfig.objects.filter(
+            guild_id=str(guild_id), completion_role_id__in=role_ids
+        )
+    }
+
+
 async def _validate_expression(
     context: DiscordContext, expression: str
 ) -> Union[List[GameConfig], None]:
@@ -33,34 +43,30 @@ async def _validate_expression(
     :param context: The Discord Context.
     :param expression: The expression to check.
     :return: Boolean of whether or not it's a valid expression."""
-    role_ids = re.findall(r'\d+', expression)
-    game_configs = []
-    unconfigured_games = []
-    for _role_id in role_ids:
-        game_config = await sync_to_async(GameConfig.objects.filter(
-            completion_role_id=_role_id
-        ).first)()
-        if game_config is not None:
-            game_configs.append(game_config)
-        else:
-            unconfigured_games.append(_role_id)
-    if len(game_configs) != len(role_ids):
-        message = 'Could not find configured games for: '
-        message += str(', '.join(
-            [f'<@&{_role_id}>' for _role_id in unconfigured_games]
-        ))
-        await context.send(message)
-        return None
-    evaluator = MetaRoleEvaluator({_role_id: False for _role_id in role_ids})
     try:
-        evaluator.evaluate(expression)
-        return game_configs
+        program = MetaRoleEvaluator({}).compile(expression)
+        role_ids = get_symbols(program)
+        MetaRoleEvaluator(
+            {_role_id: False for _role_id in role_ids}
+        ).evaluate_postfix(program)
     except Exception:
         await context.send((
             'The provided expression is invalid. Only use logical operators '
             'and role IDs / pings'
         ))
         return None
+    game_configs = await _get_game_configs_by_role(context.guild.id, role_ids)
+    unconfigured_games = [
+        _role_id for _role_id in role_ids if _role_id not in game_configs
+    ]
+    if unconfigured_games:
+        message = 'Could not find configured games for: '
+        message += str(', '.join(
+            [f'<@&{_role_id}>' for _role_id in unconfigured_games]
+        ))
+        await context.send(message)
+        return None
+    return [game_configs[_role_id] for _role_id in role_ids]
 
 
 @click.group()
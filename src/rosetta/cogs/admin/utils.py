@@ -1,10 +1,19 @@
 import re
-from typing import List, Tuple, Optional
-from asgiref.sync import sync_to_async
+from collections import defaultdict
+from typing import Iterable, List, Tuple, Optional
 
-from playthrough.models import MetaRoleConfig, GameConfig, Guild
+from playthrough.models import MetaRoleConfig, GameConfig
 
-from rosetta.utils.role_expr import MetaRoleEvaluator
+from rosetta.utils.db import META_ROLE_TABLES, load_changed_since, meta_role_changes
+from rosetta.utils.role_expr import (
+    MetaRoleEvaluator,
+    TokenType,
+    build_tree,
+    get_symbols,
+    simplify,
+)
+from rosetta.utils.role_graph import MetaRoleGraph
+from rosetta.utils.telemetry import timed_sync_to_async
 
 
 def clean_expr(expr: str) -> str:
@@ -17,28 +26,60 @@ def clean_expr(expr: str) -> str:
     return expr
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_meta_role(guild_id: int, name: str) -> Optional[MetaRoleConfig]:
     return MetaRoleConfig.objects.filter(name=name, guild_id=guild_id).prefetch_related("games").first()
 
 
-@sync_to_async
-def get_all_meta_roles_per_guild() -> dict[str, list[str]]:
-    ret = {}
-    guilds = list(Guild.objects.prefetch_related("meta_roles").all())
+def _get_meta_role_names_per_guild(
+    guild_ids: Optional[Iterable[int]] = None,
+) -> dict[int, list[str]]:
+    meta_roles = MetaRoleConfig.objects.all()
+    if guild_ids is not None:
+        meta_roles = meta_roles.filter(guild_id__in=[str(_id) for _id in guild_ids])
 
-    for guild in guilds:
-        ret[int(guild.id)] = [meta_role.name for meta_role in guild.meta_roles.all()]
+    ret = defaultdict(list)
+    for guild_id, name in meta_roles.values_list("guild_id", "name"):
+        ret[int(guild_id)].append(name)
+    return dict(ret)
 
-    return ret
 
+@timed_sync_to_async
+def get_all_meta_roles_per_guild() -> dict[int, list[str]]:
+    return _get_meta_role_names_per_guild()
 
-@sync_to_async
+
+@timed_sync_to_async
+def get_meta_roles_changed_since(
+    mark: Optional[tuple],
+) -> Tuple[tuple, dict[int, list[str]], Optional[set[int]]]:
+    """Get the Meta Role names of the Guilds whose Meta Roles changed since a high-water mark.
+
+    :param mark: the mark returned by the previous call, or `None` for every Guild.
+    :return: The new mark, the names for the changed Guilds keyed by Guild ID,
+        and the IDs of changed Guilds with no Meta Roles left (`None` on a full reload)."""
+    return load_changed_since(
+        mark, meta_role_changes, META_ROLE_TABLES, _get_meta_role_names_per_guild
+    )
+
+
+@timed_sync_to_async
+def get_meta_role_names(guild_id: int) -> list[str]:
+    """Get the names of all the Meta Roles in a given Guild.
+
+    :param guild_id: the ID of the guild to fetch for.
+    :return: The names of the guild's MetaRoleConfigs."""
+    return list(
+        MetaRoleConfig.objects.filter(guild_id=str(guild_id)).values_list("name", flat=True)
+    )
+
+
+@timed_sync_to_async
 def get_existing_meta_role(name: str) -> Optional[MetaRoleConfig]:
     return MetaRoleConfig.objects.filter(name=name).first()
 
 
-@sync_to_async
+@timed_sync_to_async
 def create_meta_role_config(
     name: str,
     colour: str,
@@ -58,30 +99,24 @@ def create_meta_role_config(
     meta_role_config.games.add(*game_configs)
 
 
-@sync_to_async
-def validate_expr(expr: str) -> Tuple[Optional[List[GameConfig]], Optional[str]]:
+@timed_sync_to_async
+def validate_expr(
+    expr: str, guild_id: int, role_id: Optional[str] = None
+) -> Tuple[Optional[List[GameConfig]], Optional[str]]:
     """Check whether or not the given Meta Role logic expression is valid.
-
-    :param context: The Discord Context.
-    :param expression: The expression to check.
-    :return: Boolean of whether or not it's a valid expression."""
-    role_ids = re.findall(r"\d+", expr)
-    game_configs = []
-    unconfigured_games = []
-    for _role_id in role_ids:
-        game_config = GameConfig.objects.filter(completion_role_id=_role_id).first()
-        if game_config is not None:
-            game_configs.append(game_config)
-        else:
-            unconfigured_games.append(_role_id)
-    if len(game_configs) != len(role_ids):
-        err = "Could not find configured games for: "
-        err += str(", ".join([f"<@&{_role_id}>" for _role_id in unconfigured_games]))
-        return None, err
-    evaluator = MetaRoleEvaluator({_role_id: False for _role_id in role_ids})
+    The expression is checked structurally first (and rejected if it simplifies to a
+    constant), then every role it references is looked up among the guild's GameConfigs
+    in a single query. Roles that aren't completion roles must be other Meta Roles of
+    the guild, and referencing them must not create a cycle.
+
+    :param expr: The expression to check.
+    :param guild_id: The ID of the guild the Meta Role belongs to.
+    :param role_id: The ID of the Meta Role's Discord role, if it already exists.
+    :return: The GameConfigs referenced by the expression, or an error message."""
     try:
-        evaluator.evaluate(expr)
-        return game_configs, None
+        program = MetaRoleEvaluator({}).compile(expr)
+        role_ids = get_symbols(program)
+        tree = simplify(build_tree(program))
     except Exception:
         return None, (
             (
@@ -89,3 +124,31 @@ def validate_expr(expr: str) -> Tuple[Optional[List[GameConfig]], Optional[str]]
                 "and role IDs / pings"
             )
         )
+    if tree[0] == TokenType.CONSTANT:
+        return None, f"The provided expression is always {str(tree[1]).lower()}."
+
+    game_configs = {
+        str(game_config.completion_role_id): game_config
+        for game_config in GameConfig.objects.filter(
+            guild_id=str(guild_id), completion_role_id__in=role_ids
+        )
+    }
+    unconfigured_games = [
+        _role_id for _role_id in role_ids if _role_id not in game_configs
+    ]
+    if unconfigured_games:
+        graph = MetaRoleGraph.from_rows(
+            MetaRoleConfig.objects.filter(guild_id=str(guild_id)).values_list(
+                "id", "name", "role_id", "expression"
+            )
+        )
+        unknown_roles = [
+            _role_id for _role_id in unconfigured_games if not graph.is_meta_role(_role_id)
+        ]
+        if unknown_roles:
+            err = "Could not find configured games or meta roles for: "
+            err += str(", ".join([f"<@&{_role_id}>" for _role_id in unknown_roles]))
+            return None, err
+        if role_id is not None and graph.creates_cycle(str(role_id), unconfigured_games):
+            return None, "The provided expression would make the meta role depend on itself."
+    return [game_configs[_role_id] for _role_id in role_ids if _role_id in game_configs], None
@@ -1,15 +1,18 @@
 import logging
 
 import discord
-from discord.ext import tasks
 from discord.ext.commands import Converter
 
 from rosetta.utils.db import (
-    get_all_games_per_guild,
+    FULL_REFRESH_INTERVAL,
     get_existing_channel,
     get_game_config,
+    get_games,
+    get_games_changed_since,
+    meta_role_graph_cache,
     set_channel_finished,
 )
+from rosetta.utils.interactions import auto_defer, respond
 
 from .utils.channel import archive_channel
 from .utils.roles import grant_completion_role, grant_meta_roles, remove_completion_role
@@ -34,33 +37,36 @@ class Playthrough(discord.Cog):
         self.client = client
         self.logger.info(f"Cog {self.__class__.__name__} loaded successfully.")
         # Cache
-        self.guild_games = {}
-        self.cache.start()
+        self.guild_games = client.caches.register(
+            "guild_games",
+            get_games,
+            delta_loader=get_games_changed_since,
+            ttl=2 * 60 * 60,
+            maxsize=1000,
+            refresh_interval=60,
+            full_refresh_interval=FULL_REFRESH_INTERVAL,
+        )
+        self.meta_role_graphs = meta_role_graph_cache(client.caches)
 
-    def game_autocomplete(self, ctx: discord.AutocompleteContext) -> list[str]:
-        gcs = self.guild_games[ctx.interaction.guild_id]
-        return [
-            gc.game.name
-            for gc in gcs
-            if gc.game.name.lower().startswith(ctx.value.lower())
-        ]
+    async def game_autocomplete(self, ctx: discord.AutocompleteContext) -> list[str]:
+        gcs = await self.guild_games.get(ctx.interaction.guild_id)
+        return [gc.name for gc in gcs if gc.name.lower().startswith(ctx.value.lower())]
 
-    def game_autocomplete_playable(self, ctx: discord.AutocompleteContext) -> list[str]:
-        gcs = self.guild_games[ctx.interaction.guild_id]
+    async def game_autocomplete_playable(
+        self, ctx: discord.AutocompleteContext
+    ) -> list[str]:
+        gcs = await self.guild_games.get(ctx.interaction.guild_id)
         return [
-            gc.game.name
+            gc.name
             for gc in gcs
-            if gc.game.name.lower().startswith(ctx.value.lower()) and gc.playable
+            if gc.name.lower().startswith(ctx.value.lower()) and gc.playable
         ]
 
     def cog_unload(self) -> None:
-        self.cache.cancel()
+        self.client.caches.unregister(self.guild_games.name)
+        self.client.caches.unregister(self.meta_role_graphs.name)
         return super().cog_unload()
 
-    @tasks.loop(minutes=5)
-    async def cache(self):
-        self.guild_games = await get_all_games_per_guild()
-
     @discord.slash_command(description="Drop a game. Closes playthrough channel.")
     async def drop(
         self,
@@ -128,7 +134,8 @@ class Playthrough(discord.Cog):
             await _respond(f"Your channel for {game.game} was archived!")
 
         await grant_completion_role(ctx, game)
-        await grant_meta_roles(ctx, game)
+        graph = await self.meta_role_graphs.get(ctx.guild_id)
+        await grant_meta_roles(ctx, game, graph)
         await _respond(
             f"Hope you enjoyed {game.game}! You should now be able to see global spoiler channels!"
         )
@@ -136,6 +143,7 @@ class Playthrough(discord.Cog):
     @discord.slash_command(
         description="Reset history on a certain game. Removes completion role."
     )
+    @auto_defer()
     async def reset(
         self,
         ctx: discord.ApplicationContext,
@@ -147,7 +155,8 @@ class Playthrough(discord.Cog):
         if not game:
             return
         await remove_completion_role(ctx, game)
-        await ctx.response.send_message(
+        await respond(
+            ctx,
             (
                 f"Your progress on `{game.game}` has been reset. "
                 "The completion role is removed!"
@@ -1,20 +1,39 @@
+import time
+
 import discord
 
 from playthrough.models import Channel, GameConfig, MetaRoleConfig
 
+from rosetta import config
 from rosetta.cogs.playthrough.utils import get_instructions
 from rosetta.cogs.playthrough.utils.roles import get_channel_permissions
+from rosetta.utils.admission import AdmissionController, QueueFull
+from rosetta.utils.cache import SingleFlight
 from rosetta.utils.db import (
+    AdvisoryLockTimeout,
+    advisory_lock,
     create_channel_in_db,
     get_existing_channel,
     get_meta_roles,
     get_playable_games,
     update_channel_id,
 )
+from rosetta.utils.interactions import auto_defer, edit_response, respond
+from rosetta.utils.metrics import Trace, stage
 
 from .utils.channel import create_channel as create_channel_in_guild
 from .utils.discord import get_channel_in_guild, get_game_completion_role
 
+#: Channel creations in flight, keyed by guild, user and GameConfig.
+_channel_flights = SingleFlight()
+#: Admission control for channel creation, so click storms are worked through gradually.
+_channel_admission = AdmissionController(
+    concurrency=config.CHANNEL_CREATION_CONCURRENCY,
+    rate=config.CHANNEL_CREATION_RATE,
+    burst=config.CHANNEL_CREATION_BURST,
+    max_queue=config.CHANNEL_CREATION_MAX_QUEUE,
+)
+
 
 class GameButton(discord.ui.Button):
     """Class to represent a Button for starting a channel for a given Game."""
@@ -87,59 +106,142 @@ class GameButton(discord.ui.Button):
 
         return replay, _has_active_channel, existing_channel
 
+    @auto_defer()
     async def callback(self, ctx: discord.Interaction):
         """The callback that handles the button click.
         The new equivalent to the $play command.
+        Concurrent clicks by the same user for the same game (double clicks or re-sent
+        interactions) share a single run, and each of them is told how it went.
 
         :param ctx: the Interaction context.
         """
-        # checks
-        replay, _has_active_channel, existing_channel = await self._get_checks(ctx)
+        key = ("channel", ctx.guild_id, ctx.user.id, self.game_config.id)
+        joined = _channel_flights.in_flight(key)
+        outcome = await _channel_flights.do(key, lambda: self._start_channel(ctx, key))
+        if joined:
+            await respond(ctx, outcome, ephemeral=True)
+
+    async def _reply(self, ctx: discord.Interaction, message: str, **kwargs) -> str:
+        """Tell the user how setting up their channel went.
+
+        :param ctx: the Interaction context.
+        :param message: the message to send.
+        :return: the message, for the clicks that joined this one.
+        """
+        await respond(ctx, message, ephemeral=True, **kwargs)
+        return message
+
+    async def _start_channel(self, ctx: discord.Interaction, key: tuple) -> str:
+        """Check for, set up and announce a new playthrough channel.
+
+        :param ctx: the Interaction context.
+        :param key: the key identifying the user and game, for cross-instance locking.
+        :return: the message telling the user how it went.
+        """
+        trace = Trace(
+            "channel_creation",
+            guild_id=ctx.guild_id,
+            user_id=ctx.user.id,
+            game=str(self.game_config.game),
+        )
+        with trace:
+            return await self._create_channel(ctx, key, trace)
+
+    async def _create_channel(self, ctx: discord.Interaction, key: tuple, trace: Trace) -> str:
+        """Create the playthrough channel, unless the user already has one.
+        The user is asked for a meta role and waits for admission before the lock
+        is taken, so that it is only held while creating the channel.
+
+        :param ctx: the Interaction context.
+        :param key: the key identifying the user and game, for cross-instance locking.
+        :param trace: the Trace timing the stages of the creation.
+        :return: the message telling the user how it went.
+        """
+        already_created = f"You already have a channel for {self.game_config.game}."
 
+        # checks
+        with stage("checks"):
+            _, _has_active_channel, _ = await self._get_checks(ctx)
         if _has_active_channel:
-            return await ctx.response.send_message(
-                f"You already have a channel for {self.game_config.game}.",
-                ephemeral=True,
-            )
+            return await self._reply(ctx, already_created)
 
         # Channel details
-        channel_name = self._get_channel_name(ctx, replay)
-        meta_role_id = await MetaRoleSelect.ask_for_meta_role(ctx, self.game_config)
+        with stage("meta_role_prompt"):
+            meta_role_id = await MetaRoleSelect.ask_for_meta_role(ctx, self.game_config)
         if type(meta_role_id) is bool and meta_role_id is False:
-            return
+            return await self._reply(
+                ctx, "You didn't pick a meta role in time, please try again."
+            )
 
         permissions = get_channel_permissions(ctx, self.game_config, meta_role_id)
 
-        # Try creating the channel on discord
-        channel = await create_channel_in_guild(
-            ctx, self.game_config, channel_name, permissions
-        )
-        if channel is None:
-            return
+        async def _announce_position(position: int):
+            await respond(
+                ctx,
+                f"Lots of people are starting games right now, you are #{position} in line!",
+                ephemeral=True,
+            )
 
-        # Create the channel on the DB
-        if existing_channel:
-            await update_channel_id(existing_channel, channel.id)
-        else:
-            await create_channel_in_db(
-                ctx, self.game_config, channel.id, finished=replay
+        try:
+            queued_at = time.perf_counter()
+            async with _channel_admission.admit(ctx.guild_id, on_queued=_announce_position):
+                trace.record("queue", time.perf_counter() - queued_at)
+
+                locked_at = time.perf_counter()
+                async with advisory_lock(key):
+                    trace.record("lock", time.perf_counter() - locked_at)
+
+                    # Another instance may have created the channel in the meantime
+                    with stage("checks"):
+                        replay, _has_active_channel, existing_channel = await self._get_checks(ctx)
+                    if _has_active_channel:
+                        return await self._reply(ctx, already_created)
+                    channel_name = self._get_channel_name(ctx, replay)
+
+                    # Try creating the channel on discord
+                    with stage("create_channel"):
+                        channel = await create_channel_in_guild(
+                            ctx, self.game_config, channel_name, permissions
+                        )
+                    if channel is None:
+                        return await self._reply(
+                            ctx,
+                            f"Your channel for {self.game_config.game} couldn't be created, "
+                            "please try again later.",
+                        )
+
+                    # Create the channel on the DB
+                    with stage("db_write"):
+                        if existing_channel:
+                            await update_channel_id(existing_channel, channel.id)
+                        else:
+                            await create_channel_in_db(
+                                ctx, self.game_config, channel.id, finished=replay
+                            )
+        except QueueFull:
+            return await self._reply(
+                ctx,
+                "Too many people are starting games right now, please try again in a few minutes.",
+            )
+        except AdvisoryLockTimeout:
+            return await self._reply(
+                ctx,
+                f"Your channel for {self.game_config.game} is already being set up, "
+                "please try again in a moment.",
             )
 
         # Send instructions
-        instructions_msg = await channel.send(get_instructions(self.game_config))
-        await channel.send(ctx.user.mention)
-        await instructions_msg.pin()
+        with stage("instructions"):
+            instructions_msg = await channel.send(get_instructions(self.game_config))
+            await channel.send(ctx.user.mention)
+            await instructions_msg.pin()
 
         # Closing statement
-        try:
-            await ctx.response.send_message(
-                content=f"Successfully created your channel: {channel.mention}, have fun!",
-                ephemeral=True,
-            )
-        except discord.errors.InteractionResponded:
-            await ctx.edit_original_response(
-                content=f"Successfully created your channel: {channel.mention}, have fun!",
-                view=None,
+        with stage("respond"):
+            return await self._reply(
+                ctx,
+                f"Successfully created your channel: {channel.mention}, have fun!",
+                replace=True,
             )
 
     @classmethod
@@ -201,7 +303,7 @@ class MetaRoleSelect(discord.ui.View):
 
     def __init__(self, *items, meta_roles: list[MetaRoleConfig], timeout=20):
         """A View with a Select populated by Meta Roles to choose from.
-        Please attach an `interaction` member upon creation.
+        Please attach an `interaction` member (the value returned by `respond`) upon creation.
 
         :param meta_roles: the MetaRoleConfigs to populate the View from.
         """
@@ -216,7 +318,7 @@ class MetaRoleSelect(discord.ui.View):
     async def on_timeout(self) -> None:
         """Timeout handler. Disables self."""
         self.children[0].disabled = True
-        await self.interaction.edit_original_response(view=self)
+        await edit_response(self.interaction, view=self)
         self.value = False
 
     async def picked_option(self, meta_role_id: int):
@@ -226,7 +328,7 @@ class MetaRoleSelect(discord.ui.View):
         """
         self.value = meta_role_id
         self.children[0].disabled = True
-        await self.interaction.edit_original_response(view=self)
+        await edit_response(self.interaction, view=self)
         self.stop()
 
     @classmethod
@@ -243,7 +345,8 @@ class MetaRoleSelect(discord.ui.View):
         meta_roles = await get_meta_roles(game_config)
         if len(meta_roles) > 0:
             select = cls(meta_roles=meta_roles)
-            select.interaction = await ctx.response.send_message(
+            select.interaction = await respond(
+                ctx,
                 "Would you like to lock the channel behind a Meta-Role? If not or unsure, select `None`.",
                 view=select,
                 ephemeral=True,
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import time
 from typing import Union
 
 from asgiref.sync import sync_to_async
@@ -12,6 +14,8 @@ from rosetta.cogs.playthrough.utils.discord import (
     get_game_categories,
 )
 from rosetta.utils.exporter import export_channel
+from rosetta.utils.metrics import Trace, stage
+from rosetta.utils.telemetry import ARCHIVE_BYTES, EXPORT_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -36,27 +40,39 @@ async def archive_channel(ctx: Interaction, channel: Channel) -> bool:
     channel_in_guild = get_channel_in_guild(ctx, channel.id)
     if not channel_in_guild:
         return False
-    try:
-        exported_channel_file_path = export_channel(channel.id)
-        exported_channel_file = File(
-            file=open(exported_channel_file_path), name=exported_channel_file_path.name
-        )
-    except Exception as e:
-        logger.error(e)
-        await _send_error_message_to_user()
-        return False
-    try:
-        await sync_to_async(Archive.objects.create)(
-            channel=channel, file=exported_channel_file
-        )
-        exported_channel_file.close()
-        exported_channel_file_path.unlink()
-    except Exception as e:
-        logger.error(e)
-        await _send_error_message_to_user()
-        return False
+    with Trace("archive", guild_id=ctx.guild_id, channel_id=channel.id):
+        try:
+            started = time.perf_counter()
+            with stage("export"):
+                # The export runs a container for as long as it takes, off the event loop
+                exported_channel_file_path = await asyncio.get_running_loop().run_in_executor(
+                    None, export_channel, channel.id
+                )
+            EXPORT_SECONDS.observe(time.perf_counter() - started)
+            ARCHIVE_BYTES.observe(exported_channel_file_path.stat().st_size)
+            with stage("open"):
+                exported_channel_file = File(
+                    file=open(exported_channel_file_path), name=exported_channel_file_path.name
+                )
+        except Exception as e:
+            logger.error(e)
+            await _send_error_message_to_user()
+            return False
+        try:
+            with stage("store"):
+                await sync_to_async(Archive.objects.create)(
+                    channel=channel, file=exported_channel_file
+                )
+            with stage("cleanup"):
+                exported_channel_file.close()
+                exported_channel_file_path.unlink()
+        except Exception as e:
+            logger.error(e)
+            await _send_error_message_to_user()
+            return False
 
-    await channel_in_guild.delete()
+        with stage("delete"):
+            await channel_in_guild.delete()
     return True
 
 
@@ -72,15 +88,17 @@ async def create_channel(
     :param logger: The Logger to use to log things.
     """
     # Get category & channel name
-    categories = await get_game_categories(ctx, game_config)
-    for category in categories:
-        try:
-            channel = await ctx.guild.create_text_channel(
-                name=name, category=category, overwrites=permissions
-            )
-            return channel
-        except HTTPException:
-            pass
+    with stage("get_categories"):
+        categories = await get_game_categories(ctx, game_config)
+    with stage("category_probe"):
+        for category in categories:
+            try:
+                channel = await ctx.guild.create_text_channel(
+                    name=name, category=category, overwrites=permissions
+                )
+                return channel
+            except HTTPException:
+                pass
 
     try:
         logger.warn(
@@ -92,9 +110,10 @@ async def create_channel(
         position = None
         if len(categories) > 0:
             position = categories[-1].position + 1
-        category = await ctx.guild.create_category(
-            name=game_config.game.name, position=position
-        )
+        with stage("create_category"):
+            category = await ctx.guild.create_category(
+                name=game_config.game.name, position=position
+            )
         logger.info(f"Created new category for {game_config.game}.")
         channel = await ctx.guild.create_text_channel(
             name=name, category=category, overwrites=permissions
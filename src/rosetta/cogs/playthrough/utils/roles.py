@@ -1,11 +1,10 @@
-from asgiref.sync import sync_to_async
 from discord import ApplicationContext, Interaction, PermissionOverwrite
 from discord.utils import get
 
-from playthrough.models import GameConfig, MetaRoleConfig
+from playthrough.models import GameConfig
 
 from rosetta.cogs.playthrough.utils.discord import get_game_completion_role
-from rosetta.utils.role_expr import MetaRoleEvaluator
+from rosetta.utils.role_graph import MetaRoleGraph, MetaRoleNode
 
 
 async def grant_completion_role(ctx: ApplicationContext, game_config: GameConfig):
@@ -26,42 +25,29 @@ async def remove_completion_role(ctx: ApplicationContext, game_config: GameConfi
     await ctx.user.remove_roles(completion_role)
 
 
-@sync_to_async
 def get_meta_roles_to_grant(
-    ctx: ApplicationContext, game_config: GameConfig
-) -> list[MetaRoleConfig]:
+    ctx: ApplicationContext, game_config: GameConfig, graph: MetaRoleGraph
+) -> list[MetaRoleNode]:
     """Get which MetaRoles to grant the user, given that they just finished a certain game.
+    Runs no queries; everything needed is in the guild's MetaRoleGraph.
 
     :param context: The Discord Context
     :param game_config: The Game the user just finished.
+    :param graph: The guild's MetaRoleGraph.
     :return: The list of MetaRoles to add."""
-    related_meta_roles: list[MetaRoleConfig] = game_config.meta_roles.all()
-    meta_roles_to_add = []
     user_role_ids = set([str(role.id) for role in ctx.user.roles])
-    user_role_ids.add(game_config.completion_role_id)
+    return graph.meta_roles_to_grant(str(game_config.completion_role_id), user_role_ids)
 
-    for meta_role in related_meta_roles:
-        related_games: list[GameConfig] = meta_role.games.all()
-        related_roles = [game.completion_role_id for game in related_games]
-        evaluator_input = {
-            role_id: role_id in user_role_ids for role_id in related_roles
-        }
-        evaluator = MetaRoleEvaluator(evaluator_input)
-        result = evaluator.evaluate(meta_role.expression)
-        if result:
-            meta_roles_to_add.append(meta_role)
 
-    return meta_roles_to_add
-
-
-async def grant_meta_roles(ctx: ApplicationContext, game_config: GameConfig):
+async def grant_meta_roles(
+    ctx: ApplicationContext, game_config: GameConfig, graph: MetaRoleGraph
+):
     """Add meta roles the user is qualified for after they finished a certain game.
 
     :param ctx: The Discord Context
-    :param game_config: The Game the user just finished."""
-    meta_roles_to_add: list[MetaRoleConfig] = await get_meta_roles_to_grant(
-        ctx, game_config
-    )
+    :param game_config: The Game the user just finished.
+    :param graph: The guild's MetaRoleGraph."""
+    meta_roles_to_add = get_meta_roles_to_grant(ctx, game_config, graph)
     roles_to_add = []
     for meta_role in meta_roles_to_add:
         role_in_discord = get(ctx.guild.roles, id=int(meta_role.role_id))
@@ -18,3 +18,43 @@ BASE_DIR = (
 )
 ARCHIVE_ROOT = BASE_DIR / "archives"
 LOG_ROOT = BASE_DIR / "logs"
+CACHE_ROOT = BASE_DIR / "cache"
+CACHE_SNAPSHOT_INTERVAL = int(os.getenv("ROSETTA_CACHE_SNAPSHOT_INTERVAL", 10 * 60))
+CACHE_REFRESH_COOLDOWN = float(os.getenv("ROSETTA_CACHE_REFRESH_COOLDOWN", 60))
+REQUEST_MAX_CONCURRENCY = int(os.getenv("ROSETTA_REQUEST_MAX_CONCURRENCY", 16))
+REQUEST_INTERACTIVE_RESERVE = int(os.getenv("ROSETTA_REQUEST_INTERACTIVE_RESERVE", 4))
+REQUEST_ROUTE_CONCURRENCY = int(os.getenv("ROSETTA_REQUEST_ROUTE_CONCURRENCY", 4))
+REQUEST_ROUTE_INTERACTIVE_RESERVE = int(os.getenv("ROSETTA_REQUEST_ROUTE_INTERACTIVE_RESERVE", 1))
+INTERACTION_DEFER_BUDGET = float(os.getenv("ROSETTA_INTERACTION_DEFER_BUDGET", 2.0))
+CHANNEL_CREATION_CONCURRENCY = int(os.getenv("ROSETTA_CHANNEL_CREATION_CONCURRENCY", 2))
+CHANNEL_CREATION_RATE = float(os.getenv("ROSETTA_CHANNEL_CREATION_RATE", 0.5))
+CHANNEL_CREATION_BURST = int(os.getenv("ROSETTA_CHANNEL_CREATION_BURST", 5))
+CHANNEL_CREATION_MAX_QUEUE = int(os.getenv("ROSETTA_CHANNEL_CREATION_MAX_QUEUE", 200))
+# Another Discord API to talk to, like the mock in benchmarks/discord_server.py
+DISCORD_API_BASE = os.getenv("ROSETTA_DISCORD_API_BASE")
+# Members to keep cached: "all", "none", or flags like "joined,interaction"
+MEMBER_CACHE_FLAGS = os.getenv("ROSETTA_MEMBER_CACHE_FLAGS", "all")
+# Without it, bulk commands fetch the members they need when they run
+CHUNK_GUILDS_AT_STARTUP = os.getenv("ROSETTA_CHUNK_GUILDS_AT_STARTUP", "1").lower() in ("1", "true", "yes")
+# The total number of shards, Discord's recommendation if unset
+SHARD_COUNT = int(os.getenv("ROSETTA_SHARD_COUNT", 0)) or None
+# The shards this process runs, like "0-3", every one if unset (needs SHARD_COUNT)
+SHARD_IDS = os.getenv("ROSETTA_SHARD_IDS")
+# Worker processes `scripts.py supervise` spreads the shards over
+WORKERS = int(os.getenv("ROSETTA_WORKERS", 1))
+METRICS_HOST = os.getenv("ROSETTA_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("ROSETTA_METRICS_PORT", 0)) or None
+LOOP_MONITOR_INTERVAL = float(os.getenv("ROSETTA_LOOP_MONITOR_INTERVAL", 0.1))
+LOOP_STALL_THRESHOLD = float(os.getenv("ROSETTA_LOOP_STALL_THRESHOLD", 0.25))
+LOOP_REPORT_INTERVAL = float(os.getenv("ROSETTA_LOOP_REPORT_INTERVAL", 60))
+# asyncio debug mode, logging every slow callback, at a cost
+LOOP_DEBUG = os.getenv("ROSETTA_LOOP_DEBUG", "").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = float(os.getenv("ROSETTA_PROFILE_INTERVAL", 0.005))
+PROFILE_TASK_INTERVAL = float(os.getenv("ROSETTA_PROFILE_TASK_INTERVAL", 0.05))
+LOG_LEVEL = os.getenv("ROSETTA_LOG_LEVEL", "DEBUG")
+LOG_FILE_LEVEL = os.getenv("ROSETTA_LOG_FILE_LEVEL", "INFO")
+# Per-logger levels, like "discord=INFO,rosetta.cogs.admin=DEBUG"
+LOG_LEVELS = os.getenv("ROSETTA_LOG_LEVELS", "discord=INFO")
+LOG_JSON = os.getenv("ROSETTA_LOG_JSON", "").lower() in ("1", "true", "yes")
+LOG_MAX_BYTES = int(os.getenv("ROSETTA_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("ROSETTA_LOG_BACKUP_COUNT", 5))
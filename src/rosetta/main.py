@@ -1,25 +1,50 @@
 #!env/bin/python3
 """Main module to run the bot."""
 import logging
+import time
 
 import discord
 
 from rosetta import config
 from rosetta.cogs.playthrough.ui import GameButton
+from rosetta.utils.cache import CacheManager
 from rosetta.utils.db import get_or_create_guild
+from rosetta.utils.discord_api import use_api_base
+from rosetta.utils.log import parse_levels, setup_logging
+from rosetta.utils.loop_monitor import LoopMonitor
+from rosetta.utils.members import parse_member_cache_flags
+from rosetta.utils.scheduler import RequestScheduler
+from rosetta.utils.sharding import ShardPartition, format_shard_ids, parse_shard_ids
+from rosetta.utils.telemetry import (
+    COMMAND_SECONDS,
+    MetricsServer,
+    instrument_http,
+    register_bot_collectors,
+)
 
-# Logging
-if not config.LOG_ROOT.exists():
-    config.LOG_ROOT.mkdir(parents=True)
+# Workers running some of the shards keep their own logs and cache snapshots
+SHARD_IDS = parse_shard_ids(config.SHARD_IDS)
+WORKER_SUFFIX = f"-shards-{format_shard_ids(SHARD_IDS)}" if SHARD_IDS is not None else ""
 
-logging.config.fileConfig(
-    "logging.conf", defaults={"logfilename": config.LOG_ROOT / "rosetta-log.log"}
+# Logging
+setup_logging(
+    config.LOG_ROOT / f"rosetta-log{WORKER_SUFFIX}.log",
+    level=config.LOG_LEVEL,
+    file_level=config.LOG_FILE_LEVEL,
+    levels=parse_levels(config.LOG_LEVELS),
+    json_output=config.LOG_JSON,
+    max_bytes=config.LOG_MAX_BYTES,
+    backup_count=config.LOG_BACKUP_COUNT,
 )
 logger = logging.getLogger(__name__)
 
 
-class Rosetta(discord.Bot):
-    """The main Bot class for Rosetta!"""
+class Rosetta(discord.AutoShardedBot):
+    """The main Bot class for Rosetta!
+
+    It runs every shard, or only `shard_ids` out of `shard_count` as one of several
+    worker processes, in which case it only caches the guilds on its own shards.
+    """
 
     COGS = ["admin", "playthrough"]
 
@@ -29,14 +54,72 @@ class Rosetta(discord.Bot):
         :param description: The bot description.
         """
         super().__init__(description, *args, **options)
+        self._started = time.perf_counter()
+        self.scheduler = RequestScheduler(
+            max_concurrency=config.REQUEST_MAX_CONCURRENCY,
+            interactive_reserve=config.REQUEST_INTERACTIVE_RESERVE,
+            route_concurrency=config.REQUEST_ROUTE_CONCURRENCY,
+            route_interactive_reserve=config.REQUEST_ROUTE_INTERACTIVE_RESERVE,
+        )
+        self.scheduler.install(self.http)
+        instrument_http(self.http)
+        register_bot_collectors(self)
+        self.metrics_server = (
+            MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
+            if config.METRICS_PORT
+            else None
+        )
+        self.loop_monitor = LoopMonitor(
+            interval=config.LOOP_MONITOR_INTERVAL,
+            stall_threshold=config.LOOP_STALL_THRESHOLD,
+            report_interval=config.LOOP_REPORT_INTERVAL,
+            debug=config.LOOP_DEBUG,
+        )
+        self._command_started = {}
+        self.caches = CacheManager(
+            snapshot_path=config.CACHE_ROOT / f"snapshot{WORKER_SUFFIX}.pickle",
+            snapshot_interval=config.CACHE_SNAPSHOT_INTERVAL,
+            partition=(
+                ShardPartition(self.shard_ids, self.shard_count)
+                if self.shard_ids is not None
+                else None
+            ),
+        )
 
         # Load cogs
         extensions = [f"rosetta.cogs.{cog}" for cog in self.COGS]
         self.load_extensions(*extensions)
 
+        # Serve from the last snapshot while the caches reload in the background
+        self.caches.load_snapshot()
+        self.caches.start()
+
+    async def login(self, token: str):
+        """Log in, then start collecting telemetry."""
+        # The HTTP client's session is created on login, with this connector
+        self.http.connector = self.scheduler.connector()
+        await super().login(token)
+        self.loop_monitor.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+
+    async def close(self):
+        """Persist the caches before shutting down."""
+        self.caches.stop()
+        self.caches.save_snapshot()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.loop_monitor.stop()
+        await super().close()
+
     async def on_ready(self):
         """Handle what happens when the bot is ready."""
         logger.info(f"Logged in as {client.user.name} - {client.user.id}")
+        logger.info(
+            "Running shards %s of %s",
+            format_shard_ids(self.shards),
+            self.shard_count,
+        )
         logger.info(f"------ Guilds ({len(client.guilds)}) ------")
         for guild in client.guilds:
             logger.info(guild.name)
@@ -49,6 +132,8 @@ class Rosetta(discord.Bot):
                 self.add_view(playthrough_button_view)
             except TypeError:
                 logger.warning(f"No emojis for games in {guild.name}, skipping...")
+        # Also what the startup benchmark waits for
+        logger.info("Ready %.2fs after starting up", time.perf_counter() - self._started)
 
     async def on_guild_join(self, guild: discord.Guild):
         """Handle setting up a new guild."""
@@ -56,12 +141,33 @@ class Rosetta(discord.Bot):
         res = await get_or_create_guild(guild)
         logger.info(f"Registered Guild in the database: {res[0]} (created={res[1]})")
 
+    def _observe_command(self, ctx: discord.ApplicationContext, status: str):
+        started = self._command_started.pop(ctx.interaction.id, None)
+        if started is not None:
+            COMMAND_SECONDS.observe(
+                time.perf_counter() - started,
+                command=ctx.command.qualified_name,
+                status=status,
+            )
+
+    async def on_application_command(self, ctx: discord.ApplicationContext):
+        """Start timing a command."""
+        self._command_started[ctx.interaction.id] = time.perf_counter()
+
+    async def on_application_command_completion(self, ctx: discord.ApplicationContext):
+        """Record the time taken by a successful command."""
+        self._observe_command(ctx, "ok")
+
     async def on_application_command_error(
         self, ctx: discord.ApplicationContext, error: discord.DiscordException
     ):
         """Handle errors globally."""
         logger.error("Error occurred for command %s: %s", ctx.command, error)
+        self._observe_command(ctx, "error")
+
 
+if config.DISCORD_API_BASE:
+    use_api_base(config.DISCORD_API_BASE)
 
 # Intents
 # TODO proper research on this
@@ -73,6 +179,10 @@ intents.message_content = True
 client = Rosetta(
     description=config.DESCRIPTION,
     intents=intents,
+    member_cache_flags=parse_member_cache_flags(config.MEMBER_CACHE_FLAGS),
+    shard_count=config.SHARD_COUNT,
+    shard_ids=SHARD_IDS,
+    chunk_guilds_at_startup=config.CHUNK_GUILDS_AT_STARTUP,
 )
 if config.DEBUG:
     client.debug_guilds = [1000511745548365925]
@@ -0,0 +1,161 @@
+"""Admission control for expensive per-guild operations, like creating channels.
+
+Each guild gets a bounded FIFO queue. Operations are admitted from it while fewer
+than `concurrency` of them are running and the guild's token bucket allows it, so
+a click storm is worked through at a sustainable rate instead of all at once.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class QueueFull(Exception):
+    """Raised when a guild's queue is full and the operation should be retried later."""
+
+
+class _GuildQueue:
+    def __init__(self, guild_id: Hashable, burst: int):
+        self.guild_id = guild_id
+        self.waiters: deque = deque()
+        self.active = 0
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.idle_timer: Optional[asyncio.TimerHandle] = None
+
+
+class AdmissionController:
+    """Admits operations per guild, in order, within concurrency and rate limits."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 2,
+        rate: float = 1.0,
+        burst: int = 5,
+        max_queue: int = 100,
+    ):
+        """Admits operations per guild, in order, within concurrency and rate limits.
+
+        :param concurrency: how many operations may run at once per guild.
+        :param rate: how many operations may start per second per guild, on average.
+        :param burst: how many operations may start at once after a quiet period.
+        :param max_queue: how many operations may wait per guild before `QueueFull` is raised.
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self._queues: Dict[Hashable, _GuildQueue] = {}
+
+    def _get_queue(self, guild_id: Hashable) -> _GuildQueue:
+        queue = self._queues.get(guild_id)
+        if queue is None:
+            queue = self._queues[guild_id] = _GuildQueue(guild_id, self.burst)
+        elif queue.idle_timer is not None:
+            queue.idle_timer.cancel()
+            queue.idle_timer = None
+        return queue
+
+    def _refill(self, queue: _GuildQueue):
+        now = time.monotonic()
+        queue.tokens = min(self.burst, queue.tokens + (now - queue.updated) * self.rate)
+        queue.updated = now
+
+    def _can_start(self, queue: _GuildQueue) -> bool:
+        self._refill(queue)
+        return queue.active < self.concurrency and queue.tokens >= 1
+
+    def _start(self, queue: _GuildQueue):
+        queue.active += 1
+        queue.tokens -= 1
+
+    def _on_timer(self, queue: _GuildQueue):
+        queue.timer = None
+        self._wake(queue)
+
+    def _wake(self, queue: _GuildQueue):
+        while queue.waiters and self._can_start(queue):
+            future = queue.waiters.popleft()
+            if not future.done():
+                self._start(queue)
+                future.set_result(None)
+        if queue.waiters and queue.active < self.concurrency and queue.timer is None:
+            # Out of tokens, try again once the next one is in
+            delay = (1 - queue.tokens) / self.rate
+            queue.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, queue)
+        self._prune(queue)
+
+    def _prune(self, queue: _GuildQueue):
+        """Forget an idle guild once its bucket is full, as a new queue would be the same."""
+        if queue.idle_timer is not None:
+            queue.idle_timer.cancel()
+            queue.idle_timer = None
+        if queue.waiters or queue.active or queue.timer is not None:
+            return
+        self._refill(queue)
+        if queue.tokens >= self.burst:
+            if self._queues.get(queue.guild_id) is queue:
+                del self._queues[queue.guild_id]
+        else:
+            delay = (self.burst - queue.tokens) / self.rate
+            queue.idle_timer = asyncio.get_running_loop().call_later(delay, self._prune, queue)
+
+    def queue_length(self, guild_id: Hashable) -> int:
+        """Get how many operations are waiting in a guild's queue.
+
+        :param guild_id: the ID of the guild.
+        :return: the number of waiting operations.
+        """
+        queue = self._queues.get(guild_id)
+        return len(queue.waiters) if queue else 0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        guild_id: Hashable,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """Wait for the guild's turn to run an operation, then run it within the block.
+
+        :param guild_id: the ID of the guild.
+        :param on_queued: a coroutine function called with the (1-based) queue position
+            if the operation has to wait, to let the user know.
+        :raise QueueFull: if the guild's queue is full.
+        """
+        queue = self._get_queue(guild_id)
+        if not queue.waiters and self._can_start(queue):
+            self._start(queue)
+        else:
+            if len(queue.waiters) >= self.max_queue:
+                raise QueueFull(f"The queue for {guild_id} is full")
+            future = asyncio.get_running_loop().create_future()
+            queue.waiters.append(future)
+            self._wake(queue)
+            try:
+                if on_queued is not None and not future.done():
+                    await on_queued(len(queue.waiters))
+                await future
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    # Admitted in the meantime, hand the slot on
+                    self._release(queue)
+                else:
+                    future.cancel()
+                    if future in queue.waiters:
+                        queue.waiters.remove(future)
+                    self._wake(queue)
+                raise
+        try:
+            yield
+        finally:
+            self._release(queue)
+
+    def _release(self, queue: _GuildQueue):
+        queue.active -= 1
+        self._wake(queue)
+
+
+__all__ = ["AdmissionController", "QueueFull"]
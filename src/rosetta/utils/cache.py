@@ -0,0 +1,549 @@
+"""In-memory caching shared by the cogs.
+
+Cogs register a named :class:`CacheNamespace` with the bot's :class:`CacheManager`
+and read from it instead of keeping their own dictionaries and refresh loops.
+"""
+import asyncio
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from discord.ext import tasks
+
+logger = logging.getLogger(__name__)
+
+#: Sentinel for cache misses, since `None` is a valid cached value.
+MISSING = object()
+
+#: Version stamp of on-disk snapshots. Bump it whenever cached values change shape.
+SNAPSHOT_VERSION = 4
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single in-flight call."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether or not a call is currently running for a key.
+
+        :param key: the key to check.
+        :return: whether or not a call is in flight.
+        """
+        return key in self._in_flight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `func` for `key`, or join the call already running for it.
+
+        :param key: the key identifying the call.
+        :param func: a coroutine function to run if no call is in flight.
+        :return: the result of the (shared) call.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody joined the call
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+
+class ChangeLog:
+    """A monotonic change counter remembering the last change made to each key.
+    Loaders use its counter value as a high-water mark to only fetch what changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._all_changed_at = 0
+        self._changes: Dict[Hashable, int] = {}
+
+    @property
+    def mark(self) -> int:
+        """The current value of the change counter."""
+        return self._seq
+
+    def record(self, key: Hashable):
+        """Record a change to a key.
+
+        :param key: the key that changed.
+        """
+        with self._lock:
+            self._seq += 1
+            self._changes[key] = self._seq
+
+    def record_all(self):
+        """Record a change affecting every key."""
+        with self._lock:
+            self._seq += 1
+            self._all_changed_at = self._seq
+
+    def changed_since(self, mark: int) -> Tuple[int, Optional[Set[Hashable]]]:
+        """Get the keys that changed after a given mark.
+
+        :param mark: the high-water mark of the previous call.
+        :return: the new mark, and the changed keys or `None` if everything changed.
+        """
+        with self._lock:
+            if self._all_changed_at > mark:
+                return self._seq, None
+            return self._seq, {key for key, seq in self._changes.items() if seq > mark}
+
+
+class CacheStats:
+    """Counters kept for each cache namespace."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time = 0.0
+        self.evictions = 0
+        self.full_refreshes = 0
+        self.delta_refreshes = 0
+
+    def hit_ratio(self) -> float:
+        """The ratio of lookups served from the cache.
+
+        :return: the hit ratio, between 0 and 1.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheNamespace:
+    """A named, size-bounded LRU cache with per-entry TTL and single-flight loading."""
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        *,
+        bulk_loader: Optional[Callable[[], Awaitable[Dict[Hashable, Any]]]] = None,
+        delta_loader: Optional[Callable[[Any], Awaitable[tuple]]] = None,
+        ttl: Optional[float] = None,
+        maxsize: Optional[int] = None,
+        refresh_interval: Optional[float] = None,
+        full_refresh_interval: Optional[float] = None,
+        partition: Optional[Callable[[Hashable], bool]] = None,
+    ):
+        """A named, size-bounded LRU cache with per-entry TTL and single-flight loading.
+
+        :param name: the name of the namespace.
+        :param loader: a coroutine function loading the value for a single key.
+        :param bulk_loader: a coroutine function loading values for all keys at once.
+        :param delta_loader: a coroutine function taking a high-water mark (or `None`
+            for everything) and returning the new mark, the changed values and the
+            deleted keys. Returning `None` for the deleted keys means the changed
+            values are a complete replacement.
+        :param ttl: the number of seconds after which an entry goes stale, if any.
+        :param maxsize: the maximum number of entries to keep, if any.
+        :param refresh_interval: seconds between periodic refreshes, if any.
+            Delta refreshes if there is a delta loader, bulk refreshes otherwise.
+        :param full_refresh_interval: seconds between periodic full reloads
+            when there is a delta loader, if any.
+        :param partition: tells which keys belong to this process, so bulk loads
+            and snapshots only fill the cache with those, if some don't.
+        """
+        self.name = name
+        self.loader = loader
+        self.bulk_loader = bulk_loader
+        self.delta_loader = delta_loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.partition = partition
+        self.stats = CacheStats()
+        self.high_water_mark: Any = None
+        self.last_refresh: Optional[float] = None
+        self.last_full_refresh: Optional[float] = None
+        self._entries: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._flights = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not MISSING
+
+    def _is_fresh(self, loaded_at: float) -> bool:
+        return self.ttl is None or time.monotonic() - loaded_at < self.ttl
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or not self._is_fresh(entry[1]):
+            return MISSING
+        return entry[0]
+
+    def get_cached(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value without loading it on a miss.
+        Useful for synchronous callers such as autocompletes.
+
+        :param key: the key to look up.
+        :param default: what to return on a miss.
+        :return: the cached value or `default`.
+        """
+        value = self._lookup(key)
+        if value is MISSING:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: Hashable) -> Any:
+        """Get a value, loading it if it is missing or stale.
+        Concurrent misses for the same key share a single load.
+
+        :param key: the key to look up.
+        :return: the cached or freshly loaded value.
+        """
+        value = self._lookup(key)
+        if value is not MISSING:
+            self.stats.hits += 1
+            self._entries.move_to_end(key)
+            return value
+        self.stats.misses += 1
+        return await self._flights.do(key, lambda: self._load(key))
+
+    async def _load(self, key: Hashable) -> Any:
+        start = time.perf_counter()
+        try:
+            value = await self.loader(key)
+        except Exception:
+            self.stats.load_errors += 1
+            raise
+        finally:
+            self.stats.loads += 1
+            self.stats.load_time += time.perf_counter() - start
+        self.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries if over capacity.
+
+        :param key: the key to store the value under.
+        :param value: the value to store.
+        """
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, key: Hashable = MISSING):
+        """Drop a single entry, or every entry if no key is given.
+
+        :param key: the key to drop.
+        """
+        if key is MISSING:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def refresh(self, full: bool = False):
+        """Refresh the cache through the delta loader, or the bulk loader if there is none.
+
+        :param full: whether or not to reload everything rather than only what changed.
+        """
+        if self.delta_loader is None and self.bulk_loader is None:
+            return
+        since = None if full else self.high_water_mark
+        start = time.perf_counter()
+        try:
+            if self.delta_loader is not None:
+                mark, changed, deleted = await self._flights.do(
+                    (MISSING, since), lambda: self.delta_loader(since)
+                )
+            else:
+                changed = await self._flights.do((MISSING, since), self.bulk_loader)
+                mark, deleted = None, None
+        except Exception:
+            self.stats.load_errors += 1
+            raise
+        finally:
+            self.stats.loads += 1
+            self.stats.load_time += time.perf_counter() - start
+
+        if deleted is None:
+            self._entries.clear()
+        else:
+            for key in deleted:
+                self._entries.pop(key, None)
+        for key, value in changed.items():
+            if self.partition is None or self.partition(key):
+                self.set(key, value)
+
+        now = time.monotonic()
+        self.high_water_mark = mark
+        self.last_refresh = now
+        if since is None:
+            self.last_full_refresh = now
+            self.stats.full_refreshes += 1
+        else:
+            self.stats.delta_refreshes += 1
+
+    def full_refresh_due(self) -> bool:
+        """Whether or not a periodic full reload should run now.
+
+        :return: whether or not the full reload is due.
+        """
+        if self.delta_loader is None and self.bulk_loader is None:
+            return False
+        if self.last_full_refresh is None:
+            return True
+        interval = (
+            self.full_refresh_interval
+            if self.delta_loader is not None
+            else self.refresh_interval
+        )
+        return interval is not None and time.monotonic() - self.last_full_refresh >= interval
+
+    def refresh_due(self) -> bool:
+        """Whether or not a periodic delta refresh should run now.
+
+        :return: whether or not the delta refresh is due.
+        """
+        if self.delta_loader is None or self.refresh_interval is None:
+            return False
+        return (
+            self.last_refresh is None
+            or time.monotonic() - self.last_refresh >= self.refresh_interval
+        )
+
+    def dump(self) -> Dict[Hashable, Any]:
+        """Get a copy of every fresh entry, e.g. to persist it.
+
+        :return: a dictionary of cached values.
+        """
+        return {
+            key: value
+            for key, (value, loaded_at) in self._entries.items()
+            if self._is_fresh(loaded_at)
+        }
+
+    def restore(self, entries: Dict[Hashable, Any]) -> int:
+        """Fill the cache with previously dumped entries.
+        They are served right away, but the next refresh is a full reload.
+
+        :param entries: the dumped entries.
+        :return: the number of entries restored.
+        """
+        restored = 0
+        for key, value in entries.items():
+            if self.partition is None or self.partition(key):
+                self.set(key, value)
+                restored += 1
+        self.high_water_mark = None
+        self.last_full_refresh = None
+        return restored
+
+    def info(self) -> dict:
+        """Get a summary of the namespace's size, age and counters.
+
+        :return: a dictionary of statistics.
+        """
+        now = time.monotonic()
+        oldest = min((loaded_at for _, loaded_at in self._entries.values()), default=None)
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "hit_ratio": self.stats.hit_ratio(),
+            "loads": self.stats.loads,
+            "load_errors": self.stats.load_errors,
+            "load_time": self.stats.load_time,
+            "evictions": self.stats.evictions,
+            "full_refreshes": self.stats.full_refreshes,
+            "delta_refreshes": self.stats.delta_refreshes,
+            "oldest_age": now - oldest if oldest is not None else None,
+            "last_refresh_age": (
+                now - self.last_refresh if self.last_refresh is not None else None
+            ),
+        }
+
+
+class CacheManager:
+    """Registry of cache namespaces, with a single loop refreshing them periodically.
+    The caches can be persisted to disk so that a restart starts warm.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Optional[Path] = None,
+        snapshot_interval: float = 10 * 60,
+        partition: Optional[Callable[[Hashable], bool]] = None,
+    ):
+        """Registry of cache namespaces, with a single loop refreshing them periodically.
+
+        :param snapshot_path: where to persist the caches, if anywhere.
+        :param snapshot_interval: seconds between periodic snapshots.
+        :param partition: tells which keys (guild IDs) belong to this process,
+            passed on to every namespace, when it only runs some shards.
+        """
+        self.namespaces: Dict[str, CacheNamespace] = {}
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.partition = partition
+        self.last_snapshot: Optional[float] = None
+
+    def __getitem__(self, name: str) -> CacheNamespace:
+        return self.namespaces[name]
+
+    def register(self, name: str, loader, **options) -> CacheNamespace:
+        """Register a new namespace, or get the existing one with that name.
+
+        :param name: the name of the namespace.
+        :param loader: a coroutine function loading the value for a single key.
+        :param options: extra options passed to :class:`CacheNamespace`.
+        :return: the registered namespace.
+        """
+        if name not in self.namespaces:
+            options.setdefault("partition", self.partition)
+            self.namespaces[name] = CacheNamespace(name, loader, **options)
+        return self.namespaces[name]
+
+    def unregister(self, name: str):
+        """Drop a namespace and everything cached in it.
+
+        :param name: the name of the namespace.
+        """
+        self.namespaces.pop(name, None)
+
+    def start(self):
+        """Start the periodic refresh loop."""
+        if not self.refresh.is_running():
+            self.refresh.start()
+
+    def stop(self):
+        """Stop the periodic refresh loop."""
+        self.refresh.cancel()
+
+    @tasks.loop(minutes=1)
+    async def refresh(self):
+        for namespace in list(self.namespaces.values()):
+            try:
+                if namespace.full_refresh_due():
+                    await namespace.refresh(full=True)
+                elif namespace.refresh_due():
+                    await namespace.refresh()
+            except Exception as e:
+                logger.error("Failed to refresh cache namespace %s: %s", namespace.name, e)
+
+        if self.snapshot_path is not None and (
+            self.last_snapshot is None
+            or time.monotonic() - self.last_snapshot >= self.snapshot_interval
+        ):
+            snapshot = self.snapshot()
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._write_snapshot, self.snapshot_path, snapshot
+                )
+            except Exception as e:
+                logger.error("Failed to save cache snapshot: %s", e)
+
+    async def refresh_all(self, full: bool = True):
+        """Refresh every namespace on demand.
+
+        :param full: whether or not to reload everything rather than only what changed.
+        """
+        for namespace in list(self.namespaces.values()):
+            await namespace.refresh(full=full)
+
+    def snapshot(self) -> dict:
+        """Get a version-stamped copy of every namespace's entries.
+
+        :return: the snapshot.
+        """
+        return {
+            "version": SNAPSHOT_VERSION,
+            "created_at": time.time(),
+            "namespaces": {
+                name: namespace.dump() for name, namespace in self.namespaces.items()
+            },
+        }
+
+    def _write_snapshot(self, path: Path, snapshot: dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.last_snapshot = time.monotonic()
+        logger.debug("Saved cache snapshot to %s", path)
+
+    def save_snapshot(self):
+        """Persist every namespace to the snapshot path, if there is one."""
+        if self.snapshot_path is None:
+            return
+        try:
+            self._write_snapshot(self.snapshot_path, self.snapshot())
+        except Exception as e:
+            logger.error("Failed to save cache snapshot: %s", e)
+
+    def load_snapshot(self) -> int:
+        """Restore the registered namespaces from the snapshot path, if there is one.
+        Snapshots with a different version stamp are ignored.
+
+        :return: the number of entries restored.
+        """
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return 0
+        try:
+            with self.snapshot_path.open("rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.warning("Failed to load cache snapshot: %s", e)
+            return 0
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.info("Ignoring cache snapshot with version %s", snapshot.get("version"))
+            return 0
+
+        restored = 0
+        for name, entries in snapshot["namespaces"].items():
+            namespace = self.namespaces.get(name)
+            if namespace is None:
+                continue
+            restored += namespace.restore(entries)
+        logger.info(
+            "Restored %d cache entries from a snapshot taken %.0fs ago",
+            restored,
+            time.time() - snapshot["created_at"],
+        )
+        return restored
+
+    def info(self) -> Dict[str, dict]:
+        """Get the statistics of every namespace.
+
+        :return: a dictionary of statistics keyed by namespace name.
+        """
+        return {name: namespace.info() for name, namespace in self.namespaces.items()}
+
+
+__all__ = ["CacheManager", "CacheNamespace", "CacheStats", "ChangeLog", "SingleFlight"]
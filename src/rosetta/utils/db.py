@@ -1,15 +1,122 @@
-from typing import Tuple, Union
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple, Union
 
 import discord
-from asgiref.sync import sync_to_async
 from discord import TextChannel
-
-from playthrough.models import Channel, Game, GameConfig, Guild, MetaRoleConfig, User
+from django.db import connection
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from playthrough.models import (
+    Alias,
+    Channel,
+    Game,
+    GameConfig,
+    Guild,
+    MetaRoleConfig,
+    User,
+)
 
 from rosetta.cogs.playthrough.utils.discord import get_channel_in_guild
+from rosetta.utils.cache import CacheManager, CacheNamespace, ChangeLog
+from rosetta.utils.role_graph import MetaRoleGraph
+from rosetta.utils.snapshots import GAME_CONFIG_SNAPSHOT_FIELDS, GameConfigSnapshot
+from rosetta.utils.telemetry import timed_sync_to_async
+
+#: Changes to the games configured in each Guild, keyed by Guild ID (int).
+game_config_changes = ChangeLog()
+#: Changes to the meta roles configured in each Guild, keyed by Guild ID (int).
+meta_role_changes = ChangeLog()
+#: The tables whose writes change the games configured in each Guild.
+GAME_CONFIG_TABLES = tuple(model._meta.db_table for model in (GameConfig, Game, Alias))
+#: The tables whose writes change the meta roles configured in each Guild.
+META_ROLE_TABLES = tuple(
+    model._meta.db_table for model in (MetaRoleConfig, MetaRoleConfig.games.through, GameConfig)
+)
+#: Seconds between full reloads of the caches fed by `load_changed_since`, as a safety net:
+#: delta refreshes already see writes made by other processes on PostgreSQL.
+FULL_REFRESH_INTERVAL = 60 * 60
+
+
+@receiver([post_save, post_delete], sender=GameConfig)
+def _record_game_config_change(sender, instance: GameConfig, **kwargs):
+    game_config_changes.record(int(instance.guild_id))
+    # Meta roles depend on the completion roles of their games
+    meta_role_changes.record(int(instance.guild_id))
+
+
+@receiver([post_save, post_delete], sender=Game)
+@receiver([post_save, post_delete], sender=Alias)
+def _record_game_change(sender, instance, **kwargs):
+    # Games are shared across guilds, so every guild's configs may be affected
+    game_config_changes.record_all()
+
+
+@receiver([post_save, post_delete], sender=MetaRoleConfig)
+@receiver(m2m_changed, sender=MetaRoleConfig.games.through)
+def _record_meta_role_change(sender, instance, **kwargs):
+    meta_role_changes.record(int(instance.guild_id))
+
+
+def _table_writes(tables: Iterable[str]) -> Optional[int]:
+    """Count the rows ever inserted, updated or deleted in some tables, by any process.
+    PostgreSQL keeps these counts in its statistics, so this is a single cheap query.
+    They are published once the writing transaction ends (up to a second later), and
+    reset along with the statistics, so only whether they changed matters.
+
+    :param tables: the names of the tables.
+    :return: the count, or `None` on other database backends.
+    """
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0) "
+            "FROM pg_stat_user_tables WHERE relname = ANY(%s)",
+            [list(tables)],
+        )
+        return cursor.fetchone()[0]
+
+
+def load_changed_since(
+    mark: Optional[tuple],
+    changes: ChangeLog,
+    tables: Iterable[str],
+    load: Callable[[Optional[Iterable[int]]], dict[int, Any]],
+) -> Tuple[tuple, dict[int, Any], Optional[set[int]]]:
+    """Load the values of the Guilds that changed since a mark, for delta loaders.
+    Writes made by this process are told apart per Guild through `changes`. Those made
+    by others (like genki's web admin, or other shard workers) are only seen as writes
+    to `tables` in the database's statistics, which reload every Guild, so do this
+    process' own writes once they show up there. Without such statistics (on other
+    backends than PostgreSQL), only writes made by this process are seen.
+
+    :param mark: the mark returned by the previous call, or `None` for every Guild.
+    :param changes: the ChangeLog of this process' writes.
+    :param tables: the names of the tables the values are loaded from.
+    :param load: loads the values of the given Guilds (or every Guild), keyed by Guild ID.
+    :return: The new mark, the values of the changed Guilds keyed by Guild ID,
+        and the IDs of changed Guilds with nothing left (`None` on a full reload).
+    """
+    # Counted before loading, so that writes made meanwhile are loaded again next time
+    writes = _table_writes(tables)
+    if mark is None or writes != mark[1]:
+        return (changes.mark, writes), load(None), None
 
+    new_mark, guild_ids = changes.changed_since(mark[0])
+    if guild_ids is None:
+        return (new_mark, writes), load(None), None
+    if not guild_ids:
+        return (new_mark, writes), {}, set()
+    changed = load(guild_ids)
+    return (new_mark, writes), changed, set(guild_ids) - set(changed)
 
-@sync_to_async
+
+@timed_sync_to_async
 def get_or_create_guild(guild: discord.Guild) -> Guild:
     """Get or create a Guild DB object from a Guild Discord object.
 
@@ -22,7 +129,7 @@ def get_or_create_guild(guild: discord.Guild) -> Guild:
     return res
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_user_from_author(author: discord.User) -> User:
     """Get a DB User object from a Discord User object.
 
@@ -32,7 +139,7 @@ def get_user_from_author(author: discord.User) -> User:
     return User.objects.filter(id=author.id).first()
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_channel_in_db(channel: discord.TextChannel) -> Channel:
     """Get a DB Channel object from a Discord Channel object.
 
@@ -42,7 +149,7 @@ def get_channel_in_db(channel: discord.TextChannel) -> Channel:
     return Channel.objects.filter(id=str(channel.id)).first()
 
 
-@sync_to_async
+@timed_sync_to_async
 def set_channel_finished(channel: Channel, finished: bool):
     """Set the finished status on a DB Channel.
 
@@ -53,7 +160,7 @@ def set_channel_finished(channel: Channel, finished: bool):
     channel.save()
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_game_config(context: discord.Interaction, game: str) -> Union[GameConfig, None]:
     """Utility function to check if the current guild has a certain game configured
 
@@ -63,25 +170,125 @@ def get_game_config(context: discord.Interaction, game: str) -> Union[GameConfig
     return GameConfig.get_by_game_alias(game, str(context.guild_id))
 
 
-@sync_to_async
-def get_all_games_per_guild() -> dict[str, list[GameConfig]]:
-    """Get all the GameConfigs for every Guild the bot is in.
+def _get_games_per_guild(
+    guild_ids: Optional[Iterable[int]] = None,
+) -> dict[int, list[GameConfigSnapshot]]:
+    """Get snapshots of the GameConfigs of the given Guilds (or every Guild).
+    Uses one projection query for the configs and one for the game aliases.
 
-    :return: A dictionary keyed by Guild ID (int) and valued with a list of GameConfigs.
+    :param guild_ids: the IDs of the guilds to fetch for, if not all of them.
+    :return: A dictionary keyed by Guild ID (int) and valued with a list of snapshots.
     """
-    ret = {}
-    guilds = list(Guild.objects.prefetch_related("games", "games__game").all())
+    game_configs = GameConfig.objects.all()
+    if guild_ids is not None:
+        game_configs = game_configs.filter(guild__id__in=[str(_id) for _id in guild_ids])
 
-    for guild in guilds:
-        game_configs = list(
-            GameConfig.objects.select_related("game").filter(guild__id=str(guild.id))
-        )
-        ret[int(guild.id)] = game_configs
+    aliases = defaultdict(list)
+    for game_config_id, alias in game_configs.filter(
+        game__aliases__isnull=False
+    ).values_list("id", "game__aliases__alias"):
+        aliases[game_config_id].append(alias)
+
+    ret = defaultdict(list)
+    for row in game_configs.values_list(*GAME_CONFIG_SNAPSHOT_FIELDS):
+        snapshot = GameConfigSnapshot.from_row(row, aliases.get(row[0], ()))
+        ret[snapshot.guild_id].append(snapshot)
+    return dict(ret)
+
+
+@timed_sync_to_async
+def get_all_games_per_guild() -> dict[int, list[GameConfigSnapshot]]:
+    """Get snapshots of all the GameConfigs for every Guild the bot is in.
+
+    :return: A dictionary keyed by Guild ID (int) and valued with a list of snapshots.
+    """
+    return _get_games_per_guild()
+
+
+@timed_sync_to_async
+def get_games_changed_since(
+    mark: Optional[tuple],
+) -> Tuple[tuple, dict[int, list[GameConfigSnapshot]], Optional[set[int]]]:
+    """Get snapshots of the GameConfigs of the Guilds whose games changed since a mark.
+
+    :param mark: the mark returned by the previous call, or `None` for every Guild.
+    :return: The new mark, the snapshots for the changed Guilds keyed by Guild ID,
+        and the IDs of changed Guilds with no games left (`None` on a full reload).
+    """
+    return load_changed_since(mark, game_config_changes, GAME_CONFIG_TABLES, _get_games_per_guild)
+
+
+@timed_sync_to_async
+def get_games(guild_id: Union[int, str]) -> list[GameConfigSnapshot]:
+    """Get snapshots of all the games configured in a given Guild.
+
+    :param guild_id: the ID of the guild to fetch for.
+    :return: A list of GameConfig snapshots for the guild.
+    """
+    return _get_games_per_guild([guild_id]).get(int(guild_id), [])
 
-    return ret
 
+def _get_meta_role_graphs(
+    guild_ids: Optional[Iterable[int]] = None,
+) -> dict[int, MetaRoleGraph]:
+    """Build the MetaRoleGraphs of the given Guilds (or every Guild) in a single query.
+    Dependencies come from the expressions themselves, so nested meta roles need no join.
 
-@sync_to_async
+    :param guild_ids: the IDs of the guilds to build the graphs for, if not all of them.
+    :return: A dictionary keyed by Guild ID (int) and valued with MetaRoleGraphs.
+    """
+    meta_roles = MetaRoleConfig.objects.all()
+    if guild_ids is not None:
+        meta_roles = meta_roles.filter(guild_id__in=[str(_id) for _id in guild_ids])
+
+    rows = defaultdict(list)
+    for guild_id, *row in meta_roles.values_list("guild_id", "id", "name", "role_id", "expression"):
+        rows[int(guild_id)].append(row)
+    return {guild_id: MetaRoleGraph.from_rows(_rows) for guild_id, _rows in rows.items()}
+
+
+@timed_sync_to_async
+def get_meta_role_graph(guild_id: Union[int, str]) -> MetaRoleGraph:
+    """Build the MetaRoleGraph of a given Guild.
+
+    :param guild_id: the ID of the guild to build the graph for.
+    :return: The guild's MetaRoleGraph.
+    """
+    return _get_meta_role_graphs([guild_id]).get(int(guild_id), MetaRoleGraph([]))
+
+
+@timed_sync_to_async
+def get_meta_role_graphs_changed_since(
+    mark: Optional[tuple],
+) -> Tuple[tuple, dict[int, MetaRoleGraph], Optional[set[int]]]:
+    """Build the MetaRoleGraphs of the Guilds whose meta roles changed since a mark.
+
+    :param mark: the mark returned by the previous call, or `None` for every Guild.
+    :return: The new mark, the graphs of the changed Guilds keyed by Guild ID,
+        and the IDs of changed Guilds with no meta roles left (`None` on a full reload).
+    """
+    return load_changed_since(mark, meta_role_changes, META_ROLE_TABLES, _get_meta_role_graphs)
+
+
+def meta_role_graph_cache(caches: CacheManager) -> CacheNamespace:
+    """Get the cache of every Guild's MetaRoleGraph, registering it if needed.
+    Several cogs use it, so each gets it from here rather than relying on another's.
+
+    :param caches: the bot's CacheManager.
+    :return: the namespace, keyed by Guild ID.
+    """
+    return caches.register(
+        "meta_role_graphs",
+        get_meta_role_graph,
+        delta_loader=get_meta_role_graphs_changed_since,
+        ttl=2 * 60 * 60,
+        maxsize=1000,
+        refresh_interval=60,
+        full_refresh_interval=FULL_REFRESH_INTERVAL,
+    )
+
+
+@timed_sync_to_async
 def get_playable_games(guild_id: Union[int, str]) -> list[GameConfig]:
     """Get all the playable games in a given Guild.
 
@@ -95,7 +302,7 @@ def get_playable_games(guild_id: Union[int, str]) -> list[GameConfig]:
     )
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_meta_roles(game_config: GameConfig) -> list[MetaRoleConfig]:
     """Utility function to get the Meta Roles for a given GameConfig.
     Mostly useful when they haven't been pre-fetched.
@@ -107,7 +314,7 @@ def get_meta_roles(game_config: GameConfig) -> list[MetaRoleConfig]:
     return list(game_config.meta_roles.all())
 
 
-@sync_to_async
+@timed_sync_to_async
 def get_existing_channel(
     ctx: discord.Interaction, game: Game
 ) -> Tuple[Channel, TextChannel]:
@@ -132,7 +339,7 @@ def get_existing_channel(
     return None, None
 
 
-@sync_to_async
+@timed_sync_to_async
 def create_channel_in_db(
     ctx: discord.Interaction,
     game_config: GameConfig,
@@ -156,7 +363,7 @@ def create_channel_in_db(
     )
 
 
-@sync_to_async
+@timed_sync_to_async
 def update_channel_id(channel: Channel, new_id: int):
     """Update a Chanel's ID value. For instance when the user creates a resume channel.
 
@@ -164,3 +371,71 @@ def update_channel_id(channel: Channel, new_id: int):
     :param new_id: the new ID to update to.
     """
     channel.update_id(new_id)
+
+
+class AdvisoryLockTimeout(TimeoutError):
+    """Raised when an advisory lock couldn't be acquired in time."""
+
+
+def _advisory_lock_key(key: Hashable) -> int:
+    """Map a key to a signed 64-bit PostgreSQL advisory lock ID, stable across processes."""
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@timed_sync_to_async
+def _try_advisory_lock(lock_id: int) -> bool:
+    """Try to take a session-level advisory lock on the process' database connection.
+
+    Every async DB helper runs on the same thread, so the whole process shares that
+    connection, and the lock is re-entrant within a session: it only excludes other
+    processes. Within one, callers must exclude each other themselves (say with a
+    `SingleFlight`). If Django closes the connection while the lock is held, the lock
+    is released with it.
+
+    :param lock_id: the ID of the lock.
+    :return: whether or not the lock was taken.
+    """
+    if connection.vendor != "postgresql":
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+        return cursor.fetchone()[0]
+
+
+@timed_sync_to_async
+def _advisory_unlock(lock_id: int):
+    """Release a lock taken with `_try_advisory_lock`.
+
+    :param lock_id: the ID of the lock.
+    """
+    if connection.vendor != "postgresql":
+        return
+    if connection.connection is None:
+        # The connection was closed, taking the lock with it, and a new one doesn't hold it
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+@asynccontextmanager
+async def advisory_lock(key: Hashable, timeout: float = 30.0, poll_interval: float = 0.25):
+    """Hold a PostgreSQL session-level advisory lock, shared by every bot instance on the database.
+    The lock is polled for rather than waited on, so the (single) DB thread is never blocked.
+    It only excludes other processes, see `_try_advisory_lock`, so hold it briefly.
+    On other database backends, there is only ever one instance, so this is a no-op.
+
+    :param key: the key identifying the lock. Its `repr` must be stable across processes.
+    :param timeout: the seconds to wait for the lock before raising `AdvisoryLockTimeout`.
+    :param poll_interval: the seconds to wait between attempts.
+    """
+    lock_id = _advisory_lock_key(key)
+    deadline = time.monotonic() + timeout
+    while not await _try_advisory_lock(lock_id):
+        if time.monotonic() >= deadline:
+            raise AdvisoryLockTimeout(f"Could not acquire advisory lock for {key!r}")
+        await asyncio.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        await _advisory_unlock(lock_id)
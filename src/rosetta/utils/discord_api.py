@@ -0,0 +1,20 @@
+"""Pointing the Discord client at another API, like a local stand-in for tests."""
+import logging
+
+from discord.http import Route
+
+logger = logging.getLogger(__name__)
+
+
+def use_api_base(base: str):
+    """Send every REST request, webhooks and interaction responses included, to another
+    API base URL. The gateway URL is then asked from that API too.
+
+    :param base: the base URL, like `http://127.0.0.1:8080/api/v10`.
+    """
+    base = base.rstrip("/")
+    Route.base = property(lambda route: base)
+    logger.warning("Using the Discord API at %s", base)
+
+
+__all__ = ["use_api_base"]
@@ -1,18 +1,26 @@
+import functools
 import os
 from pathlib import Path
 
-import docker
-
 from rosetta.config import ARCHIVE_ROOT, TOKEN
 
-client = docker.from_env()
+
+@functools.lru_cache(maxsize=None)
+def _client():
+    """Get the Docker client, created on first use.
+
+    Importing docker and connecting to the daemon is only worth it once a channel
+    is archived, and the bot shouldn't fail to start when the daemon is down."""
+    import docker
+
+    return docker.from_env()
 
 
 def export_channel(channel_id: str) -> Path:
     """Export a certain channel by its id.
     :param channel_id: The ID of the channel to export.
     :return: The `pathlib.Path` of the archive."""
-    client.containers.run(
+    _client().containers.run(
         "tyrrrz/discordchatexporter:stable",
         f"export -c {channel_id} -o /app/out/archives/{channel_id}.html",
         auto_remove=True,
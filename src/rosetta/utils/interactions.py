@@ -0,0 +1,181 @@
+"""Helpers to acknowledge interactions within Discord's 3 second deadline.
+
+Handlers decorated with `auto_defer` are deferred automatically once they've run
+for longer than a budget without responding. Responses sent through `respond` (and
+edits through `edit_response`) then transparently go out as followups instead.
+"""
+import asyncio
+import functools
+import logging
+import time
+from typing import Dict, Optional, Union
+
+import discord
+
+from rosetta import config
+from rosetta.utils.telemetry import HANDLER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerStats:
+    """Latency counters for one interaction handler."""
+
+    def __init__(self):
+        self.calls = 0
+        self.deferred = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, deferred: bool, failed: bool):
+        self.calls += 1
+        self.deferred += deferred
+        self.errors += failed
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+#: Latency counters keyed by handler name.
+handler_stats: Dict[str, HandlerStats] = {}
+
+
+class _Deferrer:
+    """Defers an interaction once a budget runs out, unless it was responded to first."""
+
+    def __init__(self, interaction: discord.Interaction, budget: float, ephemeral: bool):
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.deferred = False
+        #: Held while sending the initial response, so it can't race the deferral
+        self.lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._defer_after(budget))
+
+    async def _defer_after(self, budget: float):
+        await asyncio.sleep(budget)
+        async with self.lock:
+            if self.interaction.response.is_done():
+                return
+            try:
+                # Not invisible, so components show a "thinking" state too
+                await self.interaction.response.defer(ephemeral=self.ephemeral, invisible=False)
+                self.deferred = True
+            except discord.HTTPException as e:
+                logger.warning("Could not defer interaction %s: %s", self.interaction.id, e)
+
+    def cancel(self):
+        self._task.cancel()
+
+
+#: The deferrers of the interactions currently being handled, keyed by interaction ID.
+_deferrers: Dict[int, _Deferrer] = {}
+
+
+def _get_interaction(args) -> Optional[discord.Interaction]:
+    for arg in args:
+        if isinstance(arg, discord.Interaction):
+            return arg
+        if isinstance(arg, discord.ApplicationContext):
+            return arg.interaction
+    return None
+
+
+def auto_defer(budget: Optional[float] = None, *, ephemeral: bool = True):
+    """Decorate an interaction handler to defer it automatically when it runs long,
+    and record its latency in `handler_stats`.
+
+    :param budget: the seconds to wait for a response before deferring,
+        defaulting to `config.INTERACTION_DEFER_BUDGET`.
+    :param ephemeral: whether or not the deferred response should be ephemeral.
+    """
+
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            interaction = _get_interaction(args)
+            if interaction is None:
+                return await func(*args, **kwargs)
+
+            deferrer = _Deferrer(
+                interaction,
+                config.INTERACTION_DEFER_BUDGET if budget is None else budget,
+                ephemeral,
+            )
+            _deferrers[interaction.id] = deferrer
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                deferrer.cancel()
+                _deferrers.pop(interaction.id, None)
+                elapsed = time.perf_counter() - started
+                handler_stats.setdefault(name, HandlerStats()).record(
+                    elapsed, deferrer.deferred, failed
+                )
+                HANDLER_SECONDS.observe(elapsed, handler=name)
+                logger.debug(
+                    "Handled %s in %.3fs (deferred=%s)", name, elapsed, deferrer.deferred
+                )
+
+        return wrapper
+
+    return decorator
+
+
+async def _send(interaction: discord.Interaction, replace: bool, *args, **kwargs):
+    if not interaction.response.is_done():
+        return await interaction.response.send_message(*args, **kwargs)
+    if replace:
+        if args:
+            kwargs["content"] = args[0]
+        kwargs.pop("ephemeral", None)
+        kwargs.setdefault("view", None)
+        return await interaction.edit_original_response(**kwargs)
+    return await interaction.followup.send(*args, **kwargs)
+
+
+async def respond(
+    interaction: Union[discord.Interaction, discord.ApplicationContext],
+    *args,
+    replace: bool = False,
+    **kwargs,
+) -> Union[discord.Interaction, discord.InteractionMessage, discord.WebhookMessage]:
+    """Respond to an interaction, or send a followup if it was already responded to or deferred.
+
+    :param interaction: the Interaction (or ApplicationContext) to respond to.
+    :param replace: whether to edit the original response (removing its components)
+        rather than send a followup.
+    :return: the Interaction for an initial response, the message otherwise.
+    """
+    if isinstance(interaction, discord.ApplicationContext):
+        interaction = interaction.interaction
+    deferrer = _deferrers.get(interaction.id)
+    if deferrer is None:
+        return await _send(interaction, replace, *args, **kwargs)
+    async with deferrer.lock:
+        return await _send(interaction, replace, *args, **kwargs)
+
+
+async def edit_response(
+    response: Union[discord.Interaction, discord.InteractionMessage, discord.WebhookMessage],
+    **kwargs,
+):
+    """Edit a message sent through `respond`, whichever way it was sent.
+
+    :param response: the value returned by `respond`.
+    """
+    if isinstance(response, discord.Interaction):
+        return await response.edit_original_response(**kwargs)
+    return await response.edit(**kwargs)
+
+
+__all__ = ["HandlerStats", "auto_defer", "edit_response", "handler_stats", "respond"]
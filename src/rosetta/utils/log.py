@@ -0,0 +1,132 @@
+"""Non-blocking logging setup.
+
+Loggers only put records on a queue, and a background thread writes them out to
+stdout and a rotating log file, so logging never blocks the event loop on I/O.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+#: The format of plain-text log lines.
+LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+
+#: The attributes every LogRecord has, anything else was passed through `extra`.
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))
+) | {"message", "asctime"}
+
+#: The running listener writing out the queued records, if logging was set up.
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON objects, one per line, including their `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        return json.dumps(data, default=str)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse per-logger levels, like `discord=INFO,discord.gateway=WARNING`.
+
+    :param spec: comma separated `logger=LEVEL` pairs.
+    :return: the levels keyed by logger name.
+    """
+    levels = {}
+    for pair in spec.split(","):
+        if not pair.strip():
+            continue
+        name, _, level = pair.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    log_file: Optional[Path] = None,
+    *,
+    level: str = "DEBUG",
+    file_level: str = "INFO",
+    levels: Optional[Dict[str, str]] = None,
+    json_output: bool = False,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """Route every log record through a queue to stdout and a rotating log file.
+
+    :param log_file: the log file to write to, if any.
+    :param level: the level of the root logger (and stdout).
+    :param file_level: the minimum level written to the log file.
+    :param levels: per-logger levels, to quiet chatty libraries or debug single modules.
+    :param json_output: whether to write JSON lines rather than plain text.
+    :param max_bytes: the size after which the log file is rotated.
+    :param backup_count: how many rotated log files to keep.
+    :param stream: the stream to write to, stdout by default.
+    :return: the running QueueListener, stopped by `stop_logging` or at exit.
+    """
+    global _listener
+    # Setting up again replaces the sinks, flush the old ones first
+    stop_logging()
+
+    formatter = JsonFormatter() if json_output else logging.Formatter(LOG_FORMAT)
+
+    handlers = []
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
+    if log_file is not None:
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def stop_logging():
+    """Write out the queued records and stop the listener, if it is running."""
+    global _listener
+    # Stopping a QueueListener twice raises, so only stop the one still running
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(stop_logging)
+
+
+__all__ = ["JsonFormatter", "LOG_FORMAT", "parse_levels", "setup_logging", "stop_logging"]
@@ -0,0 +1,154 @@
+"""Event loop health: scheduling lag, and stalls caused by blocking code.
+
+A probe task sleeps for a fixed interval and measures how late it wakes up, which
+is how long every other callback would have waited too. A watchdog thread checks
+that the probe keeps running, and when it doesn't, logs what the loop thread is
+stuck on, so the blocking call can be found and moved off the loop.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Optional
+
+from rosetta.utils.telemetry import LOOP_LAG_SECONDS, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopMonitor:
+    """Measures the lag of the running event loop, and reports where it stalls."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.1,
+        stall_threshold: float = 0.25,
+        report_interval: float = 60.0,
+        debug: bool = False,
+    ):
+        """Measures the lag of the running event loop, and reports where it stalls.
+
+        :param interval: how often to measure the lag, in seconds.
+        :param stall_threshold: how long the loop may be blocked before its stack is logged.
+        :param report_interval: how often to log lag percentiles, in seconds.
+        :param debug: whether to also turn on asyncio's debug mode, which logs every
+            callback slower than `stall_threshold` along with where it was scheduled.
+            It slows everything down, so only use it while hunting stalls.
+        """
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.report_interval = report_interval
+        self.debug = debug
+        self._samples: deque = deque(maxlen=max(1, int(report_interval / interval) * 2))
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start monitoring the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.stall_threshold
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = loop.create_task(self._probe())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="rosetta-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        """Stop monitoring."""
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+        while True:
+            self._heartbeat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag = max(0.0, now - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            self._samples.append(lag)
+            if now >= next_report:
+                next_report = now + self.report_interval
+                self._report()
+
+    def _watch(self):
+        stalled_since = None
+        while not self._stopping.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.stall_threshold:
+                stalled_since = None
+            elif stalled_since != heartbeat:
+                # Log each stall once, with the stack of whatever is blocking
+                stalled_since = heartbeat
+                LOOP_STALLS.inc()
+                logger.warning(
+                    "Event loop blocked for over %.3fs, in:\n%s",
+                    blocked,
+                    self.loop_stack(),
+                    extra={"blocked": blocked},
+                )
+
+    def loop_stack(self) -> str:
+        """Get the current stack of the event loop thread."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "<unknown>"
+        return "".join(traceback.format_stack(frame))
+
+    def percentiles(self) -> Dict[str, float]:
+        """Get the lag percentiles of the recent measurements.
+
+        :return: p50, p95, p99 and max lag, in seconds, or an empty dict without measurements.
+        """
+        if not self._samples:
+            return {}
+        ordered = sorted(self._samples)
+        return {
+            "p50": _percentile(ordered, 0.5),
+            "p95": _percentile(ordered, 0.95),
+            "p99": _percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+
+    def _report(self):
+        lag = self.percentiles()
+        self._samples.clear()
+        logger.info(
+            "Event loop lag p50=%.4fs p95=%.4fs p99=%.4fs max=%.4fs",
+            lag["p50"],
+            lag["p95"],
+            lag["p99"],
+            lag["max"],
+            extra={"loop_lag": lag},
+        )
+
+
+__all__ = ["LoopMonitor"]
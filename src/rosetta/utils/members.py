@@ -0,0 +1,58 @@
+"""How much of each guild's member list the bot keeps in memory.
+
+Caching every member means chunking every guild before getting ready and holding
+all of them for as long as the bot runs, when only bulk commands like
+`/admin meta-role reapply` need the whole list. With a lazier policy, those fetch
+it when they run with `get_members`, and only keep it if members are cached.
+"""
+import logging
+import time
+from typing import List
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def parse_member_cache_flags(spec: str) -> discord.MemberCacheFlags:
+    """Parse member cache flags, like `joined,interaction`, `all` or `none`.
+
+    :param spec: `all`, `none`, or comma separated flag names.
+    :return: the flags.
+    :raises ValueError: if a flag doesn't exist.
+    """
+    spec = spec.strip().lower()
+    if spec == "all":
+        return discord.MemberCacheFlags.all()
+    flags = discord.MemberCacheFlags.none()
+    if spec == "none":
+        return flags
+    for name in spec.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in discord.MemberCacheFlags.VALID_FLAGS:
+            raise ValueError(f"Unknown member cache flag: {name}")
+        setattr(flags, name, True)
+    return flags
+
+
+async def get_members(guild: discord.Guild) -> List[discord.Member]:
+    """Get every member of a guild, chunking it if they aren't all cached.
+
+    The chunked members are only kept if the bot caches members that joined.
+
+    :param guild: the guild.
+    :return: its members.
+    """
+    if guild.chunked:
+        return list(guild.members)
+    started = time.perf_counter()
+    members = await guild.chunk(cache=False)
+    logger.info(
+        "Chunked %d members of %s in %.2fs", len(members), guild.name, time.perf_counter() - started
+    )
+    return members
+
+
+__all__ = ["get_members", "parse_member_cache_flags"]
@@ -0,0 +1,352 @@
+"""In-process metrics: counters, gauges, histograms and per-stage timing traces.
+
+Metrics live in a process-wide `REGISTRY` and are labelled the way Prometheus
+metrics are, so they can be exposed as-is. Histograms keep cumulative bucket
+counts, from which percentiles are estimated.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+#: Default histogram buckets, in seconds.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """A named metric with one value per combination of label values."""
+
+    type = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def label_values(self) -> List[LabelValues]:
+        """Get every combination of label values recorded so far."""
+        with self._lock:
+            return list(self._values)
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """A distribution of observations, counted into buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = _HistogramValue(len(self.buckets))
+            data.counts[bisect.bisect_left(self.buckets, value)] += 1
+            data.count += 1
+            data.sum += value
+
+    def snapshot(self, **labels) -> Tuple[List[int], int, float]:
+        """Get the cumulative bucket counts (the last one being +Inf), count and sum.
+
+        :return: a tuple of the cumulative counts, the count and the sum.
+        """
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                return [0] * (len(self.buckets) + 1), 0, 0.0
+            cumulative, total = [], 0
+            for count in data.counts:
+                total += count
+                cumulative.append(total)
+            return cumulative, data.count, data.sum
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile by interpolating within its bucket.
+
+        :param q: the quantile, between 0 and 1.
+        :return: the estimate, or `None` if nothing was observed.
+        """
+        cumulative, count, _ = self.snapshot(**labels)
+        if not count:
+            return None
+        rank = q * count
+        index = bisect.bisect_left(cumulative, rank)
+        if index >= len(self.buckets):
+            # Beyond the last bucket, the best we can say is "more than that"
+            return self.buckets[-1]
+        lower = self.buckets[index - 1] if index > 0 else 0.0
+        below = cumulative[index - 1] if index > 0 else 0
+        in_bucket = cumulative[index] - below
+        if not in_bucket:
+            return self.buckets[index]
+        return lower + (self.buckets[index] - lower) * (rank - below) / in_bucket
+
+
+class Registry:
+    """A collection of metrics, keyed by name."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or register a Counter."""
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or register a Gauge."""
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Get or register a Histogram."""
+        return self._get_or_create(Histogram, name, description, labelnames, buckets)
+
+    def __iter__(self) -> Iterator[_Metric]:
+        with self._lock:
+            return iter(list(self._metrics.values()))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a function updating gauges right before they're read,
+        for values that are cheaper to sample than to track (like cache sizes).
+
+        :param collector: the function, taking no arguments.
+        """
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]):
+        self._collectors.remove(collector)
+
+    def collect(self):
+        """Run the collectors, logging rather than raising their errors."""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector %r failed", collector)
+
+    def render(self) -> str:
+        """Collect and render every metric in the Prometheus text exposition format."""
+        self.collect()
+        lines = []
+        for metric in sorted(self, key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for values in sorted(metric.label_values()):
+                labels = dict(zip(metric.labelnames, values))
+                if isinstance(metric, Histogram):
+                    cumulative, count, total = metric.snapshot(**labels)
+                    bounds = [_format_value(b) for b in metric.buckets] + ["+Inf"]
+                    for bound, bucket_count in zip(bounds, cumulative):
+                        lines.append(
+                            f"{metric.name}_bucket{_format_labels(labels, le=bound)} {bucket_count}"
+                        )
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                else:
+                    lines.append(
+                        f"{metric.name}{_format_labels(labels)} {_format_value(metric.get(**labels))}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+#: The process-wide registry.
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rosetta_stage_seconds",
+    "Time spent in each stage of traced operations.",
+    ("operation", "stage"),
+)
+
+_current_trace = contextvars.ContextVar("rosetta_trace", default=None)
+
+
+class Trace:
+    """Times the stages of one operation. Use it as a context manager around the
+    operation, and `stage` around each of its stages. When the operation ends, the
+    timings are observed into `STAGE_SECONDS` and logged as structured fields.
+    """
+
+    def __init__(self, operation: str, **fields):
+        """Times the stages of one operation.
+
+        :param operation: the name of the operation, like `channel_creation`.
+        :param fields: extra fields to log along with the timings.
+        """
+        self.operation = operation
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.duration: Optional[float] = None
+        self._started = None
+        self._token = None
+
+    def __enter__(self) -> "Trace":
+        self._started = time.perf_counter()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        self.duration = time.perf_counter() - self._started
+        STAGE_SECONDS.observe(self.duration, operation=self.operation, stage="total")
+        logger.info(
+            "%s took %.3fs (%s)",
+            self.operation,
+            self.duration,
+            " ".join(f"{name}={elapsed:.3f}" for name, elapsed in self.stages.items()),
+            extra={
+                "operation": self.operation,
+                "duration": self.duration,
+                "stages": dict(self.stages),
+                "failed": exc_type is not None,
+                **self.fields,
+            },
+        )
+
+    def record(self, stage: str, elapsed: float):
+        """Record the time spent in a stage. Stages run more than once add up.
+
+        :param stage: the name of the stage.
+        :param elapsed: the seconds spent in it.
+        """
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+        STAGE_SECONDS.observe(elapsed, operation=self.operation, stage=stage)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the operation currently being traced, if any.
+    The trace is found through a context variable, so helpers can mark their own
+    stages without being passed the trace.
+
+    :param name: the name of the stage.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, time.perf_counter() - started)
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the operation currently running, if any."""
+    return _current_trace.get()
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "REGISTRY",
+    "Registry",
+    "STAGE_SECONDS",
+    "Trace",
+    "current_trace",
+    "stage",
+]
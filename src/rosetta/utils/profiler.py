@@ -0,0 +1,188 @@
+"""A sampling profiler that can be turned on and off in the running bot.
+
+Every `interval`, the stacks of all threads are sampled (the wall-clock view,
+which includes time spent waiting), and every `task_interval` the await chain of
+every asyncio task is (the task view, showing what each task is waiting on).
+Profiles are written in the folded stack format read by flamegraph.pl, speedscope
+and most other flamegraph tools, and the wall-clock view as pstats too.
+"""
+import asyncio
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+FrameKey = Tuple[str, int, str]
+
+
+def _frame_key(code: CodeType) -> FrameKey:
+    return code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name)
+
+
+def _frame_label(key: FrameKey) -> str:
+    filename, line, name = key
+    # `;` separates frames in the folded format
+    return f"{name} ({Path(filename).name}:{line})".replace(";", ":")
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[FrameKey]:
+    """Get the stack of a running thread, outermost frame first."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_key(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(awaitable) -> List[FrameKey]:
+    """Get the chain of coroutines a suspended coroutine is awaiting, outermost first."""
+    stack = []
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_key(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+class SamplingProfiler:
+    """Samples thread stacks and asyncio tasks until stopped."""
+
+    def __init__(self, interval: float = 0.005, task_interval: float = 0.05):
+        """Samples thread stacks and asyncio tasks until stopped.
+
+        :param interval: how often to sample thread stacks, in seconds.
+        :param task_interval: how often to sample asyncio tasks, in seconds.
+            Tasks are sampled on the event loop itself, so this is kept coarser.
+        """
+        self.interval = interval
+        self.task_interval = task_interval
+        self.wall: Counter = Counter()
+        self.tasks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.duration: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling, from the event loop."""
+        if self.running:
+            raise RuntimeError("The profiler is already running")
+        self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._sample_threads, name="rosetta-profiler", daemon=True
+        )
+        self._thread.start()
+        self._timer = self._loop.call_later(self.task_interval, self._sample_tasks)
+
+    def stop(self):
+        """Stop sampling."""
+        if not self.running:
+            raise RuntimeError("The profiler is not running")
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.duration = time.monotonic() - self.started
+
+    def _sample_threads(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stopping.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                root = ("<thread>", 0, names.get(thread_id, str(thread_id)))
+                self.wall[(root, *_thread_stack(frame))] += 1
+            self.samples += 1
+
+    def _sample_tasks(self):
+        current = asyncio.current_task(self._loop)
+        for task in asyncio.all_tasks(self._loop):
+            if task is current or task.done():
+                continue
+            chain = _await_chain(task.get_coro())
+            if chain:
+                self.tasks[tuple(chain)] += 1
+        self._timer = self._loop.call_later(self.task_interval, self._sample_tasks)
+
+    @staticmethod
+    def folded(stacks: Counter) -> str:
+        """Render stacks in the folded format, one `frame;frame;frame count` line each."""
+        return "".join(
+            "{} {}\n".format(";".join(_frame_label(key) for key in stack), count)
+            for stack, count in stacks.most_common()
+        )
+
+    def pstats(self) -> Dict:
+        """Convert the wall-clock samples to the statistics `pstats.Stats` loads.
+
+        :return: the statistics, keyed by (filename, line, function).
+        """
+        # Each entry is [primitive calls, calls, own time, cumulative time, callers]
+        stats: Dict[FrameKey, list] = {}
+        for stack, count in self.wall.items():
+            elapsed = count * self.interval
+            stack = stack[1:]
+            seen = set()
+            for index, key in enumerate(stack):
+                entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                if index == len(stack) - 1:
+                    entry[2] += elapsed
+                if key not in seen:
+                    # Recursive frames only count once towards the cumulative time
+                    seen.add(key)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += elapsed
+                if index:
+                    caller = entry[4].setdefault(stack[index - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += elapsed
+                    if index == len(stack) - 1:
+                        caller[2] += elapsed
+        return {
+            key: (cc, nc, tt, ct, {caller: tuple(v) for caller, v in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in stats.items()
+        }
+
+    def dump(self, directory: Path, name: str) -> List[Path]:
+        """Write the profiles to a directory.
+
+        :param directory: the directory to write to, created if needed.
+        :param name: the base name of the files.
+        :return: the paths of the wall-clock folded stacks, the task folded stacks
+            and the wall-clock pstats.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        wall_path = directory / f"{name}-wall.folded"
+        tasks_path = directory / f"{name}-tasks.folded"
+        pstats_path = directory / f"{name}-wall.pstats"
+        wall_path.write_text(self.folded(self.wall), encoding="utf-8")
+        tasks_path.write_text(self.folded(self.tasks), encoding="utf-8")
+        with open(pstats_path, "wb") as f:
+            marshal.dump(self.pstats(), f)
+        return [wall_path, tasks_path, pstats_path]
+
+
+__all__ = ["SamplingProfiler"]
@@ -1,6 +1,7 @@
 import enum
-import itertools
+import re
 from collections import deque
+from typing import NamedTuple
 
 
 class TokenType(enum.Enum):
@@ -12,15 +13,8 @@ class TokenType(enum.Enum):
     LOGIC_NOT = 3
     L_PARANTHESIS = 4
     R_PARANTHESIS = 5
-
-
-#: Expression token dictionary to simplify code a bit
-TokenDic = {
-    "&": TokenType.LOGIC_AND,
-    "|": TokenType.LOGIC_OR,
-    "!": TokenType.LOGIC_NOT,
-    "(": TokenType.L_PARANTHESIS,
-}
+    THRESHOLD = 6
+    CONSTANT = 7
 
 
 #: Precedence value dictionary for postfix conversion
@@ -29,20 +23,55 @@ Precedence = {
     TokenType.LOGIC_AND: 11,
     TokenType.LOGIC_OR: 10,
     TokenType.SYMBOL: 0,
+    TokenType.THRESHOLD: 0,
     TokenType.L_PARANTHESIS: 0,
     TokenType.R_PARANTHESIS: 0,
 }
 
 
-class ExpressionToken:
+class ExpressionToken(NamedTuple):
     """Expression token representation"""
 
-    type = -1
-    value = ""
+    type: TokenType
+    value: object = 0
+
+
+#: Expression token dictionary, mapping scanner groups to their shared token
+TokenDic = {
+    "and": ExpressionToken(TokenType.LOGIC_AND),
+    "or": ExpressionToken(TokenType.LOGIC_OR),
+    "not": ExpressionToken(TokenType.LOGIC_NOT),
+    "l_paranthesis": ExpressionToken(TokenType.L_PARANTHESIS),
+    "r_paranthesis": ExpressionToken(TokenType.R_PARANTHESIS),
+}
+
+
+#: Single-pass scanner. Symbols are Discord role IDs, and thresholds
+#: look like `atleast(2; 123, 456, 789)`
+TokenPattern = re.compile(
+    r"""\s*(?:
+        (?P<symbol>\d+)
+        |(?P<and>&&)
+        |(?P<or>\|\|)
+        |(?P<not>!)
+        |(?P<l_paranthesis>\()
+        |(?P<r_paranthesis>\))
+        |(?P<threshold>atleast\s*\(\s*(?P<count>\d+)\s*;(?P<symbols>[\d\s,]*)\))
+        |(?P<end>$)
+    )""",
+    re.VERBOSE,
+)
+
 
-    def __init__(self, type, value):
-        self.type = type
-        self.value = value
+def get_symbols(tokens):
+    """Get the unique symbols of a tokenized or compiled expression, in order"""
+    symbols = []
+    for token in tokens:
+        if token.type == TokenType.SYMBOL:
+            symbols.append(token.value)
+        elif token.type == TokenType.THRESHOLD:
+            symbols.extend(token.value[1])
+    return list(dict.fromkeys(symbols))
 
 
 class MetaRoleEvaluator:
@@ -51,50 +80,70 @@ class MetaRoleEvaluator:
 
     def __init__(self, role_dict: dict):
         self.dictionary = role_dict
+        self._bit_index = None
+        self._bitset = 0
 
     def tokenize(self, in_str):
-        """Tokenize the input string"""
+        """Tokenize the input string in a single pass.
+        Error positions are indexes in the input string."""
         tokens = []
-        # Remove whitespace
-        in_str = "".join(in_str.split())
-        # If the first character is not a symbol name start or '!' or
-        # '(' we have an invalid expression
-        if not (in_str[0].isdigit() or in_str[0] == "!" or in_str[0] == "("):
-            raise Exception("Invalid syntax at 0")
+        # Whether the next token must be an operand (symbol, threshold, '!' or '(')
+        expect_operand = True
+        open_paranthesis = []
         i = 0
-        while i < len(in_str):
-            # Symbol name must start with a digit (Discord role ID)
-            if in_str[i].isdigit():
-                symbol = "".join(itertools.takewhile(lambda x: x.isdigit(), in_str[i:]))
-                i += len(symbol) - 1
-                tokens.append(ExpressionToken(TokenType.SYMBOL, symbol))
-            elif (in_str[i] == "&" and in_str[i + 1] == "&") or (
-                in_str[i] == "|" and in_str[i + 1] == "|"
-            ):
-                i += 1
-                # If no next char or next char is r_paranthesis - invalid syntax
-                if i + 1 >= len(in_str) or in_str[i + 1] == ")":
-                    raise Exception("Invalid syntax at {}".format(i))
-                tokens.append(ExpressionToken(TokenDic[in_str[i]], 0))
-            elif in_str[i] == "!" or in_str[i] == "(":
-                # For unary operations and left paranthesis
-                # if previous token is a symbol or r_paranthesis - invalid syntax
-                if tokens and (
-                    tokens[-1].type == TokenType.SYMBOL
-                    or tokens[-1].type == TokenType.R_PARANTHESIS
-                ):
+        while True:
+            match = TokenPattern.match(in_str, i)
+            if match is None:
+                i = len(in_str) - len(in_str[i:].lstrip())
+                raise Exception("Illegal token {} at {}".format(in_str[i], i))
+            kind = match.lastgroup
+            i = match.start(kind)
+            if kind == "end":
+                break
+            if kind == "symbol" or kind == "threshold":
+                if not expect_operand:
                     raise Exception("Invalid syntax at {}".format(i))
-                tokens.append(ExpressionToken(TokenDic[in_str[i]], 0))
-            elif in_str[i] == ")":
-                # Empty paranthesis
-                if tokens and tokens[-1].type == TokenType.L_PARANTHESIS:
+                if kind == "symbol":
+                    tokens.append(ExpressionToken(TokenType.SYMBOL, match.group(kind)))
+                else:
+                    tokens.append(self._threshold_token(match, i))
+                expect_operand = False
+            elif kind == "not" or kind == "l_paranthesis":
+                if not expect_operand:
                     raise Exception("Invalid syntax at {}".format(i))
-                tokens.append(ExpressionToken(TokenType.R_PARANTHESIS, 0))
+                if kind == "l_paranthesis":
+                    open_paranthesis.append(i)
+                tokens.append(TokenDic[kind])
             else:
-                raise Exception("Illegal token {} at {}".format(in_str[i], i))
-            i += 1
+                # Binary operators and right paranthesis need a left operand,
+                # which also rules out empty paranthesis
+                if expect_operand:
+                    raise Exception("Invalid syntax at {}".format(i))
+                if kind == "r_paranthesis":
+                    if not open_paranthesis:
+                        raise Exception("Missing parenthesis at {}".format(i))
+                    open_paranthesis.pop()
+                else:
+                    expect_operand = True
+                tokens.append(TokenDic[kind])
+            i = match.end()
+        if expect_operand:
+            raise Exception("Invalid syntax at {}".format(i))
+        if open_paranthesis:
+            raise Exception("Missing parenthesis at {}".format(open_paranthesis[-1]))
         return tokens
 
+    def _threshold_token(self, match, i):
+        """Build the token for a matched threshold operator"""
+        count = int(match.group("count"))
+        symbols = tuple(symbol.strip() for symbol in match.group("symbols").split(","))
+        if not all(symbol.isdigit() for symbol in symbols):
+            raise Exception("Invalid syntax at {}".format(i))
+        unique_symbols = tuple(dict.fromkeys(symbols))
+        if not 1 <= count <= len(unique_symbols):
+            raise Exception("Invalid threshold {} at {}".format(count, i))
+        return ExpressionToken(TokenType.THRESHOLD, (count, unique_symbols))
+
     def convert_to_postfix(self, tokens):
         """Convert tokenized expression to postfix form"""
         stack = deque()
@@ -108,7 +157,7 @@ class MetaRoleEvaluator:
                         if not stack:
                             break
                 stack.append(token)
-            elif token.type == TokenType.SYMBOL:
+            elif token.type == TokenType.SYMBOL or token.type == TokenType.THRESHOLD:
                 output.append(token)
             elif token.type == TokenType.LOGIC_NOT:
                 stack.append(token)
@@ -136,11 +185,14 @@ class MetaRoleEvaluator:
             raise Exception("Symbol {} doesn't exist.".format(symbol))
         return self.dictionary[symbol]
 
-    def evaluate(self, in_str):
-        """Evaluate string expression"""
+    def compile(self, in_str):
+        """Compile a string expression into its postfix form, for repeated evaluation"""
         if not in_str:
             raise Exception("Empty expression string")
-        tokens = self.convert_to_postfix(self.tokenize(in_str))
+        return self.convert_to_postfix(self.tokenize(in_str))
+
+    def evaluate_postfix(self, tokens):
+        """Evaluate an expression compiled to postfix form"""
         stack = deque()
         result = False
         for token in tokens:
@@ -160,4 +212,182 @@ class MetaRoleEvaluator:
                 stack.append(result)
             elif token.type == TokenType.SYMBOL:
                 stack.append(self.evaluate_symbol(token.value))
+            elif token.type == TokenType.THRESHOLD:
+                stack.append(self.evaluate_threshold(*token.value))
         return stack.pop()
+
+    def evaluate_threshold(self, count, symbols):
+        """Evaluate whether at least `count` of the symbols are true.
+        Counts with a popcount over a bitset of the dictionary's true symbols."""
+        if self._bit_index is None:
+            self._bit_index = {}
+            for i, (symbol, value) in enumerate(self.dictionary.items()):
+                self._bit_index[symbol] = 1 << i
+                if value:
+                    self._bitset |= 1 << i
+        mask = 0
+        for symbol in symbols:
+            if symbol not in self._bit_index:
+                raise Exception("Symbol {} doesn't exist.".format(symbol))
+            mask |= self._bit_index[symbol]
+        return bin(self._bitset & mask).count("1") >= count
+
+    def evaluate_tree(self, tree):
+        """Evaluate an expression tree, short-circuiting AND and OR"""
+        kind, value = tree
+        if kind == TokenType.SYMBOL:
+            return self.evaluate_symbol(value)
+        elif kind == TokenType.LOGIC_AND:
+            return all(self.evaluate_tree(child) for child in value)
+        elif kind == TokenType.LOGIC_OR:
+            return any(self.evaluate_tree(child) for child in value)
+        elif kind == TokenType.LOGIC_NOT:
+            return not self.evaluate_tree(value)
+        elif kind == TokenType.THRESHOLD:
+            return self.evaluate_threshold(*value)
+        return value
+
+    def evaluate(self, in_str):
+        """Evaluate string expression"""
+        return self.evaluate_postfix(self.compile(in_str))
+
+
+# Expression trees are nested `(TokenType, value)` tuples:
+# - `(SYMBOL, "123")` and `(CONSTANT, True)`
+# - `(THRESHOLD, (count, ("123", "456", ...)))`
+# - `(LOGIC_NOT, child)`
+# - `(LOGIC_AND, (child, child, ...))` and `(LOGIC_OR, (child, child, ...))`
+
+TRUE = (TokenType.CONSTANT, True)
+FALSE = (TokenType.CONSTANT, False)
+
+
+def build_tree(postfix):
+    """Build an expression tree from an expression compiled to postfix form"""
+    stack = []
+    for token in postfix:
+        if token.type == TokenType.SYMBOL or token.type == TokenType.THRESHOLD:
+            stack.append((token.type, token.value))
+        elif token.type == TokenType.LOGIC_NOT:
+            stack.append((token.type, stack.pop()))
+        else:
+            right = stack.pop()
+            left = stack.pop()
+            stack.append((token.type, (left, right)))
+    if len(stack) != 1:
+        raise Exception("Invalid expression")
+    return stack[0]
+
+
+def get_cost(tree):
+    """Estimate the cost of evaluating an expression tree, in symbol lookups"""
+    kind, value = tree
+    if kind == TokenType.SYMBOL:
+        return 1
+    elif kind == TokenType.THRESHOLD:
+        return len(value[1])
+    elif kind == TokenType.LOGIC_NOT:
+        return get_cost(value)
+    elif kind == TokenType.LOGIC_AND or kind == TokenType.LOGIC_OR:
+        return sum(get_cost(child) for child in value)
+    return 0
+
+
+def get_tree_symbols(tree):
+    """Get the unique symbols of an expression tree, in order"""
+    kind, value = tree
+    if kind == TokenType.SYMBOL:
+        return [value]
+    elif kind == TokenType.THRESHOLD:
+        return list(value[1])
+    elif kind == TokenType.LOGIC_NOT:
+        return get_tree_symbols(value)
+    elif kind == TokenType.LOGIC_AND or kind == TokenType.LOGIC_OR:
+        return list(dict.fromkeys(s for child in value for s in get_tree_symbols(child)))
+    return []
+
+
+def simplify(tree):
+    """Simplify an expression tree into its canonical form.
+
+    Removes double negations, turns trivial thresholds into AND/OR, flattens nested
+    AND/OR, folds constants and complementary terms, removes duplicate and absorbed
+    terms and orders terms cheapest first (so short-circuiting skips the expensive ones).
+    """
+    kind, value = tree
+    if kind == TokenType.LOGIC_NOT:
+        child = simplify(value)
+        if child[0] == TokenType.LOGIC_NOT:
+            return child[1]
+        if child[0] == TokenType.CONSTANT:
+            return TRUE if child == FALSE else FALSE
+        return (kind, child)
+    elif kind == TokenType.THRESHOLD:
+        count, symbols = value
+        symbols = tuple(sorted(set(symbols), key=int))
+        if count <= 0:
+            return TRUE
+        if count > len(symbols):
+            return FALSE
+        if count == 1 or count == len(symbols):
+            children = tuple((TokenType.SYMBOL, symbol) for symbol in symbols)
+            op = TokenType.LOGIC_OR if count == 1 else TokenType.LOGIC_AND
+            return simplify((op, children))
+        return (kind, (count, symbols))
+    elif kind == TokenType.LOGIC_AND or kind == TokenType.LOGIC_OR:
+        # The constant that decides the result outright, and the one that is ignored
+        absorbing, identity = (FALSE, TRUE) if kind == TokenType.LOGIC_AND else (TRUE, FALSE)
+        children = {}
+        for child in value:
+            child = simplify(child)
+            grandchildren = child[1] if child[0] == kind else (child,)
+            for grandchild in grandchildren:
+                if grandchild == absorbing:
+                    return absorbing
+                if grandchild != identity:
+                    children[grandchild] = None
+        for child in children:
+            if (TokenType.LOGIC_NOT, child) in children:
+                return absorbing
+        # Absorption: `a || (a && b)` is `a`, and `a && (a || b)` is `a`
+        dual = TokenType.LOGIC_OR if kind == TokenType.LOGIC_AND else TokenType.LOGIC_AND
+        children = {
+            child: None
+            for child in children
+            if not (child[0] == dual and any(c in children for c in child[1]))
+        }
+        if not children:
+            return identity
+        if len(children) == 1:
+            return next(iter(children))
+        return (kind, tuple(sorted(children, key=lambda c: (get_cost(c), to_expression(c)))))
+    return tree
+
+
+def to_expression(tree):
+    """Convert an expression tree back into a string expression"""
+    kind, value = tree
+    if kind == TokenType.SYMBOL:
+        return value
+    elif kind == TokenType.THRESHOLD:
+        return "atleast({}; {})".format(value[0], ", ".join(value[1]))
+    elif kind == TokenType.LOGIC_NOT:
+        if value[0] == TokenType.LOGIC_AND or value[0] == TokenType.LOGIC_OR:
+            return "!({})".format(to_expression(value))
+        return "!" + to_expression(value)
+    elif kind == TokenType.LOGIC_AND:
+        return " && ".join(
+            "({})".format(to_expression(child))
+            if child[0] == TokenType.LOGIC_OR
+            else to_expression(child)
+            for child in value
+        )
+    elif kind == TokenType.LOGIC_OR:
+        return " || ".join(to_expression(child) for child in value)
+    raise Exception("Expression is always {}".format(value))
+
+
+def canonicalize(in_str):
+    """Get the simplified expression tree and canonical form of a string expression"""
+    tree = simplify(build_tree(MetaRoleEvaluator({}).compile(in_str)))
+    return tree, to_expression(tree)
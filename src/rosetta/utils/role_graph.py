@@ -0,0 +1,224 @@
+"""Per-guild graph of meta roles and the roles they depend on.
+
+Meta role expressions may reference completion roles as well as other meta roles.
+The graph orders meta roles so that every meta role comes after the ones it
+references, and evaluates each of them at most once per member.
+"""
+import logging
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from rosetta.utils.role_expr import MetaRoleEvaluator, canonicalize, get_tree_symbols
+
+logger = logging.getLogger(__name__)
+
+
+class MetaRoleNode(NamedTuple):
+    """A meta role with its compiled expression and the roles it depends on.
+    `program` is the simplified expression tree, and `canonical` its string form.
+    """
+
+    id: int
+    name: str
+    role_id: str
+    expression: str
+    canonical: str
+    program: tuple
+    dependencies: frozenset
+
+    def __str__(self) -> str:
+        return self.name
+
+    def evaluate(self, role_ids: Set[str]) -> bool:
+        """Evaluate the meta role's expression for a set of roles.
+
+        :param role_ids: the IDs of the roles a member has (or qualifies for).
+        :return: whether or not the member qualifies for the meta role.
+        """
+        evaluator = MetaRoleEvaluator(
+            {role_id: role_id in role_ids for role_id in self.dependencies}
+        )
+        return evaluator.evaluate_tree(self.program)
+
+
+#: A row of (meta role ID, name, role ID, expression).
+MetaRoleRow = Tuple[int, str, str, str]
+
+
+class MetaRoleGraph:
+    """The meta roles of a guild in dependency order, indexed by the roles they depend on."""
+
+    def __init__(self, nodes: Iterable[MetaRoleNode]):
+        """The meta roles of a guild in dependency order.
+        Meta roles that are part of (or depend on) a cycle are logged and left out.
+
+        :param nodes: the guild's meta roles.
+        """
+        nodes = list(nodes)
+        by_role_id = {node.role_id: node for node in nodes}
+
+        # Kahn's algorithm over the meta role -> referenced meta role edges
+        remaining = {}
+        dependents = defaultdict(list)
+        for node in nodes:
+            references = [by_role_id[_id] for _id in node.dependencies if _id in by_role_id]
+            remaining[node.role_id] = len(references)
+            for reference in references:
+                dependents[reference.role_id].append(node)
+        queue = deque(node for node in nodes if remaining[node.role_id] == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for dependent in dependents[node.role_id]:
+                remaining[dependent.role_id] -= 1
+                if remaining[dependent.role_id] == 0:
+                    queue.append(dependent)
+        if len(order) != len(nodes):
+            ordered = set(node.role_id for node in order)
+            logger.error(
+                "Skipping meta roles with cyclic dependencies: %s",
+                ", ".join(node.name for node in nodes if node.role_id not in ordered),
+            )
+
+        #: The meta roles, each one after every meta role it references.
+        self.nodes: List[MetaRoleNode] = order
+        self._position = {node.role_id: i for i, node in enumerate(order)}
+        self._by_id = {node.id: node for node in order}
+        self._dependents = defaultdict(list)
+        for node in order:
+            for role_id in node.dependencies:
+                self._dependents[role_id].append(node)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[MetaRoleRow]) -> "MetaRoleGraph":
+        """Build the graph from meta role rows.
+        Expressions are simplified into their canonical form once, here.
+        Meta roles whose expression is invalid or constant are logged and left out.
+
+        :param rows: the rows, one per meta role.
+        :return: the graph.
+        """
+        nodes = []
+        for _id, name, role_id, expression in rows:
+            try:
+                program, canonical = canonicalize(expression)
+            except Exception as e:
+                logger.error("Skipping meta role %s with invalid expression: %s", name, e)
+                continue
+            nodes.append(
+                MetaRoleNode(
+                    id=_id,
+                    name=name,
+                    role_id=str(role_id),
+                    expression=expression,
+                    canonical=canonical,
+                    program=program,
+                    dependencies=frozenset(get_tree_symbols(program)),
+                )
+            )
+        return cls(nodes)
+
+    def get(self, _id: int) -> Optional[MetaRoleNode]:
+        """Get a meta role by its database ID.
+
+        :param _id: the ID of the MetaRoleConfig.
+        :return: the meta role, or `None` if it isn't in the graph.
+        """
+        return self._by_id.get(_id)
+
+    def is_meta_role(self, role_id: str) -> bool:
+        """Whether or not a role is one of the graph's meta roles.
+
+        :param role_id: the ID of the Discord role.
+        :return: whether or not it's a meta role.
+        """
+        return role_id in self._position
+
+    def dependents(self, role_id: str) -> List[MetaRoleNode]:
+        """Get the meta roles directly depending on a role.
+
+        :param role_id: the ID of the completion role or meta role.
+        :return: the dependent meta roles.
+        """
+        return self._dependents.get(role_id, [])
+
+    def _closure(self, role_ids: Iterable[str], edges) -> Set[str]:
+        seen = set()
+        stack = list(role_ids)
+        while stack:
+            for node in edges(stack.pop()):
+                if node.role_id not in seen:
+                    seen.add(node.role_id)
+                    stack.append(node.role_id)
+        return seen
+
+    def _references(self, role_id: str) -> List[MetaRoleNode]:
+        node = self.nodes[self._position[role_id]]
+        return [
+            self.nodes[self._position[_id]]
+            for _id in node.dependencies
+            if _id in self._position
+        ]
+
+    def affected_by(self, role_id: str) -> Set[str]:
+        """Get the meta roles depending on a role, directly or through other meta roles.
+
+        :param role_id: the ID of the completion role or meta role.
+        :return: the IDs of the affected meta roles' Discord roles.
+        """
+        return self._closure([role_id], self.dependents)
+
+    def creates_cycle(self, role_id: str, references: Iterable[str]) -> bool:
+        """Whether or not a meta role referencing the given roles would create a cycle.
+
+        :param role_id: the ID of the meta role's Discord role.
+        :param references: the IDs of the roles its expression references.
+        :return: whether or not there would be a cycle.
+        """
+        references = set(references)
+        if role_id in references:
+            return True
+        return role_id in self._closure(
+            [_id for _id in references if _id in self._position], self._references
+        )
+
+    def evaluate(self, role_ids: Set[str], targets: Iterable[str]) -> Dict[str, bool]:
+        """Evaluate meta roles for a member, in dependency order.
+        Meta roles the targets reference are evaluated too, each exactly once,
+        and count as held only if the member qualifies for them.
+
+        :param role_ids: the IDs of the roles the member has.
+        :param targets: the IDs of the meta roles' Discord roles to evaluate.
+        :return: whether or not the member qualifies, keyed by meta role role ID.
+        """
+        needed = set(_id for _id in targets if _id in self._position)
+        needed |= self._closure(needed, self._references)
+        effective = set(role_ids) - needed
+        results = {}
+        for role_id in sorted(needed, key=self._position.__getitem__):
+            node = self.nodes[self._position[role_id]]
+            results[role_id] = node.evaluate(effective)
+            if results[role_id]:
+                effective.add(role_id)
+        return results
+
+    def meta_roles_to_grant(
+        self, completion_role_id: str, role_ids: Set[str]
+    ) -> List[MetaRoleNode]:
+        """Get the meta roles a member qualifies for after gaining a completion role.
+        Includes meta roles depending on it through other meta roles.
+
+        :param completion_role_id: the ID of the completion role just gained.
+        :param role_ids: the IDs of the roles the member has.
+        :return: the meta roles to grant, in dependency order.
+        """
+        affected = self.affected_by(completion_role_id)
+        results = self.evaluate(role_ids | {completion_role_id}, affected)
+        return [node for node in self.nodes if node.role_id in affected and results[node.role_id]]
+
+
+__all__ = ["MetaRoleGraph", "MetaRoleNode"]
@@ -0,0 +1,286 @@
+"""Scheduling of outbound Discord REST calls.
+
+Every call the bot makes through its HTTP client waits for a slot in the scheduler.
+Calls run in one of two priority lanes: interactive (the default) and background,
+for bulk jobs such as reapplying roles or archiving a category. Waiting interactive
+calls are always served before waiting background ones. Background calls can never
+take the slots kept for interactive calls, and each route (a rate-limit bucket, like
+the roles of one guild) has its own concurrency limit with slots kept for interactive
+calls too, so a bulk job can't monopolise a bucket.
+
+A slot is only held while a request is on the wire: the HTTP client's connector
+takes it, and gives it back once the response is read. The waits for rate limits
+and the retries of discord.py's HTTP client hold no slot.
+"""
+import asyncio
+import contextvars
+import enum
+import functools
+import itertools
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import aiohttp
+
+
+class Priority(enum.IntEnum):
+    """The priority lanes, most urgent first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority = contextvars.ContextVar("rosetta_request_priority", default=Priority.INTERACTIVE)
+#: The route key of the Discord call being made, set by `RequestScheduler.install`.
+_route = contextvars.ContextVar("rosetta_request_route", default=None)
+
+
+@contextmanager
+def background():
+    """Run the Discord calls made within the block (and tasks it spawns) in the background lane."""
+    token = _priority.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    """Get the priority lane of the Discord calls made from the current context."""
+    return _priority.get()
+
+
+def route_key(route) -> str:
+    """Get the scheduling key of a Discord route: its method and rate-limit bucket,
+    which has its major parameters, like `DELETE 123:None:/channels/{channel_id}`.
+
+    :param route: the `discord.http.Route`.
+    :return: the key.
+    """
+    return f"{route.method} {route.bucket}"
+
+
+class LaneStats:
+    """Counters for one priority lane."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queued = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.requests += 1
+        if wait > 0:
+            self.queued += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class RequestScheduler:
+    """Admits outbound requests by priority, within global and per-route concurrency limits."""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 16,
+        interactive_reserve: int = 4,
+        route_concurrency: int = 4,
+        route_interactive_reserve: int = 1,
+        route_limits: Optional[Dict[str, int]] = None,
+    ):
+        """Admits outbound requests by priority, within global and per-route concurrency limits.
+
+        :param max_concurrency: how many requests may be in flight at once.
+        :param interactive_reserve: how many of those slots only interactive requests may use.
+        :param route_concurrency: how many requests per route may be in flight at once.
+        :param route_interactive_reserve: how many of each route's slots only interactive
+            requests may use, background ones always getting at least one.
+        :param route_limits: per-route overrides of `route_concurrency`, keyed by `route_key`.
+        """
+        if not 0 <= interactive_reserve < max_concurrency:
+            raise ValueError("interactive_reserve must be between 0 and max_concurrency")
+        if not 0 <= route_interactive_reserve < route_concurrency:
+            raise ValueError("route_interactive_reserve must be between 0 and route_concurrency")
+        self.max_concurrency = max_concurrency
+        self.interactive_reserve = interactive_reserve
+        self.route_concurrency = route_concurrency
+        self.route_interactive_reserve = route_interactive_reserve
+        self.route_limits = dict(route_limits or {})
+        self.stats = {priority: LaneStats() for priority in Priority}
+        self._in_flight = 0
+        self._route_in_flight: Dict[str, int] = {}
+        self._waiters: List[tuple] = []
+        self._counter = itertools.count()
+
+    def _route_limit(self, key: str) -> int:
+        return self.route_limits.get(key, self.route_concurrency)
+
+    def _can_run(self, key: str, priority: Priority) -> bool:
+        limit = self.max_concurrency
+        route_limit = self._route_limit(key)
+        if priority != Priority.INTERACTIVE:
+            limit -= self.interactive_reserve
+            route_limit = max(1, route_limit - self.route_interactive_reserve)
+        return self._in_flight < limit and self._route_in_flight.get(key, 0) < route_limit
+
+    def _take(self, key: str):
+        self._in_flight += 1
+        self._route_in_flight[key] = self._route_in_flight.get(key, 0) + 1
+
+    def _wake(self):
+        """Hand free slots to waiters, most urgent first.
+        A waiter blocked by its route's limit doesn't hold back waiters on other routes,
+        but a background waiter is never admitted while an interactive one could be.
+        """
+        admitted = []
+        for waiter in self._waiters:
+            priority, _, key, future = waiter
+            if future.done():
+                admitted.append(waiter)
+            elif self._can_run(key, priority):
+                self._take(key)
+                future.set_result(None)
+                admitted.append(waiter)
+            elif self._in_flight >= self.max_concurrency:
+                break
+        for waiter in admitted:
+            self._waiters.remove(waiter)
+
+    async def acquire(self, key: str, priority: Optional[Priority] = None):
+        """Wait for a slot for a request.
+
+        :param key: the route key of the request.
+        :param priority: the lane of the request, defaulting to the current context's.
+        """
+        if priority is None:
+            priority = current_priority()
+        started = time.perf_counter()
+        queued_ahead = any(waiter[0] <= priority for waiter in self._waiters)
+        if not queued_ahead and self._can_run(key, priority):
+            self._take(key)
+            self.stats[priority].record(0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._counter), key, future)
+        self._waiters.append(waiter)
+        self._waiters.sort(key=lambda w: w[:2])
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled, hand the slot on
+                self.release(key)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        self.stats[priority].record(time.perf_counter() - started)
+
+    def release(self, key: str):
+        """Free the slot of a finished request.
+
+        :param key: the route key of the request.
+        """
+        self._in_flight -= 1
+        self._route_in_flight[key] -= 1
+        if not self._route_in_flight[key]:
+            del self._route_in_flight[key]
+        self._wake()
+
+    async def run(self, key: str, func, *args, priority: Optional[Priority] = None, **kwargs):
+        """Run a request once a slot is free.
+
+        :param key: the route key of the request.
+        :param func: the coroutine function making the request.
+        :param priority: the lane of the request, defaulting to the current context's.
+        :return: the request's result.
+        """
+        await self.acquire(key, priority)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.release(key)
+
+    def install(self, http):
+        """Schedule every request of a discord.py HTTP client.
+        The client must log in with `connector()` as its `connector`, which takes the
+        slots: this only tells it which route each request is for.
+
+        :param http: the `discord.http.HTTPClient`, usually `bot.http`.
+        """
+        request = http.request
+
+        @functools.wraps(request)
+        async def scheduled_request(route, **kwargs):
+            token = _route.set(route_key(route))
+            try:
+                return await request(route, **kwargs)
+            finally:
+                _route.reset(token)
+
+        http.request = scheduled_request
+
+    def connector(self, **kwargs) -> "SchedulingConnector":
+        """Create a connector taking a slot for each request of an `install`ed client.
+        Must be called with the event loop running, like when logging in.
+
+        :param kwargs: the options of the `aiohttp.TCPConnector`.
+        """
+        return SchedulingConnector(self, **kwargs)
+
+    def info(self) -> dict:
+        """Get a summary of the scheduler's state, for inspection commands and logs."""
+        return {
+            "in_flight": self._in_flight,
+            "waiting": {
+                priority.name.lower(): sum(1 for w in self._waiters if w[0] == priority)
+                for priority in Priority
+            },
+            "lanes": {
+                priority.name.lower(): dict(vars(stats))
+                for priority, stats in self.stats.items()
+            },
+        }
+
+
+class SchedulingConnector(aiohttp.TCPConnector):
+    """A connector holding a scheduler slot while each request is on the wire.
+    Connections made outside an `install`ed client's requests, like the gateway's,
+    aren't scheduled.
+    """
+
+    def __init__(self, scheduler: RequestScheduler, **kwargs):
+        """A connector holding a scheduler slot while each request is on the wire.
+
+        :param scheduler: the scheduler to take the slots from.
+        :param kwargs: the options of the `aiohttp.TCPConnector`.
+        """
+        super().__init__(**kwargs)
+        self.scheduler = scheduler
+
+    async def connect(self, req, traces, timeout):
+        key = _route.get()
+        if key is None:
+            return await super().connect(req, traces, timeout)
+        await self.scheduler.acquire(key)
+        try:
+            connection = await super().connect(req, traces, timeout)
+        except BaseException:
+            self.scheduler.release(key)
+            raise
+        # Released (or closed) once the response has been read
+        connection.add_callback(functools.partial(self.scheduler.release, key))
+        return connection
+
+
+__all__ = [
+    "Priority",
+    "RequestScheduler",
+    "SchedulingConnector",
+    "background",
+    "current_priority",
+    "route_key",
+]
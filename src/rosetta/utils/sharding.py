@@ -0,0 +1,115 @@
+"""Helpers to run the bot's shards over several worker processes.
+
+Each worker runs a range of the shards, given as `ROSETTA_SHARD_IDS` with the total
+`ROSETTA_SHARD_COUNT`, and only handles the guilds on those shards. Whatever a
+worker keeps per guild (caches, snapshots) is partitioned the same way.
+"""
+from typing import Hashable, List, Optional, Sequence
+
+import discord
+
+
+def parse_shard_ids(spec: Optional[str]) -> Optional[List[int]]:
+    """Parse shard IDs, like `0-3` or `0,2,4-5`.
+
+    :param spec: comma separated shard IDs or inclusive ranges of them.
+    :return: the sorted shard IDs, or `None` for every shard if there are none.
+    :raises ValueError: if the spec is malformed.
+    """
+    if not spec or not spec.strip():
+        return None
+    shard_ids = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        shard_ids.update(range(int(first), int(last or first) + 1))
+    return sorted(shard_ids)
+
+
+def format_shard_ids(shard_ids: Sequence[int]) -> str:
+    """Format shard IDs the way `parse_shard_ids` reads them, with ranges where possible.
+
+    :param shard_ids: the shard IDs.
+    :return: the spec.
+    """
+    parts = []
+    for shard_id in sorted(shard_ids):
+        if parts and parts[-1][1] == shard_id - 1:
+            parts[-1][1] = shard_id
+        else:
+            parts.append([shard_id, shard_id])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in parts)
+
+
+def split_shards(shard_count: int, workers: int) -> List[List[int]]:
+    """Split the shards into contiguous ranges, one per worker, as even as possible.
+
+    :param shard_count: the total number of shards.
+    :param workers: the number of workers, capped at the number of shards.
+    :return: the shard IDs of each worker.
+    """
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def shard_for(guild_id: int, shard_count: int) -> int:
+    """Get the shard a guild is on, the way Discord assigns them.
+
+    :param guild_id: the ID of the guild.
+    :param shard_count: the total number of shards.
+    :return: the shard ID.
+    """
+    return (int(guild_id) >> 22) % shard_count
+
+
+class ShardPartition:
+    """Tells whether a guild is handled by this process, from its shards."""
+
+    def __init__(self, shard_ids: Sequence[int], shard_count: int):
+        """Tells whether a guild is handled by this process, from its shards.
+
+        :param shard_ids: the shards of this process.
+        :param shard_count: the total number of shards.
+        """
+        self.shard_ids = frozenset(shard_ids)
+        self.shard_count = shard_count
+
+    def __call__(self, guild_id: Hashable) -> bool:
+        """Whether a guild is on one of the shards.
+
+        :param guild_id: the ID of the guild, as an int or a string.
+        """
+        return shard_for(guild_id, self.shard_count) in self.shard_ids
+
+    def __repr__(self) -> str:
+        return f"<ShardPartition {format_shard_ids(self.shard_ids)} of {self.shard_count}>"
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should run.
+
+    :param token: the bot's token.
+    :return: the recommended number of shards.
+    """
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token)
+        shard_count, _ = await http.get_bot_gateway()
+        return shard_count
+    finally:
+        await http.close()
+
+
+__all__ = [
+    "ShardPartition",
+    "format_shard_ids",
+    "parse_shard_ids",
+    "recommended_shard_count",
+    "shard_for",
+    "split_shards",
+]
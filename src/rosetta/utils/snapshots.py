@@ -0,0 +1,71 @@
+"""Compact, immutable copies of the database objects kept in the caches."""
+import sys
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+
+class GameConfigSnapshot(NamedTuple):
+    """An immutable copy of the GameConfig (and Game) fields read on hot paths."""
+
+    id: int
+    guild_id: int
+    game_id: int
+    name: str
+    slug: str
+    aliases: Tuple[str, ...]
+    playable: bool
+    emoji: Optional[str]
+    completion_role_id: str
+    channel_suffix: str
+
+    def __str__(self) -> str:
+        return self.name
+
+    @classmethod
+    def from_row(cls, row: tuple, aliases: Iterable[str] = ()) -> "GameConfigSnapshot":
+        """Build a snapshot from a row of `GAME_CONFIG_SNAPSHOT_FIELDS` values.
+        Strings shared between guilds are interned so each is only held once.
+
+        :param row: the values, in the order of `GAME_CONFIG_SNAPSHOT_FIELDS`.
+        :param aliases: the aliases of the game.
+        :return: the snapshot.
+        """
+        (
+            _id,
+            guild_id,
+            game_id,
+            name,
+            slug,
+            playable,
+            emoji,
+            completion_role_id,
+            channel_suffix,
+        ) = row
+        return cls(
+            id=_id,
+            guild_id=int(guild_id),
+            game_id=game_id,
+            name=sys.intern(name),
+            slug=sys.intern(slug),
+            aliases=tuple(sys.intern(alias) for alias in aliases),
+            playable=playable,
+            emoji=emoji,
+            completion_role_id=completion_role_id,
+            channel_suffix=sys.intern(channel_suffix or ""),
+        )
+
+
+#: The `values_list` projection used to build a `GameConfigSnapshot`.
+GAME_CONFIG_SNAPSHOT_FIELDS = (
+    "id",
+    "guild_id",
+    "game_id",
+    "game__name",
+    "game__slug",
+    "playable",
+    "emoji",
+    "completion_role_id",
+    "game__channel_suffix",
+)
+
+
+__all__ = ["GameConfigSnapshot", "GAME_CONFIG_SNAPSHOT_FIELDS"]
@@ -0,0 +1,179 @@
+"""A supervisor running the bot's shards over several worker processes.
+
+It splits the shards into contiguous ranges and starts the bot once per range with
+`ROSETTA_SHARD_IDS` and `ROSETTA_SHARD_COUNT` set, staggering the starts so that
+the workers don't all identify at once. Workers that exit are restarted, backing
+off while they keep crashing.
+"""
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from rosetta.utils.sharding import format_shard_ids, split_shards
+
+logger = logging.getLogger(__name__)
+
+#: Discord allows one identify every 5 seconds, unless the bot has a higher max concurrency.
+IDENTIFY_INTERVAL = 5.0
+
+
+class Worker:
+    """A worker process, running some of the shards."""
+
+    def __init__(self, shard_ids: List[int], command: Sequence[str], env: Dict[str, str]):
+        """A worker process, running some of the shards.
+
+        :param shard_ids: the shards it runs.
+        :param command: the command starting the bot.
+        :param env: the environment of the process.
+        """
+        self.shard_ids = shard_ids
+        self.command = list(command)
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at: Optional[float] = None
+        self.restarts = 0
+        #: How many times in a row it exited soon after starting
+        self.failures = 0
+        self.restart_at: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"shards {format_shard_ids(self.shard_ids)}"
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, env=self.env)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info("Started the worker for %s (pid %s)", self.name, self.process.pid)
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+
+class Supervisor:
+    """Starts the workers running the shards, and restarts those that exit."""
+
+    def __init__(
+        self,
+        command: Sequence[str],
+        shard_count: int,
+        workers: int,
+        *,
+        env: Optional[Dict[str, str]] = None,
+        metrics_port: Optional[int] = None,
+        identify_interval: float = IDENTIFY_INTERVAL,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 60.0,
+        stable_after: float = 60.0,
+    ):
+        """Starts the workers running the shards, and restarts those that exit.
+
+        :param command: the command starting the bot.
+        :param shard_count: the total number of shards.
+        :param workers: the number of worker processes, capped at the number of shards.
+        :param env: the environment of the workers, this process' by default.
+        :param metrics_port: the metrics port of the first worker, the others
+            using the following ports, if any.
+        :param identify_interval: seconds to wait per shard before starting the next worker.
+        :param restart_delay: seconds to wait before restarting a worker the first time.
+        :param max_restart_delay: the longest to wait before restarting a worker,
+            the delay doubling every time it exits soon after starting.
+        :param stable_after: seconds after which a worker that exits is restarted
+            right away again.
+        """
+        self.shard_count = shard_count
+        self.identify_interval = identify_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.workers: List[Worker] = []
+        for i, shard_ids in enumerate(split_shards(shard_count, workers)):
+            worker_env = {
+                **(os.environ if env is None else env),
+                "ROSETTA_SHARD_COUNT": str(shard_count),
+                "ROSETTA_SHARD_IDS": format_shard_ids(shard_ids),
+            }
+            if metrics_port:
+                worker_env["ROSETTA_METRICS_PORT"] = str(metrics_port + i)
+            self.workers.append(Worker(shard_ids, command, worker_env))
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start every worker, waiting for the shards of each to identify before the next."""
+        for i, worker in enumerate(self.workers):
+            if self._stopping.is_set():
+                return
+            if i:
+                self._stopping.wait(self.identify_interval * len(self.workers[i - 1].shard_ids))
+                if self._stopping.is_set():
+                    return
+            worker.start()
+
+    def check(self) -> int:
+        """Restart the workers that exited, once their backoff is over.
+
+        :return: the number of workers running.
+        """
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is None or worker.running():
+                continue
+            if worker.restart_at is None:
+                if now - worker.started_at >= self.stable_after:
+                    worker.failures = 0
+                delay = min(self.restart_delay * 2 ** worker.failures, self.max_restart_delay)
+                worker.failures += 1
+                worker.restart_at = now + delay
+                logger.warning(
+                    "The worker for %s exited with %s, restarting it in %.0fs",
+                    worker.name,
+                    worker.process.returncode,
+                    delay,
+                )
+            if now >= worker.restart_at:
+                worker.restarts += 1
+                worker.start()
+        return sum(worker.running() for worker in self.workers)
+
+    def stop(self, timeout: float = 30.0):
+        """Stop every worker, killing those that don't exit in time.
+
+        :param timeout: seconds to wait for the workers to close cleanly.
+        """
+        self._stopping.set()
+        running = [worker for worker in self.workers if worker.running()]
+        for worker in running:
+            worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in running:
+            try:
+                worker.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning("The worker for %s didn't stop in time, killing it", worker.name)
+                worker.process.kill()
+                worker.process.wait()
+
+    def run(self, poll_interval: float = 1.0):
+        """Start the workers and keep them running until SIGINT or SIGTERM.
+
+        :param poll_interval: seconds between checks of the workers.
+        """
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self._stopping.set())
+        logger.info(
+            "Running %d shards over %d workers", self.shard_count, len(self.workers)
+        )
+        try:
+            self.start()
+            while not self._stopping.wait(poll_interval):
+                self.check()
+        finally:
+            self.stop()
+
+
+__all__ = ["IDENTIFY_INTERVAL", "Supervisor", "Worker"]
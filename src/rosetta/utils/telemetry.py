@@ -0,0 +1,220 @@
+"""Process telemetry: the metrics the bot exports, and the HTTP endpoint serving them.
+
+The endpoint is optional and serves `REGISTRY` in the Prometheus text format on
+`/metrics`. It is meant to be bound to localhost (or a private network) and scraped.
+"""
+import functools
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+from asgiref.sync import sync_to_async
+from discord import HTTPException
+
+from rosetta.utils.metrics import REGISTRY, Registry
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+COMMAND_SECONDS = REGISTRY.histogram(
+    "rosetta_command_seconds",
+    "Time taken by application commands.",
+    ("command", "status"),
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "rosetta_handler_seconds",
+    "Time taken by interaction handlers, including buttons.",
+    ("handler",),
+)
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "rosetta_db_call_seconds",
+    "Time taken by database calls, once running in the database thread.",
+    ("call",),
+)
+DB_QUEUE_SECONDS = REGISTRY.histogram(
+    "rosetta_db_queue_seconds",
+    "Time database calls spent waiting for the database thread.",
+    ("call",),
+)
+DB_PENDING = REGISTRY.gauge(
+    "rosetta_db_pending_calls",
+    "Database calls queued or running in the database thread.",
+)
+EXPORT_SECONDS = REGISTRY.histogram(
+    "rosetta_export_seconds",
+    "Time taken to export a channel.",
+)
+ARCHIVE_BYTES = REGISTRY.histogram(
+    "rosetta_archive_bytes",
+    "Size of exported channel archives.",
+    buckets=tuple(2**i * 1024 for i in range(0, 21, 2)),
+)
+DISCORD_REQUESTS = REGISTRY.counter(
+    "rosetta_discord_requests_total",
+    "Discord REST calls, by route and final status (`ok` on success).",
+    ("route", "status"),
+)
+DISCORD_REQUEST_SECONDS = REGISTRY.histogram(
+    "rosetta_discord_request_seconds",
+    "Time taken by Discord REST calls, rate limit waits and retries included.",
+    ("route",),
+)
+DISCORD_RATE_LIMITED = REGISTRY.counter(
+    "rosetta_discord_rate_limited_total",
+    "Discord REST calls that failed with a 429 status, by route.",
+    ("route",),
+)
+GATEWAY_LATENCY = REGISTRY.gauge(
+    "rosetta_gateway_latency_seconds",
+    "Latency between a gateway heartbeat and its acknowledgement.",
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "rosetta_cache_hit_ratio",
+    "Hit ratio of each cache namespace.",
+    ("namespace",),
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "rosetta_cache_entries",
+    "Entries in each cache namespace.",
+    ("namespace",),
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "rosetta_loop_lag_seconds",
+    "How late the event loop runs scheduled callbacks.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = REGISTRY.counter(
+    "rosetta_loop_stalls_total",
+    "Times the event loop was blocked for longer than the stall threshold.",
+)
+
+
+def timed_sync_to_async(func):
+    """Like `sync_to_async`, recording how long the call waited for and ran in the database thread.
+
+    :param func: the synchronous function making database calls.
+    """
+    name = func.__name__
+
+    def timed(queued_at, *args, **kwargs):
+        started = time.perf_counter()
+        DB_QUEUE_SECONDS.observe(started - queued_at, call=name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - started, call=name)
+
+    run = sync_to_async(timed)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        DB_PENDING.set(DB_PENDING.get() + 1)
+        try:
+            return await run(time.perf_counter(), *args, **kwargs)
+        finally:
+            DB_PENDING.set(DB_PENDING.get() - 1)
+
+    return wrapper
+
+
+def instrument_http(http):
+    """Count and time the requests of a discord.py HTTP client by route.
+    Call it after `install`ing the scheduler, so the time spent queued is included.
+    The client retries rate limited requests by itself, so the status is the last one.
+
+    :param http: the `discord.http.HTTPClient`, usually `bot.http`.
+    """
+    request = http.request
+
+    @functools.wraps(request)
+    async def instrumented_request(route, **kwargs):
+        key = f"{route.method} {route.path}"
+        status = "error"
+        started = time.perf_counter()
+        try:
+            result = await request(route, **kwargs)
+            status = "ok"
+            return result
+        except HTTPException as e:
+            status = e.status
+            if e.status == 429:
+                DISCORD_RATE_LIMITED.inc(route=key)
+            raise
+        finally:
+            DISCORD_REQUESTS.inc(route=key, status=status)
+            DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started, route=key)
+
+    http.request = instrumented_request
+
+
+def register_bot_collectors(bot, registry: Registry = REGISTRY):
+    """Sample the bot's gateway latency and cache statistics whenever metrics are read.
+
+    :param bot: the Rosetta bot.
+    :param registry: the registry to register the collector with.
+    """
+
+    def collect():
+        latency = bot.latency
+        GATEWAY_LATENCY.set(latency)
+        for name, info in bot.caches.info().items():
+            CACHE_HIT_RATIO.set(info["hit_ratio"], namespace=name)
+            CACHE_ENTRIES.set(info["entries"], namespace=name)
+
+    registry.add_collector(collect)
+    return collect
+
+
+class MetricsServer:
+    """A minimal HTTP server exposing a registry on `/metrics`."""
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY):
+        """A minimal HTTP server exposing a registry on `/metrics`.
+
+        :param host: the address to bind to.
+        :param port: the port to bind to, 0 for any free one.
+        :param registry: the registry to expose.
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def _metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    async def start(self):
+        """Start serving, in the running event loop."""
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the actual port when binding to any free one
+        self.port = self._runner.addresses[0][1]
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+__all__ = [
+    "MetricsServer",
+    "instrument_http",
+    "register_bot_collectors",
+    "timed_sync_to_async",
+]
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database(tmp_path_factory):
+    """A throwaway genki database, skipping the tests that need it when genki isn't installed."""
+    pytest.importorskip("genki")
+    from benchmarks.database import setup_database
+
+    return setup_database(tmp_path_factory.mktemp("db") / "rosetta.sqlite3")
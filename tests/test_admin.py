@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from benchmarks.fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+@pytest.fixture
+def admin_cog(database):
+    from rosetta.cogs.admin import Admin
+
+    return Admin
+
+
+def test_every_admin_subgroup_requires_bot_admin(admin_cog):
+    from rosetta.utils import checks
+
+    subgroups = [
+        command
+        for command in admin_cog.admin.subcommands
+        if isinstance(command, discord.SlashCommandGroup)
+    ]
+    assert subgroups
+    for subgroup in subgroups:
+        assert checks.is_bot_admin in subgroup.checks, subgroup.name
+
+
+def test_full_cache_refreshes_are_rate_limited(admin_cog, monkeypatch):
+    from rosetta import config
+    from rosetta.utils.cache import CacheManager
+
+    monkeypatch.setattr(config, "CACHE_REFRESH_COOLDOWN", 60)
+    refreshes = []
+
+    async def refresh_all(full=False):
+        refreshes.append(full)
+
+    caches = CacheManager()
+    monkeypatch.setattr(caches, "refresh_all", refresh_all)
+    cog = admin_cog(SimpleNamespace(caches=caches))
+    guild = FakeGuild(FakeDiscord(), "Guild")
+    user = guild.add_member("admin")
+
+    async def refresh(full):
+        ctx = FakeInteraction(guild, user)
+        await admin_cog.refresh.callback(cog, ctx, full)
+        return ctx.messages
+
+    assert asyncio.run(refresh(True)) == ["Caches refreshed!"]
+    assert "try again" in asyncio.run(refresh(True))[0]
+    assert asyncio.run(refresh(False)) == ["Caches refreshed!"]
+    assert refreshes == [True, False]
+
+
+@pytest.mark.parametrize("command", ["channel", "category"])
+def test_archiving_finished_channels_marks_them_finished(admin_cog, monkeypatch, tmp_path, command):
+    from playthrough.models import Channel
+
+    from benchmarks.archive import StubExporter
+    from benchmarks.database import GAMES, seed_channels, seed_guild
+    from rosetta.cogs.playthrough.utils import channel as channel_module
+    from rosetta.utils.cache import CacheManager
+
+    monkeypatch.setattr(channel_module, "export_channel", StubExporter(tmp_path, size=1000))
+    guild = FakeGuild(FakeDiscord(), "Guild")
+    seed_guild(guild)
+    category = asyncio.run(guild.create_category(GAMES[0][0]))
+    channel = asyncio.run(guild.create_text_channel("player-plays", category=category))
+    (channel_obj,) = seed_channels(guild, GAMES[0][0], [channel])
+    cog = admin_cog(SimpleNamespace(caches=CacheManager()))
+    ctx = FakeInteraction(guild, guild.add_member("admin"), pick_after=0)
+
+    if command == "channel":
+        asyncio.run(admin_cog.channel.callback(cog, ctx, channel, True))
+    else:
+        asyncio.run(admin_cog.category.callback(cog, ctx, category, True))
+
+    assert channel not in guild.text_channels
+    assert Channel.objects.get(id=channel_obj.id).finished
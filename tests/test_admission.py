@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from rosetta.utils.admission import AdmissionController, QueueFull
+
+
+def test_concurrency_limit_and_order():
+    controller = AdmissionController(concurrency=2, rate=1000, burst=1000)
+    running = []
+    peak = []
+    order = []
+    positions = []
+
+    async def operation(i):
+        async def on_queued(position):
+            positions.append((i, position))
+
+        async with controller.admit(1, on_queued=on_queued):
+            order.append(i)
+            running.append(i)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(i)
+
+    async def run():
+        await asyncio.gather(*[operation(i) for i in range(6)])
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert order == list(range(6))
+    assert positions == [(2, 1), (3, 2), (4, 3), (5, 4)]
+    assert controller.queue_length(1) == 0
+
+
+def test_guilds_are_independent():
+    controller = AdmissionController(concurrency=1, rate=1000, burst=1000)
+    order = []
+
+    async def operation(guild_id, delay):
+        async with controller.admit(guild_id):
+            order.append(guild_id)
+            await asyncio.sleep(delay)
+
+    async def run():
+        await asyncio.gather(operation(1, 0.05), operation(1, 0), operation(2, 0))
+
+    asyncio.run(run())
+    assert order == [1, 2, 1]
+
+
+def test_rate_limit():
+    controller = AdmissionController(concurrency=10, rate=100, burst=2)
+    started = []
+
+    async def operation():
+        async with controller.admit(1):
+            started.append(asyncio.get_running_loop().time())
+
+    async def run():
+        await asyncio.gather(*[operation() for _ in range(6)])
+
+    asyncio.run(run())
+    # Two start straight away, the other four at ~100 per second
+    assert started[-1] - started[0] >= 0.03
+
+
+def test_queue_full():
+    controller = AdmissionController(concurrency=1, rate=1000, burst=1000, max_queue=1)
+
+    async def hold(event):
+        async with controller.admit(1):
+            await event.wait()
+
+    async def run():
+        event = asyncio.Event()
+        first = asyncio.create_task(hold(event))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(hold(event))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            async with controller.admit(1):
+                pass
+        event.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_queue():
+    controller = AdmissionController(concurrency=1, rate=1000, burst=1000)
+
+    async def hold(delay):
+        async with controller.admit(1):
+            await asyncio.sleep(delay)
+
+    async def run():
+        first = asyncio.create_task(hold(0.02))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(0))
+        await asyncio.sleep(0)
+        assert controller.queue_length(1) == 1
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert controller.queue_length(1) == 0
+        await first
+        await asyncio.wait_for(hold(0), 1)
+
+    asyncio.run(run())
+
+
+def test_idle_guilds_are_forgotten():
+    controller = AdmissionController(concurrency=1, rate=100, burst=2)
+
+    async def run():
+        async with controller.admit(1):
+            pass
+        # The bucket is still refilling, so the guild's rate limit is remembered
+        assert 1 in controller._queues
+        await asyncio.sleep(0.05)
+        assert 1 not in controller._queues
+
+        async with controller.admit(2):
+            assert 2 in controller._queues
+            await asyncio.sleep(0.05)
+        # Refilled while it ran
+        assert 2 not in controller._queues
+
+    asyncio.run(run())
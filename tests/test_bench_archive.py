@@ -0,0 +1,34 @@
+import tracemalloc
+from contextlib import contextmanager
+
+from benchmarks.archive import StageRecorder, StubExporter
+
+
+def test_stub_exporter_writes_archives_of_the_given_size(tmp_path):
+    exporter = StubExporter(tmp_path, size=10_000)
+    path = exporter(123)
+    assert path == tmp_path / "123.html"
+    assert path.stat().st_size == 10_000
+
+
+def test_stage_recorder_measures_time_and_memory():
+    calls = []
+
+    @contextmanager
+    def stage(name):
+        calls.append(name)
+        yield
+
+    recorder = StageRecorder(stage)
+    tracemalloc.start()
+    try:
+        with recorder.stage("open"):
+            data = bytearray(1024 * 1024)
+        with recorder.stage("open"):
+            pass
+    finally:
+        tracemalloc.stop()
+    del data
+    assert calls == ["open", "open"]
+    assert len(recorder.times["open"]) == 2
+    assert recorder.peaks["open"] >= 1024 * 1024
@@ -0,0 +1,41 @@
+import asyncio
+
+import discord
+import pytest
+
+from benchmarks.fakes import CATEGORY_CHANNEL_LIMIT, FakeDiscord, FakeGuild, FakeInteraction
+from rosetta.utils.interactions import auto_defer, respond
+
+
+def test_interaction_helpers_accept_fakes():
+    api = FakeDiscord(latency=0.01)
+    guild = FakeGuild(api, "Guild")
+    interaction = FakeInteraction(guild, guild.add_member("player"))
+
+    @auto_defer(budget=0.01)
+    async def handler(ctx):
+        await asyncio.sleep(0.05)
+        await respond(ctx, "first")
+        await respond(ctx, "done", replace=True)
+
+    asyncio.run(handler(interaction))
+    assert interaction.deferred
+    assert interaction.messages == ["first", "done"]
+    assert api.calls == {"interaction_response": 1, "followup": 1, "edit_original_response": 1}
+
+
+def test_full_category_rejects_channels():
+    async def run():
+        guild = FakeGuild(FakeDiscord(), "Guild")
+        category = await guild.create_category("Steins;Gate")
+        for i in range(CATEGORY_CHANNEL_LIMIT):
+            await guild.create_text_channel(f"player{i}-plays-sg", category=category)
+        with pytest.raises(discord.HTTPException):
+            await guild.create_text_channel("late-plays-sg", category=category)
+        channel = guild.text_channels[0]
+        await channel.delete()
+        return guild, category
+
+    guild, category = asyncio.run(run())
+    assert len(category.channels) == CATEGORY_CHANNEL_LIMIT - 1
+    assert len(guild.channels) == CATEGORY_CHANNEL_LIMIT
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.startup import compare, parse_importtime
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:        80 |        200 | io
+import time:       300 |        300 |     docker.api
+import time:       100 |        400 |   docker
+import time:        50 |        450 | rosetta.utils.exporter
+Some other output
+"""
+
+
+def test_parse_importtime():
+    imports = parse_importtime(IMPORTTIME)
+    assert [(i.module, i.depth) for i in imports] == [
+        ("_io", 1),
+        ("io", 0),
+        ("docker.api", 2),
+        ("docker", 1),
+        ("rosetta.utils.exporter", 0),
+    ]
+    assert imports[-1].self_us == 50
+    assert imports[-1].cumulative_us == 450
+
+
+def test_compare_to_baseline():
+    baseline = {"imports": 1.0, "ready": 2.0}
+    assert compare({"imports": 1.1, "ready": 2.3}, baseline, 0.2) == []
+    assert compare({"imports": 1.1, "ready": 2.5}, baseline, 0.2) == ["ready: 2.50s, over 2.00s + 20%"]
+
+
+def test_exporter_imports_docker_lazily():
+    code = "import sys, rosetta.utils.exporter; assert 'docker' not in sys.modules"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
@@ -0,0 +1,208 @@
+import asyncio
+
+import pytest
+
+from rosetta.utils import cache
+from rosetta.utils.cache import CacheManager, CacheNamespace, ChangeLog, SingleFlight
+
+
+def _counting_loader(calls, delay=0):
+    async def loader(key):
+        calls.append(key)
+        await asyncio.sleep(delay)
+        return f"value-{key}"
+
+    return loader
+
+
+def test_hit_and_miss():
+    calls = []
+    namespace = CacheNamespace("test", _counting_loader(calls))
+
+    async def run():
+        assert await namespace.get(1) == "value-1"
+        assert await namespace.get(1) == "value-1"
+
+    asyncio.run(run())
+    assert calls == [1]
+    assert namespace.stats.hits == 1
+    assert namespace.stats.misses == 1
+    assert namespace.stats.loads == 1
+
+
+def test_get_cached_does_not_load():
+    calls = []
+    namespace = CacheNamespace("test", _counting_loader(calls))
+    assert namespace.get_cached(1, default=[]) == []
+    assert calls == []
+    assert namespace.stats.misses == 1
+
+
+def test_lru_eviction():
+    namespace = CacheNamespace("test", _counting_loader([]), maxsize=2)
+    namespace.set(1, "a")
+    namespace.set(2, "b")
+    namespace.get_cached(1)
+    namespace.set(3, "c")
+    assert 1 in namespace
+    assert 2 not in namespace
+    assert 3 in namespace
+    assert namespace.stats.evictions == 1
+
+
+def test_ttl_expiry():
+    calls = []
+    namespace = CacheNamespace("test", _counting_loader(calls), ttl=0)
+    namespace.set(1, "stale")
+    assert 1 not in namespace
+    assert asyncio.run(namespace.get(1)) == "value-1"
+    assert calls == [1]
+
+
+def test_single_flight_loading():
+    calls = []
+    namespace = CacheNamespace("test", _counting_loader(calls, delay=0.01))
+
+    async def run():
+        return await asyncio.gather(*[namespace.get(1) for _ in range(10)])
+
+    assert asyncio.run(run()) == ["value-1"] * 10
+    assert calls == [1]
+
+
+def test_single_flight_propagates_errors():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            flights.do("key", fail), flights.do("key", fail), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert not flights.in_flight("key")
+
+
+def test_refresh_replaces_entries():
+    async def bulk_loader():
+        return {1: "a", 2: "b"}
+
+    namespace = CacheNamespace(
+        "test", _counting_loader([]), bulk_loader=bulk_loader, refresh_interval=60
+    )
+    namespace.set(3, "c")
+    assert namespace.full_refresh_due()
+    asyncio.run(namespace.refresh())
+    assert 3 not in namespace
+    assert namespace.get_cached(1) == "a"
+    assert not namespace.full_refresh_due()
+
+
+def test_manager_register_and_info():
+    manager = CacheManager()
+    namespace = manager.register("games", _counting_loader([]), maxsize=10)
+    assert manager.register("games", _counting_loader([])) is namespace
+    assert manager["games"] is namespace
+    namespace.set(1, "a")
+    info = manager.info()["games"]
+    assert info["entries"] == 1
+    assert info["maxsize"] == 10
+    manager.unregister("games")
+    with pytest.raises(KeyError):
+        manager["games"]
+
+
+def test_change_log():
+    changes = ChangeLog()
+    mark = changes.mark
+    changes.record(1)
+    changes.record(2)
+    new_mark, keys = changes.changed_since(mark)
+    assert keys == {1, 2}
+    assert changes.changed_since(new_mark) == (new_mark, set())
+    changes.record_all()
+    assert changes.changed_since(new_mark)[1] is None
+
+
+def test_delta_refresh_merges_changes():
+    changes = ChangeLog()
+    data = {1: "a", 2: "b", 3: "c"}
+    loaded = []
+
+    async def delta_loader(mark):
+        if mark is None:
+            return changes.mark, dict(data), None
+        new_mark, keys = changes.changed_since(mark)
+        loaded.append(keys)
+        changed = {key: data[key] for key in keys if key in data}
+        return new_mark, changed, keys - set(changed)
+
+    namespace = CacheNamespace(
+        "test",
+        _counting_loader([]),
+        delta_loader=delta_loader,
+        refresh_interval=0,
+        full_refresh_interval=3600,
+    )
+    assert namespace.full_refresh_due()
+    asyncio.run(namespace.refresh(full=True))
+    assert not namespace.full_refresh_due()
+    assert namespace.refresh_due()
+
+    data[1] = "z"
+    del data[3]
+    changes.record(1)
+    changes.record(3)
+    asyncio.run(namespace.refresh())
+    assert loaded == [{1, 3}]
+    assert namespace.get_cached(1) == "z"
+    assert namespace.get_cached(2) == "b"
+    assert 3 not in namespace
+
+    asyncio.run(namespace.refresh())
+    assert loaded[-1] == set()
+    assert namespace.stats.full_refreshes == 1
+    assert namespace.stats.delta_refreshes == 2
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = tmp_path / "cache" / "snapshot.pickle"
+    manager = CacheManager(snapshot_path=path)
+    manager.register("games", _counting_loader([]), maxsize=10).set(1, ("a", "b"))
+    manager.save_snapshot()
+    assert path.exists()
+
+    calls = []
+    restored = CacheManager(snapshot_path=path)
+    namespace = restored.register("games", _counting_loader(calls))
+    assert restored.load_snapshot() == 1
+    assert asyncio.run(namespace.get(1)) == ("a", "b")
+    assert calls == []
+
+
+def test_snapshot_restore_forces_full_refresh():
+    async def delta_loader(mark):
+        return 1, {}, set()
+
+    namespace = CacheNamespace("test", _counting_loader([]), delta_loader=delta_loader)
+    asyncio.run(namespace.refresh(full=True))
+    assert not namespace.full_refresh_due()
+    namespace.restore({1: "a"})
+    assert namespace.full_refresh_due()
+    assert namespace.high_water_mark is None
+
+
+def test_snapshot_version_mismatch(tmp_path, monkeypatch):
+    path = tmp_path / "snapshot.pickle"
+    manager = CacheManager(snapshot_path=path)
+    manager.register("games", _counting_loader([])).set(1, "a")
+    manager.save_snapshot()
+
+    monkeypatch.setattr(cache, "SNAPSHOT_VERSION", cache.SNAPSHOT_VERSION + 1)
+    restored = CacheManager(snapshot_path=path)
+    restored.register("games", _counting_loader([]))
+    assert restored.load_snapshot() == 0
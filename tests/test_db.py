@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from rosetta.utils.cache import CacheManager, ChangeLog
+
+
+@pytest.fixture
+def db(database):
+    from rosetta.utils import db
+
+    return db
+
+
+def test_meta_role_graph_cache_is_registered_once(db):
+    caches = CacheManager()
+    graphs = db.meta_role_graph_cache(caches)
+    assert caches["meta_role_graphs"] is graphs
+    assert db.meta_role_graph_cache(caches) is graphs
+
+
+def test_advisory_lock_key_is_stable_and_fits_in_a_bigint(db):
+    key = ("channel", 123, 456, 7)
+    lock_id = db._advisory_lock_key(key)
+    # The same key must map to the same lock in every process
+    assert lock_id == int.from_bytes(
+        hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "big", signed=True
+    )
+    assert db._advisory_lock_key(("channel", 123, 456, 8)) != lock_id
+    for i in range(1000):
+        assert -(2 ** 63) <= db._advisory_lock_key(("channel", i)) < 2 ** 63
+
+
+@pytest.fixture
+def lock_calls(db, monkeypatch):
+    calls = {"free": True, "tries": 0, "unlocks": 0}
+
+    async def try_lock(lock_id):
+        calls["tries"] += 1
+        return calls["free"]
+
+    async def unlock(lock_id):
+        calls["unlocks"] += 1
+
+    monkeypatch.setattr(db, "_try_advisory_lock", try_lock)
+    monkeypatch.setattr(db, "_advisory_unlock", unlock)
+    return calls
+
+
+def test_advisory_lock_times_out(db, lock_calls):
+    lock_calls["free"] = False
+
+    async def run():
+        async with db.advisory_lock("key", timeout=0.05, poll_interval=0.01):
+            pass
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
+    assert lock_calls["tries"] > 1
+    assert lock_calls["unlocks"] == 0
+
+
+def test_advisory_lock_is_always_released(db, lock_calls):
+    async def run():
+        async with db.advisory_lock("key"):
+            raise ValueError
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert lock_calls["unlocks"] == 1
+
+
+def test_load_changed_since_sees_other_processes_writes(db, monkeypatch):
+    writes = {"count": 10}
+    monkeypatch.setattr(db, "_table_writes", lambda tables: writes["count"])
+    changes = ChangeLog()
+    loads = []
+
+    def load(guild_ids):
+        loads.append(None if guild_ids is None else set(guild_ids))
+        return {guild_id: "value" for guild_id in guild_ids or (1, 2)}
+
+    mark, values, deleted = db.load_changed_since(None, changes, ["table"], load)
+    assert (values, deleted) == ({1: "value", 2: "value"}, None)
+
+    # Nothing written by anyone: nothing loaded
+    mark, values, deleted = db.load_changed_since(mark, changes, ["table"], load)
+    assert (values, deleted) == ({}, set())
+
+    # Written by this process: only that guild is loaded
+    changes.record(3)
+    mark, values, deleted = db.load_changed_since(mark, changes, ["table"], load)
+    assert (values, deleted) == ({3: "value"}, set())
+
+    # Written elsewhere: everything is reloaded
+    writes["count"] += 1
+    mark, values, deleted = db.load_changed_since(mark, changes, ["table"], load)
+    assert deleted is None
+    assert loads == [None, {3}, None]
@@ -0,0 +1,87 @@
+import asyncio
+
+import discord
+from discord.http import Route
+
+from benchmarks.discord_server import MockDiscord
+from rosetta.utils.discord_api import use_api_base
+
+
+class _ClickView(discord.ui.View):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.clicked = asyncio.Event()
+
+    @discord.ui.button(label="Steins;Gate", custom_id="steinsgate")
+    async def play(self, button, interaction):
+        await interaction.response.send_message("Clicked!", ephemeral=True)
+        self.clicked.set()
+
+
+def test_client_end_to_end(monkeypatch):
+    # Restored once the test is done
+    monkeypatch.setattr(Route, "base", Route.__dict__["base"])
+    server = MockDiscord(
+        rate_limits={"POST /channels/{channel_id}/messages": (3, 0.3)}, global_limit=(10, 0.5)
+    )
+    guild_state = server.add_guild("Guild", members=3)
+    member_id = next(i for i in guild_state["members"] if i != server.application_id)
+    role_id = server.add_role(guild_state, "Steins;Gate Completed")
+
+    async def run():
+        use_api_base(await server.start())
+        intents = discord.Intents.default()
+        intents.members = True
+        client = discord.Client(intents=intents)
+        ready = asyncio.Event()
+        client.event(_ready_setter(ready))
+        task = asyncio.create_task(client.start("token"))
+        try:
+            await asyncio.wait_for(ready.wait(), 10)
+            guild = client.get_guild(guild_state["id"])
+            assert len(guild.members) == 4
+
+            category = await guild.create_category("Steins;Gate")
+            channel = await guild.create_text_channel("member0-plays-sg", category=category)
+            started = asyncio.get_running_loop().time()
+            for i in range(7):
+                message = await channel.send(f"message {i}")
+            # The client waits out the bucket from the headers, before getting a 429
+            assert asyncio.get_running_loop().time() - started >= 0.6
+            await message.pin()
+            history = [m.content async for m in channel.history(limit=None, oldest_first=True)]
+            assert history == [f"message {i}" for i in range(7)]
+            assert [m.content for m in await channel.pins()] == ["message 6"]
+
+            # A burst over the global limit, which the client only learns about from 429s
+            fetched = await asyncio.gather(*(client.fetch_channel(channel.id) for _ in range(15)))
+            assert {c.id for c in fetched} == {channel.id}
+
+            member = guild.get_member(member_id)
+            await member.add_roles(discord.Object(role_id))
+            assert server.guilds[guild.id]["members"][member_id]["roles"] == [str(role_id)]
+
+            view = _ClickView()
+            client.add_view(view)
+            interaction_id = server.click(guild.id, member_id, "steinsgate")
+            await asyncio.wait_for(view.clicked.wait(), 5)
+            assert server.interaction_responses[interaction_id][0]["data"]["content"] == "Clicked!"
+
+            await channel.delete()
+            await asyncio.sleep(0.05)
+            assert guild.get_channel(channel.id) is None
+        finally:
+            await client.close()
+            await server.stop()
+            await task
+
+    asyncio.run(run())
+    assert server.rate_limited["global"] > 0
+    assert server.requests["POST /channels/{channel_id}/messages", 200] == 7
+
+
+def _ready_setter(ready):
+    async def on_ready():
+        ready.set()
+
+    return on_ready
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+@pytest.fixture
+def guild(database):
+    from benchmarks.database import seed_guild
+
+    guild = FakeGuild(FakeDiscord(), "Guild")
+    seed_guild(guild)
+    return guild
+
+
+@pytest.fixture
+def button(guild):
+    from rosetta.cogs.playthrough.ui import GameButton
+    from rosetta.utils.db import get_playable_games
+
+    game_config = asyncio.run(get_playable_games(guild.id))[0]
+    return GameButton(game_config=game_config, label=game_config.game.name)
+
+
+def _click(guild, button, member, clicks):
+    async def run():
+        interactions = [FakeInteraction(guild, member, pick_after=0) for _ in range(clicks)]
+        await asyncio.gather(*(button.callback(interaction) for interaction in interactions))
+        return interactions
+
+    return asyncio.run(run())
+
+
+def test_concurrent_clicks_create_a_single_channel(guild, button):
+    member = guild.add_member("player")
+    interactions = _click(guild, button, member, 5)
+
+    assert len(guild.text_channels) == 1
+    channel = guild.text_channels[0]
+    for interaction in interactions:
+        assert f"Successfully created your channel: {channel.mention}, have fun!" in interaction.messages
+
+
+def test_concurrent_clicks_are_all_told_about_an_existing_channel(guild, button):
+    member = guild.add_member("player")
+    _click(guild, button, member, 1)
+    interactions = _click(guild, button, member, 3)
+
+    assert len(guild.text_channels) == 1
+    for interaction in interactions:
+        assert interaction.messages[-1] == f"You already have a channel for {button.game_config.game}."
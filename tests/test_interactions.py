@@ -0,0 +1,111 @@
+import asyncio
+
+import discord
+
+from rosetta.utils import interactions
+from rosetta.utils.interactions import auto_defer, edit_response, handler_stats, respond
+
+
+class FakeResponse:
+    def __init__(self, calls, delay=0):
+        self.calls = calls
+        self.delay = delay
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.calls.append(("defer", kwargs))
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.calls.append(("send_message", args))
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def send(self, *args, **kwargs):
+        self.calls.append(("followup", args))
+
+
+class FakeInteraction(discord.Interaction):
+    response = None
+    followup = None
+
+    def __init__(self, _id=1, delay=0):
+        self.id = _id
+        self.calls = []
+        self.response = FakeResponse(self.calls, delay)
+        self.followup = FakeFollowup(self.calls)
+
+    async def edit_original_response(self, **kwargs):
+        self.calls.append(("edit", kwargs))
+
+
+def test_fast_handler_is_not_deferred():
+    @auto_defer(0.05)
+    async def fast_handler(ctx):
+        await respond(ctx, "hi")
+
+    interaction = FakeInteraction()
+    asyncio.run(fast_handler(interaction))
+    assert interaction.calls == [("send_message", ("hi",))]
+    stats = handler_stats[fast_handler.__qualname__]
+    assert stats.calls == 1
+    assert stats.deferred == 0
+    assert interactions._deferrers == {}
+
+
+def test_slow_handler_is_deferred():
+    @auto_defer(0.01)
+    async def slow_handler(ctx):
+        await asyncio.sleep(0.05)
+        await respond(ctx, "first")
+        await respond(ctx, "done", replace=True)
+
+    interaction = FakeInteraction()
+    asyncio.run(slow_handler(interaction))
+    assert interaction.calls == [
+        ("defer", {"ephemeral": True, "invisible": False}),
+        ("followup", ("first",)),
+        ("edit", {"content": "done", "view": None}),
+    ]
+    assert handler_stats[slow_handler.__qualname__].deferred == 1
+
+
+def test_response_waits_for_in_flight_defer():
+    @auto_defer(0.01)
+    async def racing_handler(ctx):
+        await asyncio.sleep(0.015)
+        await respond(ctx, "hi")
+
+    # The defer is still on its way when the handler responds
+    interaction = FakeInteraction(delay=0.02)
+    asyncio.run(racing_handler(interaction))
+    assert [call[0] for call in interaction.calls] == ["defer", "followup"]
+
+
+def test_errors_are_recorded():
+    @auto_defer(1)
+    async def failing_handler(ctx):
+        raise ValueError("boom")
+
+    async def run():
+        try:
+            await failing_handler(FakeInteraction())
+        except ValueError:
+            pass
+
+    asyncio.run(run())
+    assert handler_stats[failing_handler.__qualname__].errors == 1
+
+
+def test_edit_response():
+    interaction = FakeInteraction()
+    asyncio.run(edit_response(interaction, view=None))
+    assert interaction.calls == [("edit", {"view": None})]
@@ -0,0 +1,59 @@
+import io
+import json
+import logging
+
+import pytest
+
+from rosetta.utils.log import JsonFormatter, parse_levels, setup_logging, stop_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    logging.getLogger("chatty").setLevel(logging.NOTSET)
+
+
+def test_parse_levels():
+    assert parse_levels("discord=info, rosetta.cogs=DEBUG,") == {
+        "discord": "INFO",
+        "rosetta.cogs": "DEBUG",
+    }
+    assert parse_levels("") == {}
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord("rosetta", logging.INFO, __file__, 1, "took %s", ("1s",), None)
+    record.stages = {"checks": 0.1}
+    data = json.loads(JsonFormatter().format(record))
+    assert data["message"] == "took 1s"
+    assert data["level"] == "INFO"
+    assert data["stages"] == {"checks": 0.1}
+    assert "args" not in data
+
+
+def test_setup_logging(tmp_path, restore_logging):
+    stream = io.StringIO()
+    log_file = tmp_path / "logs" / "rosetta.log"
+    setup_logging(log_file, levels={"chatty": "WARNING"}, json_output=True, stream=stream)
+    root = logging.getLogger()
+    assert [type(h).__name__ for h in root.handlers] == ["QueueHandler"]
+
+    logging.getLogger("chatty").info("ignored")
+    logging.getLogger("rosetta.test").debug("console only")
+    logging.getLogger("rosetta.test").info("both %s", "sinks", extra={"guild_id": 1})
+    stop_logging()
+    # Stopping again, as at exit, does nothing
+    stop_logging()
+
+    console = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["message"] for line in console] == ["console only", "both sinks"]
+    (line,) = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert line["message"] == "both sinks"
+    assert line["guild_id"] == 1
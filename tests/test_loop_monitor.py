@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+
+from rosetta.utils.loop_monitor import LoopMonitor
+from rosetta.utils.telemetry import LOOP_STALLS
+
+
+def _blocking_export():
+    time.sleep(0.3)
+
+
+def test_measures_lag():
+    async def run():
+        monitor = LoopMonitor(interval=0.01, stall_threshold=1.0)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        quiet = monitor.percentiles()
+        time.sleep(0.1)
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+        return quiet, monitor.percentiles()
+
+    quiet, busy = asyncio.run(run())
+    assert quiet["p50"] < 0.05
+    assert busy["max"] >= 0.08
+
+
+def test_logs_stack_of_stalls(caplog):
+    async def run():
+        monitor = LoopMonitor(interval=0.01, stall_threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        _blocking_export()
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+    stalls = LOOP_STALLS.get()
+    with caplog.at_level(logging.WARNING, logger="rosetta.utils.loop_monitor"):
+        asyncio.run(run())
+    assert LOOP_STALLS.get() == stalls + 1
+    (record,) = caplog.records
+    assert "_blocking_export" in record.getMessage()
+
+
+def test_reports_percentiles(caplog):
+    async def run():
+        monitor = LoopMonitor(interval=0.01, report_interval=0.05)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    with caplog.at_level(logging.INFO, logger="rosetta.utils.loop_monitor"):
+        asyncio.run(run())
+    assert any(record.getMessage().startswith("Event loop lag p50=") for record in caplog.records)
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from rosetta.utils.members import get_members, parse_member_cache_flags
+
+
+def test_parse_member_cache_flags():
+    flags = parse_member_cache_flags("joined, interaction")
+    assert (flags.joined, flags.interaction, flags.voice) == (True, True, False)
+    assert parse_member_cache_flags("ALL").voice
+    assert parse_member_cache_flags("none").value == 0
+    with pytest.raises(ValueError):
+        parse_member_cache_flags("joined,online")
+
+
+class _Guild:
+    name = "Guild"
+
+    def __init__(self, cached, members):
+        self.members = cached
+        self._all = members
+        self.chunk_calls = []
+
+    @property
+    def chunked(self):
+        return len(self.members) == len(self._all)
+
+    async def chunk(self, *, cache=True):
+        self.chunk_calls.append(cache)
+        return list(self._all)
+
+
+def test_get_members_chunks_only_when_not_cached():
+    guild = _Guild(["me"], ["me", "you"])
+    assert asyncio.run(get_members(guild)) == ["me", "you"]
+    assert guild.chunk_calls == [False]
+
+    guild = _Guild(["me", "you"], ["me", "you"])
+    assert asyncio.run(get_members(guild)) == ["me", "you"]
+    assert guild.chunk_calls == []
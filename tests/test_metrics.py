@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+import pytest
+
+from rosetta.utils.metrics import Histogram, Registry, STAGE_SECONDS, Trace, stage
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests.", ("route",))
+    counter.inc(route="a")
+    counter.inc(2, route="a")
+    assert counter.get(route="a") == 3
+    assert counter.get(route="b") == 0
+    assert registry.counter("requests_total", "Requests.", ("route",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests.")
+    with pytest.raises(ValueError):
+        counter.inc(method="GET")
+
+    gauge = registry.gauge("queue_depth", "Depth.")
+    gauge.set(4)
+    gauge.set(2)
+    assert gauge.get() == 2
+
+
+def test_histogram_buckets():
+    histogram = Histogram("latency", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    cumulative, count, total = histogram.snapshot()
+    assert cumulative == [2, 3, 4]
+    assert count == 4
+    assert total == pytest.approx(5.65)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram("latency", "Latency.", buckets=(0.1, 0.2, 0.3, 0.4, 0.5))
+    assert histogram.quantile(0.5) is None
+    for i in range(100):
+        histogram.observe(i / 200)
+    assert histogram.quantile(0.5) == pytest.approx(0.25, abs=0.01)
+    assert histogram.quantile(0.99) == pytest.approx(0.495, abs=0.01)
+
+
+def test_trace_records_stages(caplog):
+    async def helper():
+        with stage("inner"):
+            await asyncio.sleep(0.01)
+
+    async def operation():
+        with Trace("test_operation", guild_id=1) as trace:
+            with stage("first"):
+                await asyncio.sleep(0.01)
+            await helper()
+            await helper()
+        return trace
+
+    with caplog.at_level(logging.INFO, logger="rosetta.utils.metrics"):
+        trace = asyncio.run(operation())
+
+    assert list(trace.stages) == ["first", "inner"]
+    assert trace.stages["inner"] >= 0.02
+    assert trace.duration >= sum(trace.stages.values())
+    (record,) = [r for r in caplog.records if getattr(r, "operation", None) == "test_operation"]
+    assert record.guild_id == 1
+    assert record.stages == trace.stages
+    assert not record.failed
+    assert STAGE_SECONDS.snapshot(operation="test_operation", stage="inner")[1] == 2
+    assert STAGE_SECONDS.snapshot(operation="test_operation", stage="total")[1] == 1
+
+
+def test_stage_without_trace():
+    with stage("orphan"):
+        pass
+    assert ("orphan",) not in [values[1:] for values in STAGE_SECONDS.label_values()]
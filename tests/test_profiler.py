@@ -0,0 +1,56 @@
+import asyncio
+import pstats
+import time
+
+import pytest
+
+from rosetta.utils.profiler import SamplingProfiler
+
+
+def _busy_handler():
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _waiting_handler(event):
+    await event.wait()
+
+
+def test_profiles_threads_and_tasks(tmp_path):
+    async def run():
+        profiler = SamplingProfiler(interval=0.002, task_interval=0.01)
+        profiler.start()
+        with pytest.raises(RuntimeError):
+            profiler.start()
+        event = asyncio.Event()
+        task = asyncio.create_task(_waiting_handler(event))
+        await asyncio.sleep(0.05)
+        _busy_handler()
+        event.set()
+        await task
+        profiler.stop()
+        return profiler
+
+    profiler = asyncio.run(run())
+    assert profiler.samples > 0
+    assert profiler.duration >= 0.15
+
+    wall_path, tasks_path, pstats_path = profiler.dump(tmp_path / "profiles", "test")
+    wall = wall_path.read_text()
+    assert any("_busy_handler" in line and "MainThread" in line for line in wall.splitlines())
+    for line in wall.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+    assert "_waiting_handler" in tasks_path.read_text()
+
+    stats = pstats.Stats(str(pstats_path))
+    (busy,) = [key for key in stats.stats if key[2].endswith("_busy_handler")]
+    calls, _, own_time, cumulative, _ = stats.stats[busy]
+    assert calls > 0
+    assert own_time == pytest.approx(cumulative)
+
+
+def test_stop_without_start():
+    with pytest.raises(RuntimeError):
+        SamplingProfiler().stop()
@@ -1,5 +1,8 @@
+import itertools
+
 import pytest
 
+from benchmarks.role_expr import EXPANDED_EXPR, ROLE_IDS, THRESHOLD_EXPR
 from rosetta.utils import role_expr
 
 instance = role_expr.MetaRoleEvaluator(
@@ -140,3 +143,140 @@ def test_empty_paran():
 def test_empty_paran_operand():
     with pytest.raises(Exception):
         instance.evaluate("711534517432614922 && ()")
+
+
+def test_get_symbols():
+    program = instance.compile(
+        "711534517432614922 && (711534523879522304 || !711534517432614922)"
+    )
+    assert role_expr.get_symbols(program) == [
+        "711534517432614922",
+        "711534523879522304",
+    ]
+
+
+threshold_instance = role_expr.MetaRoleEvaluator(
+    {"1": True, "2": False, "3": True, "4": False}
+)
+
+
+def test_threshold():
+    assert threshold_instance.evaluate("atleast(2; 1, 2, 3)") is True
+    assert threshold_instance.evaluate("atleast(3; 1, 2, 3)") is False
+
+
+def test_threshold_in_expression():
+    assert threshold_instance.evaluate("!atleast(3; 1, 2, 3, 4) && 1") is True
+    assert threshold_instance.evaluate("(atleast(1; 2, 4) || 2) && 3") is False
+
+
+def test_threshold_duplicate_symbols():
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(2; 1, 1)")
+
+
+def test_threshold_out_of_range():
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(0; 1, 2)")
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(3; 1, 2)")
+
+
+def test_threshold_invalid_syntax():
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(2, 1, 2)")
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(2; 1, (2))")
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(1; 1, 2")
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("1 atleast(1; 1, 2)")
+
+
+def test_threshold_unknown_symbol():
+    with pytest.raises(Exception):
+        threshold_instance.evaluate("atleast(1; 1, 5)")
+
+
+def test_threshold_symbols():
+    program = threshold_instance.compile("atleast(1; 1, 2) && 3")
+    assert role_expr.get_symbols(program) == ["1", "2", "3"]
+
+
+def test_symbol_after_paran():
+    with pytest.raises(Exception):
+        instance.evaluate("(711534517432614922) 711534523879522304")
+
+
+def test_double_not():
+    assert instance.evaluate("!!711534517432614922") is True
+
+
+def test_whitespace_only():
+    with pytest.raises(Exception):
+        instance.evaluate("   ")
+
+
+def test_error_positions():
+    with pytest.raises(Exception, match="Invalid syntax at 5"):
+        instance.tokenize("1 && )")
+    with pytest.raises(Exception, match="Illegal token \\+ at 2"):
+        instance.tokenize("1 + 2")
+    with pytest.raises(Exception, match="Missing parenthesis at 0"):
+        instance.tokenize("(((1) && 2)")
+    with pytest.raises(Exception, match="Missing parenthesis at 3"):
+        instance.tokenize("(1))")
+
+
+def test_tokens_are_compact():
+    tokens = instance.tokenize("!(1 && 2)")
+    assert all(isinstance(token, tuple) for token in tokens)
+    assert instance.tokenize("1 && 2")[1] is instance.tokenize("3 && 4")[1]
+
+
+@pytest.mark.parametrize(
+    "expression,canonical",
+    [
+        ("!!1", "1"),
+        ("(((1)))", "1"),
+        ("2 && 1 && 2", "1 && 2"),
+        ("1 && (2 && (3 && 1))", "1 && 2 && 3"),
+        ("(1 || 2) && (3 || (4 || 1))", "(1 || 2) && (1 || 3 || 4)"),
+        ("atleast(1; 3, 2)", "2 || 3"),
+        ("atleast(2; 3, 2)", "2 && 3"),
+        ("atleast(2; 3, 2, 1) && 4", "4 && atleast(2; 1, 2, 3)"),
+        ("!(1 && 2) || 3", "3 || !(1 && 2)"),
+        ("1 || (1 && !!!2)", "1"),
+        ("(1 || 2) && 1 && 3", "1 && 3"),
+    ],
+)
+def test_canonicalize(expression, canonical):
+    assert role_expr.canonicalize(expression)[1] == canonical
+
+
+def test_canonicalize_is_idempotent():
+    _, canonical = role_expr.canonicalize("!(3 || 1) && (2 || atleast(2; 5, 4, 6))")
+    assert role_expr.canonicalize(canonical)[1] == canonical
+
+
+def test_canonicalize_constant():
+    with pytest.raises(Exception, match="always False"):
+        role_expr.canonicalize("1 && !!(2 && !1)")
+    with pytest.raises(Exception, match="always True"):
+        role_expr.canonicalize("!1 || 1")
+
+
+def test_simplified_tree_is_equivalent():
+    expression = "!(!1 && (2 || 1)) || atleast(2; 1, 2, 3) && !!3"
+    tree, _ = role_expr.canonicalize(expression)
+    for a in (True, False):
+        for b in (True, False):
+            for c in (True, False):
+                evaluator = role_expr.MetaRoleEvaluator({"1": a, "2": b, "3": c})
+                assert evaluator.evaluate_tree(tree) == evaluator.evaluate(expression)
+
+
+def test_threshold_matches_expanded_form():
+    for values in itertools.product([False, True], repeat=len(ROLE_IDS)):
+        evaluator = role_expr.MetaRoleEvaluator(dict(zip(ROLE_IDS, values)))
+        assert evaluator.evaluate(THRESHOLD_EXPR) == evaluator.evaluate(EXPANDED_EXPR)
@@ -0,0 +1,103 @@
+from rosetta.utils.role_graph import MetaRoleGraph
+
+SG = "711534517432614922"
+SG0 = "711534523879522304"
+CHN = "711534530000000000"
+
+ROWS = [
+    (1, "Science Adventurer", "900", f"{SG} && {SG0}"),
+    (2, "Delusional", "901", f"{CHN} || {SG}"),
+    (3, "Broken", "903", f"{SG} &&"),
+]
+
+NESTED_ROWS = [
+    # Listed before the meta roles it depends on
+    (3, "Completionist", "902", "900 && 901"),
+    (1, "Science Adventurer", "900", f"{SG} && {SG0}"),
+    (2, "Delusional", "901", f"{CHN}"),
+]
+
+
+def test_from_rows():
+    graph = MetaRoleGraph.from_rows(ROWS)
+    # The broken expression is skipped
+    assert len(graph) == 2
+    assert {node.name for node in graph.dependents(SG)} == {
+        "Science Adventurer",
+        "Delusional",
+    }
+    assert [node.name for node in graph.dependents(CHN)] == ["Delusional"]
+    assert graph.dependents("0") == []
+    assert graph.get(1).role_id == "900"
+    assert graph.get(3) is None
+
+
+def test_meta_roles_to_grant():
+    graph = MetaRoleGraph.from_rows(ROWS)
+    granted = graph.meta_roles_to_grant(SG, set())
+    assert [node.name for node in granted] == ["Delusional"]
+    granted = graph.meta_roles_to_grant(SG0, {SG})
+    assert [node.name for node in granted] == ["Science Adventurer"]
+    assert graph.meta_roles_to_grant(SG0, set()) == []
+
+
+def test_nodes_keep_canonical_form():
+    graph = MetaRoleGraph.from_rows([(1, "Both", "900", f"{SG0} && !!{SG} && {SG0}")])
+    (node,) = graph.nodes
+    assert node.expression == f"{SG0} && !!{SG} && {SG0}"
+    assert node.canonical == f"{SG} && {SG0}"
+    assert node.dependencies == {SG, SG0}
+
+
+def test_nested_topological_order():
+    graph = MetaRoleGraph.from_rows(NESTED_ROWS)
+    order = [node.role_id for node in graph.nodes]
+    assert order.index("902") > order.index("900")
+    assert order.index("902") > order.index("901")
+    assert graph.affected_by(SG) == {"900", "902"}
+    assert graph.affected_by(CHN) == {"901", "902"}
+
+
+def test_nested_grants_cascade():
+    graph = MetaRoleGraph.from_rows(NESTED_ROWS)
+    granted = graph.meta_roles_to_grant(SG0, {SG, CHN})
+    assert [node.name for node in granted] == ["Science Adventurer", "Completionist"]
+    # Holding the meta roles without qualifying for them doesn't count
+    assert graph.meta_roles_to_grant(SG0, {"900", "901"}) == []
+
+
+def test_evaluate_each_node_once(monkeypatch):
+    graph = MetaRoleGraph.from_rows(NESTED_ROWS)
+    evaluated = []
+    original = type(graph.nodes[0]).evaluate
+
+    def evaluate(node, role_ids):
+        evaluated.append(node.role_id)
+        return original(node, role_ids)
+
+    monkeypatch.setattr(type(graph.nodes[0]), "evaluate", evaluate)
+    results = graph.evaluate({SG, SG0, CHN}, ["902", "900"])
+    assert results == {"900": True, "901": True, "902": True}
+    assert sorted(evaluated) == ["900", "901", "902"]
+    assert evaluated[-1] == "902"
+
+
+def test_cycles_are_skipped():
+    graph = MetaRoleGraph.from_rows(
+        [
+            (1, "A", "900", f"901 && {SG}"),
+            (2, "B", "901", "902 || 900"),
+            (3, "C", "902", f"{SG}"),
+            (4, "D", "903", "900"),
+            (5, "Self", "904", f"904 || {SG}"),
+        ]
+    )
+    assert [node.name for node in graph.nodes] == ["C"]
+
+
+def test_creates_cycle():
+    graph = MetaRoleGraph.from_rows(NESTED_ROWS)
+    assert graph.creates_cycle("900", ["902"])
+    assert graph.creates_cycle("900", ["900"])
+    assert not graph.creates_cycle("901", ["900"])
+    assert not graph.creates_cycle("999", ["902", SG])
@@ -0,0 +1,210 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from discord.http import Route
+
+from rosetta.utils.scheduler import (
+    Priority,
+    RequestScheduler,
+    background,
+    current_priority,
+    route_key,
+)
+
+
+def test_route_key():
+    assert route_key(Route("DELETE", "/channels/{channel_id}", channel_id=1)) == (
+        "DELETE 1:None:/channels/{channel_id}"
+    )
+    # Each guild's bucket is scheduled apart
+    path = "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+    assert route_key(Route("PUT", path, guild_id=1, user_id=2, role_id=3)) != route_key(
+        Route("PUT", path, guild_id=4, user_id=2, role_id=3)
+    )
+
+
+def test_background_context():
+    assert current_priority() == Priority.INTERACTIVE
+    with background():
+        assert current_priority() == Priority.BACKGROUND
+    assert current_priority() == Priority.INTERACTIVE
+
+
+def test_invalid_reserve():
+    with pytest.raises(ValueError):
+        RequestScheduler(max_concurrency=2, interactive_reserve=2)
+    with pytest.raises(ValueError):
+        RequestScheduler(route_concurrency=2, route_interactive_reserve=2)
+
+
+def test_route_limit():
+    scheduler = RequestScheduler(
+        max_concurrency=8, interactive_reserve=0, route_concurrency=2, route_interactive_reserve=0
+    )
+    running = []
+    peak = {"a": 0, "b": 0}
+
+    async def request(key):
+        running.append(key)
+        peak[key] = max(peak[key], running.count(key))
+        await asyncio.sleep(0.01)
+        running.remove(key)
+
+    async def run():
+        await asyncio.gather(
+            *[scheduler.run(key, request, key) for key in "ab" * 5]
+        )
+
+    asyncio.run(run())
+    assert peak == {"a": 2, "b": 2}
+    assert scheduler.info()["in_flight"] == 0
+
+
+def test_interactive_preempts_background():
+    scheduler = RequestScheduler(
+        max_concurrency=2, interactive_reserve=1, route_concurrency=2, route_interactive_reserve=0
+    )
+    order = []
+
+    async def request(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+
+    async def bulk():
+        with background():
+            await asyncio.gather(
+                *[scheduler.run(f"r{i}", request, f"bg{i}") for i in range(4)]
+            )
+
+    async def run():
+        task = asyncio.create_task(bulk())
+        await asyncio.sleep(0.001)
+        # Sent after the whole bulk job, but served before the rest of it
+        await scheduler.run("x", request, "click")
+        await task
+
+    asyncio.run(run())
+    # Background requests only ever use one slot, leaving one for the click
+    assert order[:2] == ["bg0", "click"]
+    stats = scheduler.info()["lanes"]
+    assert stats["background"]["requests"] == 4
+    assert stats["background"]["queued"] == 3
+    assert stats["interactive"]["queued"] == 0
+
+
+def test_waiting_interactive_served_first():
+    scheduler = RequestScheduler(max_concurrency=1, interactive_reserve=0)
+    order = []
+
+    async def request(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        first = asyncio.create_task(scheduler.run("r", request, "first"))
+        await asyncio.sleep(0)
+        bulk = [
+            asyncio.create_task(scheduler.run("r", request, f"bg{i}", priority=Priority.BACKGROUND))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        click = asyncio.create_task(scheduler.run("r", request, "click"))
+        await asyncio.gather(first, click, *bulk)
+
+    asyncio.run(run())
+    assert order == ["first", "click", "bg0", "bg1", "bg2"]
+
+
+def test_cancelled_waiter_frees_queue():
+    scheduler = RequestScheduler(max_concurrency=1, interactive_reserve=0)
+
+    async def request():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(scheduler.run("r", request))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.run("r", request))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        assert await first == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert await scheduler.run("r", request) == "done"
+
+    asyncio.run(run())
+    assert scheduler.info()["waiting"] == {"interactive": 0, "background": 0}
+
+
+def test_route_reserve_keeps_slots_for_interactive():
+    scheduler = RequestScheduler(
+        max_concurrency=8, interactive_reserve=0, route_concurrency=2, route_interactive_reserve=1
+    )
+    running = []
+
+    async def request(name):
+        running.append(name)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        with background():
+            bulk = [asyncio.create_task(scheduler.run("r", request, f"bg{i}")) for i in range(3)]
+        await asyncio.sleep(0.001)
+        # A background request holds one of the route's slots, the other is kept free
+        assert running == ["bg0"]
+        await scheduler.run("r", request, "click")
+        await asyncio.gather(*bulk)
+
+    asyncio.run(run())
+    assert running[:2] == ["bg0", "click"]
+
+
+def test_slots_are_only_held_on_the_wire():
+    scheduler = RequestScheduler(max_concurrency=2, interactive_reserve=0)
+    attempts = []
+
+    async def discord_stub(request):
+        attempts.append(scheduler.info()["in_flight"])
+        if len(attempts) == 1:
+            return web.json_response({"retry_after": 0.05}, status=429)
+        return web.json_response({})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/channels/{channel_id}", discord_stub)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        session = aiohttp.ClientSession(connector=scheduler.connector())
+        in_flight_while_waiting = []
+
+        class FakeHTTP:
+            async def request(self, route, **kwargs):
+                # Retries rate limited requests, like discord.py does
+                while True:
+                    async with session.get(base + route.url.split("/api/v10")[-1]) as response:
+                        data = await response.json()
+                    if response.status != 429:
+                        return response.status
+                    in_flight_while_waiting.append(scheduler.info()["in_flight"])
+                    await asyncio.sleep(data["retry_after"])
+
+        http = FakeHTTP()
+        scheduler.install(http)
+        status = await http.request(Route("GET", "/channels/{channel_id}", channel_id=1))
+        # Not an `install`ed client's request, so not scheduled
+        async with session.get(base + "/channels/2") as response:
+            await response.read()
+        await session.close()
+        await runner.cleanup()
+        return status, in_flight_while_waiting
+
+    assert asyncio.run(run()) == (200, [0])
+    assert attempts == [1, 1, 0]
+    assert scheduler.info()["in_flight"] == 0
+    assert scheduler.info()["lanes"]["interactive"]["requests"] == 2
@@ -0,0 +1,115 @@
+import asyncio
+import sys
+import time
+
+import discord
+from discord.http import Route
+
+from benchmarks.discord_server import MockDiscord
+from rosetta.utils.cache import CacheManager
+from rosetta.utils.discord_api import use_api_base
+from rosetta.utils.sharding import (
+    ShardPartition,
+    format_shard_ids,
+    parse_shard_ids,
+    recommended_shard_count,
+    shard_for,
+    split_shards,
+)
+from rosetta.utils.supervisor import Supervisor
+
+
+def test_shard_ids():
+    assert parse_shard_ids("0-2, 5,7-8") == [0, 1, 2, 5, 7, 8]
+    assert parse_shard_ids("") is None
+    assert format_shard_ids([8, 0, 1, 2, 5, 7]) == "0-2,5,7-8"
+    assert split_shards(10, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert split_shards(2, 4) == [[0], [1]]
+
+
+def test_partition_filters_caches():
+    guild_ids = [i << 22 for i in range(4)]
+    assert [shard_for(guild_id, 2) for guild_id in guild_ids] == [0, 1, 0, 1]
+    partition = ShardPartition([1], 2)
+    assert partition(str(guild_ids[1])) and not partition(guild_ids[2])
+
+    async def bulk_loader():
+        return {guild_id: "games" for guild_id in guild_ids}
+
+    async def loader(key):
+        return "games"
+
+    caches = CacheManager(partition=partition)
+    namespace = caches.register("games", loader, bulk_loader=bulk_loader)
+    asyncio.run(namespace.refresh(full=True))
+    assert set(namespace.dump()) == {guild_ids[1], guild_ids[3]}
+
+    namespace.invalidate()
+    assert namespace.restore({guild_id: "games" for guild_id in guild_ids}) == 2
+    assert set(namespace.dump()) == {guild_ids[1], guild_ids[3]}
+
+
+def test_supervisor_starts_and_restarts_workers(tmp_path):
+    code = (
+        "import os, pathlib; pathlib.Path(os.environ['OUT'], os.environ['ROSETTA_SHARD_IDS'])"
+        ".write_text(os.environ['ROSETTA_SHARD_COUNT'] + ' ' + os.environ['ROSETTA_METRICS_PORT'])"
+    )
+    supervisor = Supervisor(
+        [sys.executable, "-c", code],
+        3,
+        2,
+        env={"OUT": str(tmp_path)},
+        metrics_port=9000,
+        identify_interval=0,
+        restart_delay=0,
+    )
+    supervisor.start()
+    for worker in supervisor.workers:
+        worker.process.wait()
+    assert {path.name: path.read_text() for path in tmp_path.iterdir()} == {
+        "0-1": "3 9000",
+        "2": "3 9001",
+    }
+
+    # Exited workers are restarted
+    supervisor.check()
+    assert [worker.restarts for worker in supervisor.workers] == [1, 1]
+    supervisor.stop()
+
+
+def test_supervisor_stops_workers():
+    supervisor = Supervisor(
+        [sys.executable, "-c", "import time; time.sleep(60)"], 1, 1, identify_interval=0
+    )
+    supervisor.start()
+    started = time.monotonic()
+    supervisor.stop(timeout=10)
+    assert time.monotonic() - started < 10
+    assert not supervisor.workers[0].running()
+
+
+def test_worker_only_gets_its_shards(monkeypatch):
+    monkeypatch.setattr(Route, "base", Route.__dict__["base"])
+    server = MockDiscord(shards=2)
+    guilds = [server.add_guild(f"Guild {i}")["id"] for i in range(4)]
+
+    async def run():
+        use_api_base(await server.start())
+        assert await recommended_shard_count("token") == 2
+        client = discord.AutoShardedClient(intents=discord.Intents.default(), shard_count=2, shard_ids=[1])
+        ready = asyncio.Event()
+
+        @client.event
+        async def on_ready():
+            ready.set()
+
+        task = asyncio.create_task(client.start("token"))
+        try:
+            await asyncio.wait_for(ready.wait(), 10)
+            return {guild.id for guild in client.guilds}
+        finally:
+            await client.close()
+            await server.stop()
+            await task
+
+    assert asyncio.run(run()) == {guild_id for guild_id in guilds if shard_for(guild_id, 2) == 1}
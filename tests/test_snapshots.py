@@ -0,0 +1,87 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from rosetta.utils.snapshots import GAME_CONFIG_SNAPSHOT_FIELDS, GameConfigSnapshot
+
+
+def _row(i, guild=0):
+    return (
+        i,
+        str(711534517432614922 + guild),
+        i % 20,
+        "".join(["Steins;Gate ", str(i % 20)]),
+        "".join(["steins-gate-", str(i % 20)]),
+        True,
+        str(711534517432600000 + i),
+        str(711534523879500000 + i),
+        "".join(["-plays-sg", str(i % 20)]),
+    )
+
+
+def test_from_row():
+    snapshot = GameConfigSnapshot.from_row(_row(1), ["sg", "sg0"])
+    assert len(_row(1)) == len(GAME_CONFIG_SNAPSHOT_FIELDS)
+    assert snapshot.guild_id == 711534517432614922
+    assert snapshot.name == "Steins;Gate 1"
+    assert snapshot.aliases == ("sg", "sg0")
+    assert str(snapshot) == "Steins;Gate 1"
+
+
+def test_immutable():
+    snapshot = GameConfigSnapshot.from_row(_row(1))
+    with pytest.raises(AttributeError):
+        snapshot.playable = False
+
+
+def test_shared_strings_are_interned():
+    a = GameConfigSnapshot.from_row(_row(1, guild=0))
+    b = GameConfigSnapshot.from_row(_row(21, guild=1))
+    assert a.name is b.name
+    assert a.channel_suffix is b.channel_suffix
+
+
+def _traced_size(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        built = build()
+        return built, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def test_smaller_than_model_instances(database):
+    from playthrough.models import Game, GameConfig
+
+    rows = [_row(i, guild=i // 20) for i in range(1000)]
+    snapshots, snapshots_size = _traced_size(
+        lambda: [GameConfigSnapshot.from_row(row) for row in rows]
+    )
+    # What loading the configs with their games through the ORM builds
+    instances, instances_size = _traced_size(
+        lambda: [
+            GameConfig(
+                id=_id,
+                guild_id=guild_id,
+                game=Game(id=game_id, name=name, slug=slug, channel_suffix=channel_suffix),
+                playable=playable,
+                emoji=emoji,
+                completion_role_id=completion_role_id,
+            )
+            for (
+                _id,
+                guild_id,
+                game_id,
+                name,
+                slug,
+                playable,
+                emoji,
+                completion_role_id,
+                channel_suffix,
+            ) in rows
+        ]
+    )
+    assert len(snapshots) == len(instances) == 1000
+    assert snapshots_size * 2 < instances_size
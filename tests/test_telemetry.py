@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+import pytest
+
+from rosetta.utils import telemetry
+from rosetta.utils.metrics import Registry
+from rosetta.utils.telemetry import (
+    MetricsServer,
+    instrument_http,
+    register_bot_collectors,
+    timed_sync_to_async,
+)
+
+
+class FakeRoute:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+
+
+def test_render():
+    registry = Registry()
+    registry.counter("requests_total", "Requests.", ("route",)).inc(route='GET "/a"')
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="GET \\"/a\\""} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in text
+    assert "latency_seconds_count 1" in text
+    assert "latency_seconds_sum 0.5" in text
+
+
+def test_collectors_run_on_render():
+    registry = Registry()
+    gauge = registry.gauge("sampled", "Sampled.")
+    registry.add_collector(lambda: gauge.set(42))
+    assert "sampled 42" in registry.render()
+
+
+def test_bot_collector():
+    class FakeCaches:
+        def info(self):
+            return {"games": {"hit_ratio": 0.75, "entries": 3}}
+
+    class FakeBot:
+        latency = 0.125
+        caches = FakeCaches()
+
+    registry = Registry()
+    register_bot_collectors(FakeBot(), registry)
+    registry.collect()
+    assert telemetry.GATEWAY_LATENCY.get() == 0.125
+    assert telemetry.CACHE_HIT_RATIO.get(namespace="games") == 0.75
+
+
+def test_timed_sync_to_async():
+    @timed_sync_to_async
+    def add(a, b):
+        return a + b
+
+    assert asyncio.run(add(1, b=2)) == 3
+    assert telemetry.DB_CALL_SECONDS.snapshot(call="add")[1] == 1
+    assert telemetry.DB_QUEUE_SECONDS.snapshot(call="add")[1] == 1
+    assert telemetry.DB_PENDING.get() == 0
+
+
+def test_metrics_server_and_http_instrumentation():
+    class FakeHTTP:
+        async def request(self, route, **kwargs):
+            if route.path == "/limited":
+                response = SimpleNamespace(status=429, reason="Too Many Requests")
+                raise discord.HTTPException(response, "You are being rate limited.")
+            return {}
+
+    async def run():
+        http = FakeHTTP()
+        instrument_http(http)
+        with pytest.raises(discord.HTTPException):
+            await http.request(FakeRoute("GET", "/limited"))
+        assert await http.request(FakeRoute("GET", "/ok")) == {}
+
+        server = MetricsServer("127.0.0.1", 0)
+        await server.start()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{server.port}/metrics") as response:
+                assert response.status == 200
+                text = await response.text()
+        await server.stop()
+        return text
+
+    text = asyncio.run(run())
+    assert 'rosetta_discord_rate_limited_total{route="GET /limited"} 1' in text
+    assert 'rosetta_discord_requests_total{route="GET /limited",status="429"} 1' in text
+    assert 'rosetta_discord_requests_total{route="GET /ok",status="ok"} 1' in text
+    assert 'rosetta_discord_request_seconds_count{route="GET /ok"} 1' in text